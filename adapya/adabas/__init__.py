@@ -1,5 +1,5 @@
-__all__=['adaerror','asmfrec','asmfrec13','asmfrec14','asmfrec15',
-    'asmfrec21','api','fields','metadata']
+__all__=['adaerror','aggregate','asmfrec','asmfrec13','asmfrec14','asmfrec15',
+    'asmfrec21','api','callring','convert','dbapi','fields','lob','lookup','metadata','occurs','paging','parallel','recorder','retry','smf','smfcluster','smfdelta','smffollow','smfingest','smfstore','superde','writebehind']
 
 #  Copyright 2004-2023 Software AG
 #
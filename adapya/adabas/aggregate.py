@@ -0,0 +1,114 @@
+"""adapya.adabas.aggregate - Counts and value lists from the inverted lists
+=========================================================================
+
+Answers aggregate questions without reading records:
+
+- count(): number of records matching search criteria (S1 ISN quantity)
+- group_count(): number of records per descriptor value (L9 quantities)
+- distinct(): list of descriptor values
+- top_n_values(): descriptor values with the most records
+
+Example on the Employees file::
+
+    >>> from adapya.adabas.api import Adabasx
+    >>> from adapya.adabas.aggregate import count, group_count, top_n_values
+    >>> c1 = Adabasx(fbl=64, rbl=2000, sbl=100, vbl=100, mbl=4+16*100,
+    ...     multifetch=100)
+    >>> c1.cb.dbid = 8
+    >>> count(c1, 11, {'city': ('AJ', 20, 'A')}, 'city = PARIS')
+    74
+    >>> group_count(c1, 11, 'AL', 3, start='C', stop='D')
+    [('CAD', 12), ('CHF', 88)]
+    >>> top_n_values(c1, 11, 'AJ', 20, n=2)
+    [('PARIS', 74), ('LONDON', 52)]
+
+The session buffers must be large enough for the search criteria and,
+with multifetch, for the descriptor values returned per L9 call.
+Value ranges given with start and stop are passed to the nucleus in
+the search and value buffer (see Adabas.descrange()).
+
+"""
+from __future__ import print_function          # PY3
+
+import heapq
+
+from adapya.base.datamap import funpack
+from adapya.adabas.parallel import histogram
+
+
+def pyvalue(apa, b, ffrm):
+    """ Return Python value of descriptor value bytes returned to session apa
+
+    Alphanumeric values are returned as str without trailing blanks,
+    U, P, F values as int and others as bytes.
+    """
+    if ffrm == 'A':
+        return b.decode(apa.encoding).rstrip(' ')
+    elif ffrm == 'W':
+        return b.decode('utf-8').rstrip(' ')
+    elif ffrm in ('U', 'P', 'F'):
+        return funpack(b, ffrm, byteorder=apa.bo, ebcdic=apa.ebcdic)
+    return bytes(b)
+
+
+def count(apa, fnr, view, criteria):
+    """ Return number of records matching the search criteria
+
+    :param apa: Adabas or Adabasx session
+    :param fnr: file number
+    :param view: Datamap or dictionary of field name to
+                 (Adabas short name, length, format), see searchcrits()
+    :param criteria: search criteria, e.g. 'city = PARIS and salary > 20000'
+    """
+    apa.cb.fnr = fnr
+    apa.sb.seek(0)
+    apa.vb.seek(0)
+    apa.searchcrits(view, criteria)
+    apa.find(norecord=1)
+    return apa.cb.isq
+
+
+def group_count(apa, fnr, descriptor, fieldlen, ffrm='A', start=None, stop=None):
+    """ Return list of (value, number of records) for the descriptor
+        values in ascending sequence
+
+    :param descriptor: descriptor name
+    :param fieldlen, ffrm: length and format of the descriptor values
+    :param start, stop: optional value range
+    """
+    apa.cb.fnr = fnr
+    return [(pyvalue(apa, v, ffrm), q)
+            for v, q in histogram(apa, descriptor, fieldlen, ffrm, start, stop)]
+
+
+def distinct(apa, fnr, descriptor, fieldlen, ffrm='A', start=None, stop=None):
+    """ Return list of the distinct values of a descriptor
+        (parameters see group_count())
+    """
+    apa.cb.fnr = fnr
+    return [pyvalue(apa, v, ffrm)
+            for v, q in histogram(apa, descriptor, fieldlen, ffrm, start, stop)]
+
+
+def top_n_values(apa, fnr, descriptor, fieldlen, ffrm='A', n=10, start=None, stop=None):
+    """ Return list of the n (value, number of records) with the most
+        records, largest first (other parameters see group_count())
+    """
+    apa.cb.fnr = fnr
+    top = heapq.nlargest(n, histogram(apa, descriptor, fieldlen, ffrm, start, stop),
+                         key=lambda vq: vq[1])
+    return [(pyvalue(apa, v, ffrm), q) for v, q in top]
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
@@ -22,6 +22,7 @@ import sys
 import time
 import ctypes
 from ctypes import c_int, c_char_p, sizeof
+from contextlib import contextmanager
 import logging
 # import adapya.base
 from adapya.base import defs # for variables dummymutex,logopt,logstr
@@ -33,6 +34,7 @@ from adapya.base.datamap import Datamap, Uint1, Uint2, Uint4, Uint8, String, \
     Char, Int2, Int4, Bytes, T_NONE, T_STCK, T_GMT, T_HEX, T_NWBO, T_EBCDIC, \
     T_VAR1, fpack, NATIVEBO, NETWORKBO
 from adapya.base.dump import dump
+from adapya.adabas.convert import ConvertError
 from . import adaerror
 
 # fix Python2 difference: make iterator's next() methods available
@@ -664,6 +666,58 @@ def sl4(s, byteorder='@'):
             raise ProgrammingError("Cannot wrap %s in s4(), need type of str, bytes or bytearray"% (type(s),))
     return struct.pack('%sl'%byteorder, len(s)*size)
 
+def fvalue(value, fieldlen, ffrm='A', byteorder=None, encoding='latin1'):
+    """return value as bytes of an Adabas field with length and format
+    for the value buffer
+
+    :param value: bytes are returned unchanged, str is padded with blanks
+                  (format A) and numbers are packed for formats U,P,F,B
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    if ffrm in ('U','P','F','B'):
+        return fpack(int(value), ffrm, fieldlen, byteorder=byteorder)
+    if ffrm == 'W':
+        return value.encode('utf-8').ljust(fieldlen)[:fieldlen]
+    return value.encode(encoding).ljust(fieldlen)[:fieldlen]
+
+def lowvalue(fieldlen, ffrm='A', byteorder=None):
+    """return lowest value bytes of an Adabas field with length and format"""
+    if ffrm == 'U':
+        return fpack(-(10**fieldlen-1), 'U', fieldlen, byteorder=byteorder)
+    elif ffrm == 'P':
+        return fpack(-(10**(2*fieldlen-1)-1), 'P', fieldlen, byteorder=byteorder)
+    elif ffrm == 'F':
+        return fpack(-(1<<(8*fieldlen-1)), 'F', fieldlen, byteorder=byteorder)
+    return b'\x00'*fieldlen
+
+@contextmanager
+def countonly(apa):
+    """suppress format and ISN buffer of the Adabas or Adabasx session
+    so that a find command only returns the ISN quantity without
+    reading the first record"""
+    if isinstance(apa, Adabasx):
+        saved = []
+        for abd, key in (('fabd', 'send'), ('iabd', 'size')):
+            if hasattr(apa, abd):
+                d = getattr(apa, abd)
+                saved.append((d, key, getattr(d, key)))
+                setattr(d, key, 0)
+        try:
+            yield apa
+        finally:
+            for d, key, val in saved:
+                setattr(d, key, val)
+    else:
+        fbl, ibl = apa.cb.fbl, apa.cb.ibl
+        apa.cb.fbl = 0
+        apa.cb.ibl = 0
+        try:
+            yield apa
+        finally:
+            apa.cb.fbl = fbl
+            apa.cb.ibl = ibl
+
 #----------------------------------------------------------------------
 class Adabas(object):
     """
@@ -746,6 +800,8 @@ class Adabas(object):
         self.ebcdic = 0
         self.encoding = 'latin1'     # default buffer encoding unless architecture is EBCDIC
         self.dbarchit = None         # archit returned from database OP call
+        self.callring = None         # Callring of recent calls (see callring module)
+        self.recorder = None         # Recorder of calls (see recorder module)
 
 
 
@@ -784,6 +840,7 @@ class Adabas(object):
         self.nucid=0  # set after open(), if >0: assigned cluster nucid
 
         self.mfgen=None # generator set if multifetch
+        self.batchlayout=None # convert multifetch records (see convert.Layout)
 
         if multifetch > 1:
             self.mfc=multifetch  # number of records to fetch
@@ -836,10 +893,20 @@ class Adabas(object):
         if defs.logopt & LOGBEFORE:
             self.logapa('Before Adabas call',before=1)
 
+        if self.recorder:
+            recstate = self.recorder.before(self)
+        if self.callring:
+            t0 = time.time()
+
         # issue call
         i = adalink.adabas(self.acb, self.fb,self.rb,self.sb,self.vb,self.ib)
         totalCalls+=1
 
+        if self.callring:
+            self.callring.add(self, time.time()-t0)
+        if self.recorder:
+            self.recorder.after(self, recstate)
+
 
         if i != 0 and self.cb.rsp==0:
             raise InterfaceError('Adabas call interface returned: %d' % i,
@@ -952,10 +1019,16 @@ class Adabas(object):
             :returns: tuple (ISN, datamap)
 
             Note: currently with ACB or ACBX with one RB/MB pair
+
+            With the attribute batchlayout set to a Layout (see
+            adapya.adabas.convert) the records of each call are
+            converted at once to latin-1 and native byte order.
+            ConvertError is raised for a record of another length.
         """
         isn=None
         ad3=self.cb.ad3  # keep additions3 for repetitive call()
         ad4=self.cb.ad4  # keep additions4 for repetitive call()
+        layout=self.batchlayout
         while 1:
             self.call()
 
@@ -963,6 +1036,8 @@ class Adabas(object):
             dmap.offset=0
 
             if self.cb.op1 !='M':
+                if layout:
+                    layout.convert(self.rb, 0, 1)
                 yield self.cb.isn, dmap
                 continue    # no multifetch running
 
@@ -980,6 +1055,20 @@ class Adabas(object):
                 raise DataEnd("End of Data in multifetch()",self)
 
             self.mfele.buffer=mb
+
+            if layout:
+                # convert the records up to the first response at once
+                self.mfele.offset=4
+                k=0
+                while k < n and self.mfele.rsp == 0 and self.mfele.reclen > 0:
+                    if self.mfele.reclen != layout.reclen:
+                        raise ConvertError('Record %d of ISN %d has length %d, '
+                            'layout record length is %d' % (k+1,
+                            self.mfele.isn, self.mfele.reclen, layout.reclen))
+                    k+=1
+                    self.mfele.offset+=16
+                layout.convert(self.rb, 0, k)
+
             self.mfele.offset=4
 
             for i in range(n):
@@ -1368,7 +1457,7 @@ class Adabas(object):
         self.updates = 0    # reset number of updates
 
 
-    def find(self,saveisn=0,sort=''):
+    def find(self,saveisn=0,sort='',norecord=0):
         """
         Find records by selection
 
@@ -1376,6 +1465,10 @@ class Adabas(object):
 
         :param sort: 'FNF2F3' may specify up to 3 descriptors by which the
                       selected records are sorted
+
+        :param norecord: 1 does not read the first record and returns no
+                      ISNs in the ISN buffer (see countonly()),
+                      e.g. for counting or reading with L1 GET NEXT
         """
         self.cb.cmd='S1'
         self.cb.op1=' '
@@ -1388,7 +1481,11 @@ class Adabas(object):
             self.cb.cmd='S2'
         #if 'acb' in dir(self):
         #    self.cb.ibl=0           # don't read first record (old acb)
-        self.call()
+        if norecord:
+            with countonly(self):
+                self.call()
+        else:
+            self.call()
 
 
     def first_unused(self, dbid=0, fnr=0):
@@ -1572,14 +1669,14 @@ class Adabas(object):
             self.cb.op2 = 'A'   # ascending
 
         if self.mfc>1 and dmap != None:   # multifetch
-            if self.mfgen==None:          # first call
-                self.cb.op1='M'
-                mfgen=self.multifetch(dmap)
+            self.cb.op1='M'
+            mfgen=self.multifetch(dmap)
 
             while True:
                 try:
-                    isn, rlen, isq = mfgen.next()
-                    yield isn, dmap, isq
+                    isn, rlen = next(mfgen)
+                    dmap.dmlen = rlen
+                    yield isn, dmap, self.mfele.isq  # quantity of value
                 except DataEnd:
                     break # returns with StopIteration
 
@@ -1603,6 +1700,33 @@ class Adabas(object):
                     break # returns with StopIteration
 
 
+    def descrange(self, descriptor, fieldlen, ffrm='A', start=None, stop=None):
+        """
+        Set search and value buffer for reading a descriptor
+        with read(seq=descriptor) or histogram(seq=descriptor)
+        from start to stop value
+
+        :param descriptor: descriptor name
+        :param fieldlen, ffrm: length and format of descriptor values
+        :param start: first value, default is the lowest value
+        :param stop: last value (inclusive), default is no limit.
+                     The end value is passed with the S operator to
+                     the nucleus which returns response 3 after it.
+
+        Values are bytes or are converted with fvalue().
+        """
+        sfield = '%s,%d,%s' % (descriptor[:2], fieldlen, ffrm)
+        if start is None:
+            start = lowvalue(fieldlen, ffrm, byteorder=self.bo)
+        vals = fvalue(start, fieldlen, ffrm, byteorder=self.bo, encoding=self.encoding)
+        if stop is not None:
+            sfield += ',S,' + sfield
+            vals += fvalue(stop, fieldlen, ffrm, byteorder=self.bo, encoding=self.encoding)
+        self.sb.seek(0)
+        self.sb.write_text(sfield + '.')
+        self.vb.seek(0)
+        self.vb.write(vals)
+
     def hold(self, isn=0, wait=0):
         """
         Put record in hold with ISN=isn
@@ -1688,6 +1812,12 @@ class Adabas(object):
         self.cb.op2=op2
         self.call()
 
+    def cursor(self, multifetch=None, **buflens):
+        """Return Cursor object for a scan with its own command id,
+        control block and buffers on this session (see Cursor class)
+        """
+        return Cursor(self, multifetch=multifetch, **buflens)
+
     def readByIsn(self, getnext=0):
         """ Read Sequential by ISN
         getnext = 1 if getnext else 0
@@ -2378,6 +2508,8 @@ class Adabasx(Adabas):
         self.ebcdic = 0
         self.bo = NATIVEBO
         self.ecall = None
+        self.callring = None         # Callring of recent calls (see callring module)
+        self.recorder = None         # Recorder of calls (see recorder module)
 
         if archit and (archit & RDAAEBC) and not (archit & RDAABSW):
             # mainframe native calls
@@ -2520,6 +2652,7 @@ class Adabasx(Adabas):
             """Allocation of PB or UB buffers not yet implemented
                on instance creation: use addbuffer()"""
         self.mfgen=None # generator set if multifetch
+        self.batchlayout=None # convert multifetch records (see convert.Layout)
 
         if multifetch > 1:
             self.mfc=multifetch  # number of records to fetch
@@ -2649,9 +2782,19 @@ class Adabasx(Adabas):
         if self.cinfo:
             self.cinfo.callcnt = totalCalls
 
+        if self.recorder:
+            recstate = self.recorder.before(self)
+        if self.callring:
+            t0 = time.time()
+
         # issue call
         i = adalink.adabasx(self.acb, self.abdalen, self.abda)
 
+        if self.callring:
+            self.callring.add(self, time.time()-t0)
+        if self.recorder:
+            self.recorder.after(self, recstate)
+
 
         if i != 0 and self.cb.rsp==0:
             raise InterfaceError('Adabas call interface returned: %d' % i,
@@ -3012,6 +3155,207 @@ class Adabasx(Adabas):
         self.cb.isq=0
 
 
+CURSORBUFS = (('F','fb'), ('R','rb'), ('S','sb'), ('V','vb'), ('I','ib'), ('M','mb'))
+
+class Cursor(object):
+    """ Scan on an Adabas session with its own command id, control block,
+    buffers and multifetch state
+
+    Several cursors can be used concurrently on one Adabas or Adabasx
+    session: around each Adabas call the cursor state is swapped into
+    the session and saved afterwards. This allows nested loop processing
+    with one session and one user queue element in the nucleus.
+
+    :param apa: Adabas or Adabasx session object
+    :param multifetch: number of records to fetch per call,
+                       default is the multifetch setting of the session
+    :param buflens: buffer lengths fbl, rbl, sbl, vbl, ibl or mbl,
+                    default are the buffer lengths of the session.
+                    With Adabasx only buffer types are available
+                    for which the session has an ABD.
+
+    The cursor starts with cidn=-1 so that the command id is assigned
+    by Adabas with the first call. close() releases it with an RC call.
+
+    Example with nested read loops:
+
+    >>> c1 = Adabasx(fbl=64, rbl=256, sbl=64, vbl=64)
+    >>> c1.cb.dbid = 8
+    >>> with c1.cursor() as orders, c1.cursor() as lines:
+    ...     orders.cb.fnr = 11
+    ...     orders.fb.value = b'AA,8,AB,8.'
+    ...     for isn, _ in orders.read():
+    ...         lines.cb.fnr = 12
+    ...         ...  # set lines.fb, lines.sb and lines.vb from orders.rb
+    ...         for isn2, _ in lines.read(seq='BA'):
+    ...             print(orders.rb.value, lines.rb.value)
+
+    """
+    def __init__(self, apa, multifetch=None, **buflens):
+        self.apa = apa
+        self.closed = 0
+        self.used = 0               # set with first call of cursor
+        isx = isinstance(apa, Adabasx)
+
+        # control block snapshot
+        self.acb = Abuf(len(apa.acb))
+        self.acb[:] = apa.acb.raw
+        self.cb = (Acbx if isx else Acb)(ebcdic=apa.ebcdic, byteOrder=apa.bo)
+        self.cb.buffer = self.acb
+        self.cb.cidn = -1           # command id assigned by Adabas
+
+        if multifetch is None:
+            multifetch = apa.mfc
+        self.mfgen = None
+        if multifetch > 1:
+            self.mfc = multifetch
+            self.mfele = Mfele()
+            self.mfhdr = Mfhdr()
+            # ACB returns multifetch elements in ISN buffer
+            bkey = 'mbl' if isx else 'ibl'
+            buflens[bkey] = max(buflens.get(bkey, 0), 4+16*multifetch)
+        else:
+            self.mfc = 0
+            self.mfele = None
+            self.mfhdr = None
+
+        self.fb = self.rb = self.sb = self.vb = self.ib = self.mb = None
+        self.batchlayout = None     # see Adabas.multifetch()
+        self.swapattrs = ['fb', 'rb', 'sb', 'vb', 'ib', 'mfgen', 'mfc', 'mfele',
+                          'mfhdr', 'batchlayout']
+        self.abds = []              # (index of session ABD, ABD image, buffer)
+
+        if isx:
+            self.swapattrs.append('mb')
+            types = ''
+            for i, abdbuf in enumerate(apa.abds):
+                abd = Abdx(buffer=abdbuf, ebcdic=apa.ebcdic, byteOrder=apa.bo)
+                battr = dict(CURSORBUFS).get(abd.id)
+                if not battr:
+                    continue        # keep performance buffer etc. of session
+                size = buflens.get(battr+'l', abd.size)
+                buf = Abuf(size) if size else None
+                setattr(self, battr, buf)
+                image = Abuf(ABDXL)
+                image[:] = abdbuf.raw
+                xabd = Abdx(buffer=image, ebcdic=apa.ebcdic, byteOrder=apa.bo)
+                xabd.size = size
+                xabd.addr = ctypes.addressof(buf) if buf else 0
+                if abd.id in 'FSV':
+                    xabd.send = size
+                self.abds.append((i, image, buf))
+                types += abd.id
+            for btype, battr in CURSORBUFS:
+                if buflens.get(battr+'l') and btype not in types:
+                    raise ProgrammingError(
+                        'Cursor %s buffer requires %s ABD in Adabasx session'
+                        % (btype, btype), apa)
+        else:
+            for btype, battr in CURSORBUFS[:5]:
+                size = buflens.get(battr+'l', getattr(apa.cb, battr+'l'))
+                setattr(self, battr, Abuf(size, encoding=apa.encoding) if size else None)
+                setattr(self.cb, battr+'l', size)
+
+    def _swap(self):
+        """ Exchange cursor state with the session state """
+        apa = self.apa
+        raw = apa.acb.raw
+        apa.acb[:] = self.acb.raw
+        self.acb[:] = raw
+        for j, (i, image, buf) in enumerate(self.abds):
+            raw = apa.abds[i].raw
+            apa.abds[i][:] = image.raw
+            image[:] = raw
+            self.abds[j] = (i, image, apa.bufs[i])
+            apa.bufs[i] = buf
+        for attr in self.swapattrs:
+            x = getattr(apa, attr, None)
+            setattr(apa, attr, getattr(self, attr))
+            setattr(self, attr, x)
+
+    def _run(self, func, *args, **kw):
+        """ Call func with cursor state swapped into the session """
+        if self.closed:
+            raise ProgrammingError('Cursor is closed', self.apa)
+        self._swap()
+        try:
+            self.used = 1
+            return func(*args, **kw)
+        finally:
+            self._swap()
+
+    def _iter(self, gen):
+        """ Step generator of session with cursor state swapped in """
+        while 1:
+            try:
+                x = self._run(next, gen)
+            except StopIteration:
+                return
+            yield x
+
+    def call(self, **cbfields):
+        """ Issue Adabas call with the control block and buffers of the
+            cursor, see Adabas.call()
+        """
+        self._run(self.apa.call, **cbfields)
+
+    def read(self, **kw):
+        """ Read in sequence generator with the state of the cursor,
+            see Adabas.read() for the parameters
+
+            A new read sequence starts a new multifetch generator.
+        """
+        self.mfgen = None
+        for x in self._iter(self.apa.read(**kw)):
+            yield x
+
+    def histogram(self, **kw):
+        """ Read descriptor values generator with the state of the cursor,
+            see Adabas.histogram() for the parameters
+        """
+        self.mfgen = None
+        for x in self._iter(self.apa.histogram(**kw)):
+            yield x
+
+    def searchfield(self, *args, **kw):
+        """ Insert a search criterion into the search and value buffer
+            of the cursor, see Adabas.searchfield() for the parameters
+        """
+        self._run(self.apa.searchfield, *args, **kw)
+
+    def searchcrits(self, view, crit):
+        """ Set search and value buffer of the cursor from criteria string,
+            see Adabas.searchcrits() for the parameters
+        """
+        self._run(self.apa.searchcrits, view, crit)
+
+    def descrange(self, *args, **kw):
+        """ Set search and value buffer of the cursor for a descriptor
+            value range, see Adabas.descrange() for the parameters
+        """
+        self._run(self.apa.descrange, *args, **kw)
+
+    def find(self, **kw):
+        """ Find records with the search and value buffer of the cursor,
+            see Adabas.find() for the parameters
+        """
+        self._run(self.apa.find, **kw)
+
+    def close(self):
+        """ Release the command id of the cursor with an RC call """
+        if self.closed:
+            return
+        if self.used and self.cb.cidn not in (0, -1):
+            self._run(self.apa.rc)
+        self.closed = 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
 def space_calculation_AC( maxrec, blocksize=2544, rabnsize=3):
     """ Calculate space requirements for an Adabas file in
     in the Address Converter.
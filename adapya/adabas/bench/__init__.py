@@ -0,0 +1,163 @@
+"""adapya.adabas.bench - Benchmarks for the client hot paths
+==========================================================
+
+Measures the Python side of the Adabas client: control block packing,
+call() overhead, multifetch and read() iteration, search buffer
+construction, FDT parsing and SMF record decoding.
+
+Adabas calls are passed to a stub backend (adapya.adabas.bench.stub)
+so that no database is needed. The Adabas Client Library must still
+be loadable for the benchmarks using adapya.adabas.api; otherwise
+these are skipped.
+
+Run from the command line::
+
+    python -m adapya.adabas.bench --out bench.json
+    python -m adapya.adabas.bench --baseline bench.json --threshold 10
+
+Or from Python::
+
+    >>> from adapya.adabas import bench
+    >>> results = bench.run(['acb_pack', 'smf_decode'])
+    >>> bench.save(results, 'bench.json')
+    >>> regressions = bench.compare(results, bench.load('base.json'), 10)
+
+Results are a dictionary with a 'meta' entry describing the environment
+and a 'benchmarks' entry mapping benchmark name to a dictionary with
+the best time per operation in seconds ('op'), the operations per
+second ('ops') and the number of operations measured ('n').
+
+"""
+from __future__ import print_function          # PY3
+
+import fnmatch
+import json
+import platform
+import sys
+import time
+from collections import OrderedDict
+
+# registered benchmarks: name -> (setup function, description)
+BENCHMARKS = OrderedDict()
+
+class Skip(Exception):
+    """ Raised by a benchmark setup function if the benchmark cannot run
+        in the current environment
+    """
+    pass
+
+def benchmark(name, desc=''):
+    """ Decorator registering a benchmark setup function
+
+    The setup function returns a function that runs the benchmark once
+    and returns the number of operations performed.
+    """
+    def register(setup):
+        BENCHMARKS[name] = (setup, desc)
+        return setup
+    return register
+
+
+def measure(func, repeat=5, mintime=0.2):
+    """ Return best time per operation of func
+
+    func is called repeatedly until mintime seconds are reached,
+    the smallest time per operation over repeat rounds is returned.
+
+    :returns: tuple (seconds per operation, operations of best round)
+    """
+    best = None
+    bestn = 0
+    for r in range(repeat):
+        n = 0
+        t0 = time.time()
+        while 1:
+            n += func()
+            t = time.time() - t0
+            if t >= mintime:
+                break
+        if best is None or t/n < best:
+            best = t/n
+            bestn = n
+    return best, bestn
+
+
+def run(names=None, repeat=5, mintime=0.2, log=None):
+    """ Run benchmarks
+
+    :param names: list of benchmark names or shell-style patterns,
+                  e.g. 'call_*', None runs all benchmarks
+    :param log: function called with a line of progress text
+    :returns: results dictionary
+    """
+    from adapya.adabas.bench import cases   # registers the benchmarks
+
+    res = OrderedDict()
+    for name, (setup, desc) in BENCHMARKS.items():
+        if names and not [n for n in names if fnmatch.fnmatchcase(name, n)]:
+            continue
+        try:
+            func = setup()
+        except Skip as e:
+            res[name] = {'skipped': str(e)}
+            if log:
+                log('%-20s skipped: %s' % (name, e))
+            continue
+        op, n = measure(func, repeat=repeat, mintime=mintime)
+        res[name] = {'op': op, 'ops': 1./op if op else 0., 'n': n}
+        if log:
+            log('%-20s %12.3f us/op %12.0f ops/s' % (name, op*1e6, res[name]['ops']))
+
+    return {'meta': {
+                'python': sys.version.split()[0],
+                'implementation': platform.python_implementation(),
+                'platform': platform.platform(),
+                'machine': platform.machine(),
+                'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'repeat': repeat,
+                'mintime': mintime},
+            'benchmarks': res}
+
+
+def save(results, fname):
+    """ Write results to JSON file """
+    with open(fname, 'w') as f:
+        json.dump(results, f, indent=2)
+
+def load(fname):
+    """ Read results from JSON file """
+    with open(fname) as f:
+        return json.load(f, object_pairs_hook=OrderedDict)
+
+
+def compare(results, baseline, threshold=10.):
+    """ Compare results with baseline results
+
+    :param threshold: percentage by which the time per operation may
+                      exceed the baseline before counted as regression
+    :returns: list of tuples (name, baseline op, new op, change in percent,
+              regression flag) for benchmarks present in both
+    """
+    comp = []
+    base = baseline.get('benchmarks', {})
+    for name, r in results.get('benchmarks', {}).items():
+        b = base.get(name)
+        if not b or 'op' not in b or 'op' not in r or not b['op']:
+            continue
+        pct = (r['op'] - b['op'])*100./b['op']
+        comp.append((name, b['op'], r['op'], pct, pct > threshold))
+    return comp
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
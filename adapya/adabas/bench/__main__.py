@@ -0,0 +1,111 @@
+""" adapya.adabas.bench - run benchmarks for the client hot paths
+
+    Usage:
+
+        python -m adapya.adabas.bench [--out <file>] [--baseline <file>]
+                                      [--threshold <pct>] [<name> ...]
+
+    Options:
+
+        -o, --out <file>        write results to JSON file
+        -b, --baseline <file>   compare results with JSON file of
+                                previous run
+        -t, --threshold <pct>   percentage slower than baseline counted
+                                as regression (default 10)
+        -r, --repeat <n>        number of measuring rounds (default 5)
+        -m, --mintime <sec>     minimum time of a round (default 0.2)
+        -l, --list              list benchmarks
+        -h, --help              display this help
+
+    Benchmark names are matched exactly or as shell-style patterns,
+    e.g. 'call_*' for call_acb and call_acbx (quote the pattern in the
+    shell). Without names all benchmarks are run.
+
+    Exit code is 1 if a regression against the baseline was found.
+
+    Examples:
+
+        python -m adapya.adabas.bench -o base.json
+        python -m adapya.adabas.bench -b base.json -t 5 read multifetch
+
+"""
+from __future__ import print_function          # PY3
+
+import getopt
+import sys
+
+from adapya.adabas import bench
+
+
+def usage():
+    print(__doc__)
+    print("Running Python version", sys.version)
+
+OUT=''
+BASELINE=''
+THRESHOLD=10.
+REPEAT=5
+MINTIME=0.2
+LIST=0
+
+try:
+    opts, args = getopt.getopt(sys.argv[1:],
+      'hb:lm:o:r:t:',
+      ['help','baseline=','list','mintime=','out=','repeat=','threshold='])
+except getopt.GetoptError:
+    usage()
+    sys.exit(2)
+for opt, arg in opts:
+    if opt in ('-h', '--help'):
+        usage()
+        sys.exit()
+    elif opt in ('-b', '--baseline'):
+        BASELINE=arg
+    elif opt in ('-l', '--list'):
+        LIST=1
+    elif opt in ('-m', '--mintime'):
+        MINTIME=float(arg)
+    elif opt in ('-o', '--out'):
+        OUT=arg
+    elif opt in ('-r', '--repeat'):
+        REPEAT=int(arg)
+    elif opt in ('-t', '--threshold'):
+        THRESHOLD=float(arg)
+
+if LIST:
+    from adapya.adabas.bench import cases
+    for name, (setup, desc) in bench.BENCHMARKS.items():
+        print('  %-16s %s' % (name, desc))
+    sys.exit()
+
+results = bench.run(args or None, repeat=REPEAT, mintime=MINTIME, log=print)
+
+if OUT:
+    bench.save(results, OUT)
+    print('\nResults written to', OUT)
+
+if BASELINE:
+    regressions = 0
+    print('\nComparison with %s (threshold %g%%)\n' % (BASELINE, THRESHOLD))
+    print('  %-16s %12s %12s %8s' % ('Benchmark', 'base us/op', 'new us/op', 'change'))
+    for name, bop, nop, pct, regr in bench.compare(results, bench.load(BASELINE), THRESHOLD):
+        print('  %-16s %12.3f %12.3f %+7.1f%% %s' % (name, bop*1e6, nop*1e6, pct,
+            'REGRESSION' if regr else ''))
+        regressions += regr
+    if regressions:
+        print('\n%d regression(s) found' % regressions)
+        sys.exit(1)
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
@@ -0,0 +1,289 @@
+"""adapya.adabas.bench.cases - Benchmark definitions
+==================================================
+
+Each benchmark setup function prepares its objects and returns
+a function running the benchmark once which returns the number
+of operations done. Setup functions raise Skip if a benchmark
+cannot run here.
+
+"""
+from __future__ import print_function          # PY3
+
+import struct
+
+from adapya.base.datamap import Datamap, String, Uint4
+
+from adapya.adabas.bench import benchmark, Skip
+from adapya.adabas.bench.samples import lfxbuffer, smfrecord
+
+LOOPS = 100         # operations per benchmark function call
+MFCOUNT = 20        # records per multifetch call
+CALLS = 10          # calls per read sequence
+
+
+apierror = None    # set if adapya.adabas.api cannot be imported
+
+def apimod():
+    """ Import adapya.adabas.api and the stub module
+
+    :raises Skip: if the Adabas Client Library cannot be loaded
+    """
+    global apierror
+    if apierror:
+        raise Skip(apierror)
+    try:
+        from adapya.adabas import api
+        from adapya.adabas.bench import stub
+    except (OSError, ImportError) as e:
+        apierror = 'adapya.adabas.api not available: %s' % e
+        raise Skip(apierror)
+    return api, stub
+
+
+class Emp(Datamap):
+    """ Employees record as returned in the record buffer """
+    def __init__(self, **kw):
+        Datamap.__init__(self, 'Employee',
+            String('persid', 8),
+            String('name', 20),
+            String('city', 20),
+            Uint4('salary'),
+            **kw)
+
+EMPLEN = 52
+
+
+@benchmark('acb_pack', 'set and get ACB fields')
+def acb_pack():
+    api, stub = apimod()
+    cb = api.Acb(buffer=api.Abuf(api.ACBLEN))
+    def run():
+        for i in range(LOOPS):
+            cb.cmd = 'L3'
+            cb.cid = b'\x00\x00\x00\x01'
+            cb.fnr = 11
+            cb.isn = i
+            cb.op1 = 'M'
+            cb.op2 = 'V'
+            cb.ad1 = 'AE      '
+            cb.rsp, cb.isn, cb.isq, cb.ldec
+        return LOOPS
+    return run
+
+@benchmark('acbx_pack', 'set and get ACBX fields')
+def acbx_pack():
+    api, stub = apimod()
+    cb = api.Acbx(buffer=api.Abuf(api.ACBXLEN))
+    def run():
+        for i in range(LOOPS):
+            cb.cmd = 'L3'
+            cb.cid = b'\x00\x00\x00\x01'
+            cb.dbid = 12
+            cb.fnr = 11
+            cb.isn = i
+            cb.op1 = 'M'
+            cb.op2 = 'V'
+            cb.ad1 = 'AE      '
+            cb.rsp, cb.isn, cb.isq, cb.errc, cb.ldec
+        return LOOPS
+    return run
+
+
+def callbench(cls, **kw):
+    api, stub = apimod()
+    c = cls(fbl=64, rbl=256, sbl=64, vbl=64, ibl=16, **kw)
+    c.cb.dbid = 12
+    c.cb.fnr = 11
+    def handler(acb, bufs):
+        stub.setrsp(acb, 0)
+    link = stub.StubLink(handler)
+    def run():
+        with stub.stublink(link):
+            for i in range(LOOPS):
+                c.call(cmd='L1', isn=i+1)
+        return LOOPS
+    return run
+
+@benchmark('call_acb', 'Adabas.call() with stub backend')
+def call_acb():
+    api, stub = apimod()
+    return callbench(api.Adabas)
+
+@benchmark('call_acbx', 'Adabasx.call() with stub backend')
+def call_acbx():
+    api, stub = apimod()
+    return callbench(api.Adabasx)
+
+
+class ReadHandler(object):
+    """ Stub handler returning records for read sequences
+
+    :param stub: adapya.adabas.bench.stub module
+    :param calls: number of calls returning records before response 3
+    :param mfcount: number of records per call with multifetch
+    """
+    def __init__(self, stub, calls, mfcount=1):
+        self.stub = stub
+        self.calls = calls
+        self.mfcount = mfcount
+        self.n = 0
+        self.isn = 0
+        self.rec = Emp()
+        self.rec.buffer = bytearray(EMPLEN)
+        self.rec.persid = '50005500'
+        self.rec.name = 'ADKINSON'
+        self.rec.city = 'DERBY'
+        self.rec.salary = 26000
+        self.recbytes = bytes(self.rec.buffer)
+
+    def reset(self):
+        self.n = 0
+        self.isn = 0
+
+    def __call__(self, acb, bufs):
+        self.n += 1
+        if self.n > self.calls:
+            self.stub.setrsp(acb, 3)
+            return
+        self.stub.setrsp(acb, 0)
+        rb = bufs['R']
+        if self.mfcount > 1:
+            mb = bufs['M']
+            struct.pack_into('=L', mb, 0, self.mfcount)
+            for j in range(self.mfcount):
+                self.isn += 1
+                rb[j*EMPLEN:(j+1)*EMPLEN] = self.recbytes
+                struct.pack_into('=4L', mb, 4+16*j, EMPLEN, 0, self.isn, 0)
+            return {'R': self.mfcount*EMPLEN, 'M': 4+16*self.mfcount}
+        self.isn += 1
+        rb[0:EMPLEN] = self.recbytes
+        self.stub.setisn(acb, self.isn)
+        return {'R': EMPLEN}
+
+
+def readbench(multifetch=0):
+    api, stub = apimod()
+    handler = ReadHandler(stub, CALLS, multifetch or 1)
+    link = stub.StubLink(handler)
+    if multifetch:
+        c = api.Adabasx(fbl=64, rbl=EMPLEN*multifetch, mbl=4+16*multifetch,
+            multifetch=multifetch)
+    else:
+        c = api.Adabasx(fbl=64, rbl=EMPLEN)
+    c.cb.dbid = 12
+    c.cb.fnr = 11
+    c.fb.value = b'AA,AE,AJ,AS.'
+    emp = Emp()
+    def run():
+        handler.reset()
+        c.mfgen = None
+        n = 0
+        with stub.stublink(link):
+            for isn, rec in c.read(dmap=emp):
+                rec.name, rec.city, rec.salary
+                n += 1
+        return n
+    return run
+
+@benchmark('read', 'read() generator per record, one record per call')
+def read():
+    return readbench()
+
+@benchmark('multifetch', 'read() with multifetch per record')
+def multifetch():
+    return readbench(MFCOUNT)
+
+
+SEARCHVIEW = {
+    'name': ('AE', 20, 'A'),
+    'city': ('AJ', 20, 'A'),
+    'dept': ('AO', 6, 'A'),
+    'salary': ('AS', 5, 'P'),
+    }
+
+@benchmark('searchcrits', 'searchcrits() buffer construction')
+def searchcrits():
+    api, stub = apimod()
+    c = api.Adabas(sbl=256, vbl=256)
+    def run():
+        for i in range(LOOPS):
+            c.sb.pos = 0
+            c.vb.pos = 0
+            c.searchcrits(SEARCHVIEW,
+                "name = SMITH and city = DERBY* and 20000 < salary <= 30000")
+        return LOOPS
+    return run
+
+@benchmark('searchfield', 'searchfield() buffer construction')
+def searchfield():
+    api, stub = apimod()
+    c = api.Adabas(sbl=256, vbl=256)
+    def run():
+        for i in range(LOOPS):
+            c.searchfield('AE', 20, 'SMITH', first=1)
+            c.sb.write_text(',D,')
+            c.searchfield('AJ', 20, 'DERBY*')
+            c.sb.write_text(',D,')
+            c.searchfield('AS', 5, i, crit='GE', ffrm='P', last=1)
+        return LOOPS
+    return run
+
+
+@benchmark('readfdt', 'readfdt() LF/X parsing of the Employees FDT')
+def readfdt():
+    api, stub = apimod()
+    from adapya.adabas.fields import readfdt
+    lfx = lfxbuffer()
+    def handler(acb, bufs):
+        stub.setrsp(acb, 0)
+        bufs['R'][0:len(lfx)] = lfx
+        return {'R': len(lfx)}
+    link = stub.StubLink(handler)
+    def run():
+        with stub.stublink(link):
+            for i in range(LOOPS//10):
+                readfdt(12, 11)
+        return LOOPS//10
+    return run
+
+
+@benchmark('smf_decode', 'decode all fields of SMF interval records')
+def smf_decode():
+    from adapya.adabas import asmfrec31
+    from adapya.adabas.bench.samples import SMFSECTIONS
+    recs = [smfrecord(ist=1.6e9+i*900, seed=i+1) for i in range(10)]
+    base = asmfrec31.Asbase()
+    sects = dict((i, getattr(asmfrec31, s)()) for i, s, n in SMFSECTIONS)
+    def run():
+        for buf in recs:
+            base.buffer = buf
+            base.offset = 0
+            for key in base.keylist:
+                getattr(base, key)
+            for sectindex, sect in sects.items():
+                base.offset = 8*sectindex
+                sectoff, sectlen, sectnum = base.tido, base.tidl, base.tidn
+                if not sectoff:
+                    continue
+                sect.buffer = buf
+                sect.offset = sectoff
+                for j in range(sectnum):
+                    for key in sect.keylist:
+                        getattr(sect, key)
+                    sect.offset += sectlen
+        return len(recs)
+    return run
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
@@ -0,0 +1,209 @@
+"""adapya.adabas.bench.samples - Sample buffers for benchmarks
+==========================================================
+
+Builds buffers as they would be returned from an Adabas database or
+written by an Adabas nucleus so that the client code paths can be
+measured without a database:
+
+- lfxbuffer(): record buffer of an LF/X command (read FDT)
+- smfrecord(): Adabas SMF interval record with all sections
+- smffile(): file of SMF records with RDW as transferred from z/OS
+
+"""
+from __future__ import print_function          # PY3
+
+import struct
+import time
+
+from adapya.base.stck import sec1970
+
+# Employees demo file FDT: (level, name, length, format, options)
+EMPLOYEES_FDT = (
+    (1, 'AA',  8, 'A', ('UQ','DE')),
+    (1, 'AB',  0, ' ', ()),
+    (2, 'AC', 20, 'A', ('NU',)),
+    (2, 'AE', 20, 'A', ('DE',)),
+    (2, 'AD', 20, 'A', ('NU',)),
+    (1, 'AF',  1, 'A', ('FI',)),
+    (1, 'AG',  1, 'A', ('FI',)),
+    (1, 'AH',  6, 'U', ('DE',)),
+    (1, 'A1',  0, ' ', ()),
+    (2, 'AI', 20, 'A', ('NU','MU')),
+    (2, 'AJ', 20, 'A', ('NU','DE')),
+    (2, 'AK', 10, 'A', ('NU',)),
+    (2, 'AL',  3, 'A', ('NU',)),
+    (1, 'A2',  0, ' ', ()),
+    (2, 'AN',  6, 'A', ('NU',)),
+    (2, 'AM', 15, 'A', ('NU',)),
+    (1, 'AO',  6, 'A', ('DE',)),
+    (1, 'AP', 25, 'A', ('NU','DE')),
+    (1, 'AQ',  0, ' ', ('PE',)),
+    (2, 'AR',  3, 'A', ('NU',)),
+    (2, 'AS',  5, 'P', ('NU',)),
+    (2, 'AT',  5, 'P', ('NU','MU')),
+    (1, 'A3',  0, ' ', ()),
+    (2, 'AU',  2, 'U', ()),
+    (2, 'AV',  2, 'U', ('NU',)),
+    (1, 'AW',  0, ' ', ('PE',)),
+    (2, 'AX',  6, 'U', ('NU',)),
+    (2, 'AY',  6, 'U', ('NU',)),
+    (1, 'AZ',  3, 'A', ('NU','DE','MU')),
+    )
+
+# special descriptors: (type, name, length, format, options, parents)
+EMPLOYEES_SPECIALS = (
+    ('T', 'H1',  4, 'B', ('NU',), (('AU',1,2), ('AV',1,2))),
+    ('S', 'S1',  4, 'A', (), (('AO',1,4),)),
+    ('T', 'S2', 26, 'A', ('NU',), (('AO',1,6), ('AE',1,20))),
+    ('T', 'S3', 12, 'A', ('NU','PE'), (('AR',1,3), ('AS',1,9))),
+    )
+
+# option bits in LF/X field element
+LFXOP1 = {'DE':128, 'FI':64, 'MU':32, 'NU':16, 'PE':8, 'UQ':1}
+LFXOP2 = {'NB':128, 'NV':64, 'HF':32, 'XI':16, 'LA':8, 'LB':4, 'NN':2, 'NC':1}
+
+
+def lfxbuffer(fdt=EMPLOYEES_FDT, specials=EMPLOYEES_SPECIALS):
+    """ Return record buffer contents of an LF/X command (native byte order)
+        for a list of field and special descriptor definitions
+    """
+    parts = []
+    for level, fn, flen, fmt, opts in fdt:
+        op1 = sum(LFXOP1.get(o, 0) for o in opts)
+        op2 = sum(LFXOP2.get(o, 0) for o in opts)
+        parts.append(struct.pack('=cB2scB6BL', b'F', 16, fn.encode('ascii'),
+            fmt.encode('ascii'), op1, op2, level, 0, 0, 0, 0, flen))
+    for ftype, fn, flen, fmt, opts, parents in specials:
+        op1 = sum(LFXOP1.get(o, 0) for o in opts)
+        if ftype == 'S':
+            par, ffrom, fto = parents[0]
+            parts.append(struct.pack('=cB2scBHBx2s2H', b'S', 16, fn.encode('ascii'),
+                fmt.encode('ascii'), op1, flen, 0, par.encode('ascii'), ffrom, fto))
+        else:
+            elen = 10 + 6*len(parents)
+            pl = b''.join(struct.pack('=2s2H', par.encode('ascii'), ffrom, fto)
+                for par, ffrom, fto in parents)
+            parts.append(struct.pack('=cB2scBH2B', b'T', elen, fn.encode('ascii'),
+                fmt.encode('ascii'), op1, flen, 0, len(parents)) + pl)
+    body = b''.join(parts)
+    return struct.pack('=lcxHq', 16+len(body), b'X', len(fdt)+len(specials), 0) + body
+
+
+def stckval(t):
+    """ Return STCK value for time in seconds since the epoch """
+    return (int(t*1000000) + sec1970*1000000) << 12
+
+# SMF sections (section index, datamap class name, number of sections)
+SMFSECTIONS = (
+    (0, 'Aspid', 1),
+    (2, 'Asparm', 1),
+    (3, 'Asstg', 8),
+    (4, 'Asiodd', 6),
+    (5, 'Asthrd', 16),
+    (6, 'Asfile', 32),
+    (7, 'Ascmd', 24),
+    (9, 'Aschg', 1),
+    (10, 'Aschb', 4),
+    (11, 'Aschf', 4),
+    (12, 'Aslok', 31),
+    (13, 'Asmsgb', 1),
+    (14, 'Asmsgc', 1),
+    (15, 'Asmsgh', 1),
+    (17, 'Assess', 1),
+    (18, 'Ziip', 1),
+    )
+
+NUMFMT = {'B':0xff, 'H':0xffff, 'L':0xffffffff, 'Q':0xffffffffffffffff}
+
+def fillsection(dm, seed):
+    """ Set all numeric fields of datamap dm to values derived from seed
+        and all string fields to the upper case field name
+    """
+    for i, key in enumerate(dm.keylist):
+        ftype, pos, size, opt, fdic = dm.keydict[key]
+        if ftype in NUMFMT:
+            setattr(dm, key, (seed*1009 + i*17) & NUMFMT[ftype] & 0x7fffffff)
+        elif ftype == 1:    # T_STRING
+            setattr(dm, key, key.upper()[:size])
+
+
+def smfrecord(ist=None, interval=900, dbid=1, nucx=0, seed=1,
+              version='asmfrec31', sections=SMFSECTIONS, sty=3):
+    """ Return bytes of an Adabas SMF record with RDW
+
+    :param ist: interval start time in seconds since the epoch
+    :param interval: interval length in seconds
+    :param seed: base of counter values
+    :param sty: SMF record subtype (3 = interval statistics)
+    """
+    import importlib
+    vmod = importlib.import_module('adapya.adabas.'+version)
+    if ist is None:
+        ist = time.time()
+
+    base = vmod.Asbase()
+    reclen = vmod.ASBASELN
+    sects = []
+    for sectindex, sname, num in sections:
+        dm = getattr(vmod, sname)()
+        sects.append((sectindex, dm, num, reclen))
+        reclen += dm.dmlen*num
+
+    buf = bytearray(reclen)
+    base.buffer = buf
+    base.rlen = reclen
+    base.rty = b'\x6f'
+    base.sid = 'SYSA'
+    base.ssi = 'ADAB'
+    base.sty = sty
+
+    for sectindex, dm, num, off in sects:
+        struct.pack_into('!LHH', buf, 0x18+8*sectindex, off, dm.dmlen, num)
+        dm.buffer = buf
+        for j in range(num):
+            dm.offset = off + j*dm.dmlen
+            fillsection(dm, seed+j)
+            if sectindex == 0:
+                dm.smfv = vmod.ASSMFVC
+                dm.numd = (vmod.ASBASELN - 0x18)//8
+                dm.jbn = 'ADANUC%02d' % nucx
+                dm.dbid = dbid
+                dm.nucx = nucx
+                dm.st = 0
+                dm.ist = 0
+                dm.iet = 0
+                for key, t in (('st', ist - 86400), ('ist', ist), ('iet', ist+interval)):
+                    struct.pack_into('!Q', buf, off+dm.keydict[key][1], stckval(t))
+    return bytes(buf)
+
+
+def smffile(fname, numrecs=100, interval=900, dbid=1, nucs=(0,), start=None):
+    """ Write file with interval SMF records of one or more nuclei
+
+    :returns: number of bytes written
+    """
+    if start is None:
+        start = time.time() - numrecs*interval
+    n = 0
+    with open(fname, 'wb') as f:
+        for i in range(numrecs):
+            for nucx in nucs:
+                rec = smfrecord(ist=start+i*interval, interval=interval,
+                    dbid=dbid, nucx=nucx, seed=i+1)
+                f.write(rec)
+                n += len(rec)
+    return n
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
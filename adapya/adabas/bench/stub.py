@@ -0,0 +1,140 @@
+"""adapya.adabas.bench.stub - Stub backend replacing the Adabas link routine
+========================================================================
+
+The StubLink object has the same call interface as the adalink library
+loaded in adapya.adabas.api. Installed with stublink() the Adabas calls
+of the api module are passed to a Python handler function instead of
+a database::
+
+    from adapya.adabas.bench.stub import StubLink, stublink, setrsp
+
+    def handler(acb, bufs):
+        setrsp(acb, 3)              # always end of data
+
+    with stublink(StubLink(handler)):
+        ...   # Adabas calls
+
+The handler gets the control block buffer and a dict of buffer id to
+buffer. The buffers support slice assignment.
+
+Note: the Adabas Client Library is still needed for importing the
+api module.
+
+"""
+from __future__ import print_function          # PY3
+
+import ctypes
+import struct
+from contextlib import contextmanager
+
+from adapya.adabas import api
+
+ACBRSP = api.Acb().keydict['rsp'][1]
+ACBISN = api.Acb().keydict['isn'][1]
+ACBXRSP = api.Acbx().keydict['rsp'][1]
+ACBXISN = api.Acbx().keydict['isn'][1]
+ABDID = 4           # ABD offset of buffer id
+ABDSIZE = 16        # ABD offset of buffer size
+ABDRECV = 32        # ABD offset of receive size
+ABDADDR = 40        # ABD offset of buffer address (64 bit)
+
+
+def setrsp(acb, rsp):
+    """ Set response code in ACB or ACBX """
+    struct.pack_into('=H', acb, ACBXRSP if len(acb) == api.ACBXLEN else ACBRSP, rsp)
+
+def setisn(acb, isn):
+    """ Set ISN in ACB or ACBX """
+    if len(acb) == api.ACBXLEN:
+        struct.pack_into('=Q', acb, ACBXISN, isn)
+    else:
+        struct.pack_into('=L', acb, ACBISN, isn)
+
+def getcmd(acb):
+    """ Return command code from ACB or ACBX """
+    return acb[6:8] if len(acb) == api.ACBXLEN else acb[2:4]
+
+
+class StubLink(object):
+    """ Replacement of the Adabas link routine calling a handler
+
+    :param handler: function handler(acb, bufs) called for each
+                    Adabas call, bufs is a dict of buffer id
+                    ('F','R','S','V','I','M') to buffer. With ACBX
+                    calls the handler may return a dict of buffer id
+                    to receive length which is set in the ABDs.
+    """
+    def __init__(self, handler=None):
+        self.handler = handler
+        self.calls = 0
+
+    def adabas(self, acb, fb, rb, sb, vb, ib):
+        self.calls += 1
+        if self.handler:
+            self.handler(acb, {'F':fb, 'R':rb, 'S':sb, 'V':vb, 'I':ib})
+        return 0
+
+    def adabasx(self, acb, abdn, abda):
+        self.calls += 1
+        if self.handler:
+            abds = {}
+            bufs = {}
+            ptrs = ctypes.cast(abda, ctypes.POINTER(ctypes.c_void_p))
+            for i in range(abdn):
+                abd = (ctypes.c_char*api.ABDXL).from_address(ptrs[i])
+                bid = abd[ABDID].decode('latin1')
+                size, = struct.unpack_from('=Q', abd, ABDSIZE)
+                baddr, = struct.unpack_from('=Q', abd, ABDADDR)
+                if bid not in bufs and size:
+                    bufs[bid] = (ctypes.c_char*size).from_address(baddr)
+                    abds[bid] = abd
+            recv = self.handler(acb, bufs)
+            if recv:
+                for bid, n in recv.items():
+                    struct.pack_into('=Q', abds[bid], ABDRECV, n)
+        return 0
+
+    def lnk_set_adabas_id(self, aidb):
+        return 0
+
+    def lnk_get_adabas_id(self, size, aidb):
+        return 0
+
+    def lnk_set_uid_pw(self, dbid, uid, pw):
+        return 0
+
+    def AdaSetParameter(self, parm):
+        return 0
+
+    def AdaSetTimeout(self, i, sec):
+        return 0
+
+    def AdaSetSaf(self, safib):
+        return 0
+
+
+@contextmanager
+def stublink(stub):
+    """ Context manager installing stub as Adabas link routine
+        of the api module
+    """
+    save = api.adalink
+    api.adalink = stub
+    try:
+        yield stub
+    finally:
+        api.adalink = save
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
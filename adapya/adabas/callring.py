@@ -0,0 +1,334 @@
+"""adapya.adabas.callring - Ring of recent Adabas calls with incident capture
+=========================================================================
+
+A Callring keeps a fixed number of cheap call descriptors of the most
+recent Adabas calls in memory. Only when a call takes longer than
+a threshold or returns an unexpected response code, the control block and
+the buffers relevant for the command (see api.cmdbufs) are written
+to a binary incident file.
+
+Usage::
+
+    from adapya.adabas.api import Adabasx
+    from adapya.adabas.callring import Callring
+
+    c1 = Adabasx(fbl=64, rbl=256)
+    c1.callring = Callring(maxtime=2.0, incfile='slowcalls.inc')
+
+    ...   # Adabas calls as usual
+
+    c1.callring.show(10)    # show last 10 calls
+
+An incident file can be rendered later with showincidents()::
+
+    from adapya.adabas.callring import showincidents
+    showincidents('slowcalls.inc')
+
+"""
+from __future__ import print_function          # PY3
+
+import itertools
+import struct
+import threading
+import time
+
+from adapya.base.defs import Abuf, adalog
+from adapya.base.defs import LOGFB,LOGRB,LOGSB,LOGVB,LOGIB,LOGMB,LOGPB,LOGUB,LOGSP
+from adapya.base.datamap import NATIVEBO, NETWORKBO
+from adapya.base.dump import dump
+from adapya.adabas.api import Acb, Acbx, Abdx, cmdbufs, ACBXLEN
+from adapya.adabas import adaerror
+
+# incident reasons
+INCSLOW = 1     # call time exceeded threshold
+INCRSP = 2      # unexpected response code
+
+# incident flags
+INCACBX = 1     # control block is ACBX
+INCEBC = 2      # buffers are EBCDIC
+INCNWBO = 4     # buffers are in network byte order
+
+INCEYE = b'ADAI'
+INCVERS = 1
+
+# incident header: eye, version, flags, reason, number of buffers,
+#   time of call end, call duration in seconds, thread ident,
+#   call sequence number in ring, length of control block
+INCHDR = struct.Struct('!4sBBBBddQLH2x')
+# buffer header: ABD id, reserved, length of ABD (ACBX only), data length
+INCBUF = struct.Struct('!cxHL')
+
+# buffer types in sequence of logging options
+BUFLOGS = ((LOGFB,'F'), (LOGRB,'R'), (LOGSB,'S'), (LOGVB,'V'), (LOGIB,'I'),
+           (LOGMB,'M'), (LOGPB,'P'), (LOGUB,'U'))
+
+BUFNAMES = {'F':'Format Buffer', 'R':'Record Buffer', 'S':'Search Buffer',
+    'V':'Value Buffer', 'I':'ISN Buffer', 'M':'Multifetch Buffer',
+    'P':'Performance Buffer', 'U':'User Buffer'}
+
+# buffers captured if command is not in cmdbufs
+ALLBUFS = LOGFB|LOGRB|LOGSB|LOGVB|LOGIB|LOGMB
+
+def cmdbufmask(cmd, sent=1, received=1):
+    """ Return mask of logging options for the buffers sent or received
+        with a given command. Commands where the buffer usage depends on
+        the command options (LOGSP) include the record buffer and on return
+        also the ISN and multifetch buffer.
+
+    :param sent: include buffers sent to Adabas
+    :param received: include buffers returned from Adabas
+    """
+    bf, bfa = cmdbufs.get(cmd, (ALLBUFS,0))
+    mask = 0
+    if sent:
+        mask |= bf | (LOGRB if bf & LOGSP else 0)
+    if received:
+        mask |= bfa | (LOGRB|LOGIB|LOGMB if bfa & LOGSP else 0)
+    return mask & ~LOGSP
+
+
+class Callring(object):
+    """ Fixed size ring of call descriptors of recent Adabas calls
+
+    The ring is set on an Adabas or Adabasx object in the *callring*
+    attribute. After each call() the descriptor (time, duration,
+    thread ident and control block bytes) is stored in the ring.
+
+    :param size: number of call descriptors to keep
+    :param maxtime: call duration in seconds above which an incident
+                    is written, 0 only writes incidents for responses
+    :param incfile: name of incident file, incidents are appended.
+                    If empty no incidents are written
+    :param okrsps: response codes not considered as incident
+    :param maxinc: maximum number of incidents to write
+    :param bufopt: logging options of buffers always captured
+                   in addition to those selected per command
+
+    A ring may be shared between Adabas objects of several threads.
+    """
+    def __init__(self, size=256, maxtime=1.0, incfile='', okrsps=(0,2,3),
+                 maxinc=100, bufopt=0):
+        self.size = size
+        self.ring = [None]*size
+        self.seq = itertools.count()
+        self.maxtime = maxtime
+        self.incfile = incfile
+        self.okrsps = okrsps
+        self.maxinc = maxinc
+        self.bufopt = bufopt
+        self.incidents = 0      # number of incidents written
+        self.lock = threading.Lock()
+
+    def add(self, apa, elapsed):
+        """ Register call descriptor and check for incident. This is
+            called from Adabas.call() after the call returned.
+
+        :param apa: Adabas or Adabasx object of the call
+        :param elapsed: call duration in seconds
+        """
+        n = next(self.seq)
+        now = time.time()
+        ident = threading.current_thread().ident or 0
+        self.ring[n % self.size] = (n, now, elapsed, ident, apa.acb.raw)
+
+        reason = 0
+        if self.maxtime and elapsed > self.maxtime:
+            reason = INCSLOW
+        else:
+            rsp = apa.cb.rsp
+            if rsp not in self.okrsps and not (rsp == 64 and apa.cb.cmd == 'CL'):
+                reason = INCRSP
+        if reason and self.incfile and self.incidents < self.maxinc:
+            self.incident(apa, reason, n, now, elapsed, ident)
+
+    def calls(self, n=0):
+        """ Return list of the last n call descriptors, oldest first
+            (all in ring if n=0). A descriptor is a tuple
+            (seqno, endtime, duration, thread ident, control block bytes)
+        """
+        cl = sorted((c for c in self.ring if c), key=lambda c: c[0])
+        return cl[-n:] if n else cl
+
+    def show(self, n=0, log=adalog.debug):
+        """ Log the last n call descriptors """
+        for seqno, now, elapsed, ident, acb in self.calls(n):
+            cb = cbmap(acb)
+            log('%6d %s.%03d %8.3f ms thread=%X cmd=%s fnr=%d isn=%d rsp=%d' % (
+                seqno, time.strftime('%H:%M:%S', time.localtime(now)),
+                int(now*1000)%1000, elapsed*1000., ident, cb.cmd, cb.fnr,
+                cb.isn, cb.rsp))
+
+    def incident(self, apa, reason, seqno, now, elapsed, ident):
+        """ Write control block and buffers of the current call
+            to the incident file
+        """
+        cb = apa.cb
+        mask = cmdbufmask(cb.cmd) | self.bufopt
+        bufs = []                   # list of (id, abd bytes, data bytes)
+
+        if len(apa.acb) == ACBXLEN:
+            for abdb, buf in zip(apa.abds, apa.bufs):
+                abd = Abdx(buffer=abdb, ebcdic=apa.ebcdic, byteOrder=apa.bo)
+                for lopt, bid in BUFLOGS:
+                    if abd.id == bid:
+                        if mask & lopt:
+                            dlen = min(max(abd.send, abd.recv), abd.size)
+                            bufs.append((bid, abdb.raw, buf[0:dlen]))
+                        break
+        else:
+            # classic ACB: multifetch elements are returned in ISN buffer
+            if mask & LOGMB:
+                mask |= LOGIB
+            for lopt, bid, buf, blen in (
+                    (LOGFB, 'F', apa.fb, cb.fbl), (LOGRB, 'R', apa.rb, cb.rbl),
+                    (LOGSB, 'S', apa.sb, cb.sbl), (LOGVB, 'V', apa.vb, cb.vbl),
+                    (LOGIB, 'I', apa.ib, cb.ibl)):
+                if mask & lopt and buf and blen > 0:
+                    bufs.append((bid, b'', buf[0:min(blen, len(buf))]))
+
+        flags = (INCACBX if len(apa.acb) == ACBXLEN else 0) | \
+                (INCEBC if apa.ebcdic else 0) | \
+                (INCNWBO if apa.bo == NETWORKBO else 0)
+
+        acb = apa.acb.raw
+        parts = [INCHDR.pack(INCEYE, INCVERS, flags, reason, len(bufs),
+                             now, elapsed, ident, seqno, len(acb)), acb]
+        for bid, abdb, data in bufs:
+            parts.append(INCBUF.pack(bid.encode('ascii'), len(abdb), len(data)))
+            parts.append(abdb)
+            parts.append(data)
+
+        with self.lock:
+            with open(self.incfile, 'ab') as f:
+                f.write(b''.join(parts))
+            self.incidents += 1
+
+
+def cbmap(acb, ebcdic=0, byteorder=NATIVEBO):
+    """ Return Acb or Acbx datamap on a copy of the control block bytes
+        without resetting the control block fields
+    """
+    if len(acb) == ACBXLEN:
+        cb = Acbx(ebcdic=ebcdic, byteOrder=byteorder)
+    else:
+        cb = Acb(ebcdic=ebcdic, byteOrder=byteorder)
+    cb.buffer = Abuf(acb)
+    return cb
+
+
+class Incident(object):
+    """ Incident read from incident file
+
+    :ivar reason: INCSLOW or INCRSP
+    :ivar flags: INCACBX, INCEBC, INCNWBO
+    :ivar time: time of call end in seconds since epoch
+    :ivar elapsed: call duration in seconds
+    :ivar thread: thread ident
+    :ivar seqno: sequence number of call in Callring
+    :ivar acb: control block bytes
+    :ivar bufs: list of tuples (buffer id, ABD bytes, buffer bytes)
+    """
+    def __init__(self, flags, reason, time, elapsed, thread, seqno, acb, bufs):
+        self.flags = flags
+        self.reason = reason
+        self.time = time
+        self.elapsed = elapsed
+        self.thread = thread
+        self.seqno = seqno
+        self.acb = acb
+        self.bufs = bufs
+
+    @property
+    def cb(self):
+        return cbmap(self.acb, ebcdic=self.flags&INCEBC,
+                     byteorder=NETWORKBO if self.flags&INCNWBO else NATIVEBO)
+
+
+def readincidents(fname):
+    """ Generator returning Incident objects from incident file """
+    with open(fname, 'rb') as f:
+        data = f.read()
+    p = 0
+    while p + INCHDR.size <= len(data):
+        eye, vers, flags, reason, nbufs, now, elapsed, ident, seqno, acbl = \
+            INCHDR.unpack_from(data, p)
+        if eye != INCEYE:
+            raise ValueError('Invalid incident eyecatcher %r at offset %d' % (eye, p))
+        p += INCHDR.size
+        acb = data[p:p+acbl]
+        p += acbl
+        bufs = []
+        for i in range(nbufs):
+            bid, abdl, dlen = INCBUF.unpack_from(data, p)
+            p += INCBUF.size
+            bufs.append((bid.decode('ascii'), data[p:p+abdl], data[p+abdl:p+abdl+dlen]))
+            p += abdl+dlen
+        yield Incident(flags, reason, now, elapsed, ident, seqno, acb, bufs)
+
+
+def showincident(inc, log=adalog.debug):
+    """ Log incident with control block interpreted similar
+        to showCB() and the buffers dumped
+    """
+    cb = inc.cb
+    ebcdic = inc.flags&INCEBC
+    bo = NETWORKBO if inc.flags&INCNWBO else NATIVEBO
+
+    log('\n%s call %d thread=%X at %s duration=%8.3f ms' % (
+        'Slow' if inc.reason == INCSLOW else 'Response',
+        inc.seqno, inc.thread,
+        time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(inc.time)),
+        inc.elapsed*1000.))
+
+    if inc.flags & INCACBX:
+        log('cmd=%s op1/2/3=%s/%s/%s ad1=%s dbid=%d fnr=%d cmdt=%6.3f ms rsp=%d' % \
+            (cb.cmd, repr(cb.op1), repr(cb.op2), repr(cb.op3), repr(cb.ad1), cb.dbid,
+                cb.fnr, cb.cmdt*16./1000, cb.rsp))
+        log('cid=%d isn=%d isl=%d isq=%d' % (cb.cidn, cb.isn, cb.isl, cb.isq))
+        log('ad3=%s, ad4=%s, ad5=%s, pdbid=%d, pnucid=%d' % \
+            (repr(cb.ad3), repr(cb.ad4), repr(cb.ad5), cb.pdbid, cb.pnucid))
+        if cb.rsp:
+            log(adaerror.rsptext(cb.rsp,
+                struct.unpack('=H',(cb.errbb+b'\x00\x00')[:2])[0], cb.errc,
+                cmd=cb.cmd, subcmd1=cb.op1, subcmd2=cb.op2))
+        dump(inc.acb, 'Control Block Extended', 'CB', log=log)
+    else:
+        log('cmd=%s op1/2=%s/%s ad1=%s fnr=%d cmdt=%6.3f ms rsp=%d' % \
+            (cb.cmd, repr(cb.op1), repr(cb.op2), repr(cb.ad1),
+                cb.fnr, cb.cmdt*16./1000, cb.rsp))
+        log('cid=%d isn=%d isl=%d isq=%d' % (cb.cidn, cb.isn, cb.isl, cb.isq))
+        log('fbl=%d, rbl=%d, sbl=%d, vbl=%d, ibl=%d' % \
+            (cb.fbl, cb.rbl, cb.sbl, cb.vbl, cb.ibl))
+        log('ad3=%s, ad4=%s, ad5=%s, pdbid=%d, pnucid=%d' % \
+            (repr(cb.ad3), repr(cb.ad4), repr(cb.ad5), cb.pdbid, cb.pnucid))
+        dump(inc.acb, 'Control Block', 'CB', log=log)
+
+    for bid, abdb, data in inc.bufs:
+        name = BUFNAMES.get(bid, bid)
+        if abdb:
+            abd = Abdx(ebcdic=ebcdic, byteOrder=bo)
+            abd.buffer = Abuf(abdb)
+            dump(data, '%s - %d/%d/%d' % (name, abd.size, abd.send, abd.recv),
+                 bid+'B', log=log)
+        else:
+            dump(data, name, bid+'B', log=log)
+
+
+def showincidents(fname, log=adalog.debug):
+    """ Log all incidents of an incident file """
+    for inc in readincidents(fname):
+        showincident(inc, log=log)
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
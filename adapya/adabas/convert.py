@@ -0,0 +1,287 @@
+"""adapya.adabas.convert - Batch conversion of EBCDIC and network byte order records
+==================================================================================
+
+Records read from a mainframe database or SMF data have alphanumeric
+fields in EBCDIC and numeric fields in network byte order. Instead of
+converting each field when it is accessed, a Layout converts a batch
+of fixed length records at once:
+
+- the batch is translated with one bytes.translate() pass from the
+  EBCDIC code page to latin-1 and the bytes that are not alphanumeric
+  are copied back
+- integer and floating point fields are reversed to native byte order
+- both are done per byte column of the records with extended slices
+  (one slice assignment per record byte for the whole batch) or per
+  field run of each record, whatever takes fewer operations
+
+After conversion the records are decoded with encoding latin-1 and
+native byte order.
+
+A Layout is built from the format buffer and FDT (fblayout()), from
+a list of Adabas field lengths and formats (formatlayout()) or from a
+Datamap (dmaplayout()).
+
+Multifetch with the Adabas and Adabasx classes converts each batch of
+records when the attribute batchlayout of the session or cursor is
+set::
+
+    >>> from adapya.adabas.convert import fblayout
+    >>> c1.batchlayout = fblayout('AA,8,A,AE,20,A,AD,4,F.', fdt)
+    >>> emp = Datamap('emp', String('aa', 8), String('ae', 20), Int4('ad'),
+    ...               byteOrder=NATIVEBO)
+    >>> for isn, rlen in c1.read(dmap=emp):
+    ...     print(emp.aa, emp.ae, emp.ad)
+
+The DB-API module (adapya.adabas.dbapi) uses it for cursors with an
+arraysize above 1 and the SMF section decoder (adapya.adabas.smf) for
+the alphanumeric fields of the section elements.
+
+"""
+from __future__ import print_function          # PY3
+
+import re
+import sys
+
+from adapya.base import datamap
+from adapya.base.datamap import T_STRING, T_CHAR, T_NONE, T_EBCDIC, T_NWBO, \
+    NETWORKBO
+
+EBCDIC = 'cp037'
+
+# struct format characters of numeric Datamap fields
+NUMTYPES = tuple('hHiIlLqQfd')
+
+# Adabas formats of numeric fields in machine byte order
+NUMFORMATS = 'FG'
+
+IDENTITY = bytes(bytearray(range(256)))
+
+
+class ConvertError(ValueError):
+    pass
+
+
+def transtable(encoding=EBCDIC):
+    """ Return 256 byte table for bytes.translate() converting bytes of
+        the single byte code page encoding to latin-1
+
+        None if encoding is latin-1 (nothing to translate) or not a
+        single byte code page
+    """
+    try:
+        table = IDENTITY.decode(encoding).encode('latin1', 'replace')
+    except (UnicodeDecodeError, LookupError):
+        return None
+    if len(table) != 256 or table == IDENTITY:
+        return None
+    return table
+
+
+def swapping(byteorder):
+    """ Return 1 if numbers in struct byteorder ('!', '>', '<', '=', '@')
+        are to be reversed to native byte order
+    """
+    if byteorder in (NETWORKBO, '>'):
+        return sys.byteorder == 'little'
+    if byteorder == '<':
+        return sys.byteorder == 'big'
+    return 0
+
+
+def runs(positions):
+    """ Return list of (start, end) of the runs of consecutive positions """
+    result = []
+    for p in positions:
+        if result and result[-1][1] == p:
+            result[-1][1] = p+1
+        else:
+            result.append([p, p+1])
+    return [tuple(r) for r in result]
+
+
+class Layout(object):
+    """ Layout of fixed length records for batch conversion
+
+    :param fields: list of (offset, length, kind) with kind 'A' for
+                   alphanumeric fields to translate, 'S' for numeric
+                   fields to reverse, the other bytes are left
+    :param reclen: record length
+    :param encoding: code page of the alphanumeric fields, see transtable()
+
+    :ivar changes: 0 if the layout leaves the records unchanged
+    """
+    def __init__(self, fields, reclen, encoding=EBCDIC):
+        self.reclen = reclen
+        self.table = transtable(encoding) if encoding else None
+        alpha = set()
+        self.swaps = []         # (offset, length) of fields to reverse
+        end = 0
+        for off, length, kind in sorted(fields):
+            if off < end or off+length > reclen:
+                raise ConvertError('Field at offset %d length %d overlaps or '
+                    'exceeds record length %d' % (off, length, reclen))
+            end = off+length
+            if kind == 'A' and self.table:
+                alpha.update(range(off, end))
+            elif kind == 'S' and length > 1:
+                self.swaps.append((off, length))
+        swapped = set()
+        for off, length in self.swaps:
+            swapped.update(range(off, off+length))
+        other = [p for p in range(reclen) if p not in swapped and p not in alpha]
+
+        # start from the translated batch and copy back the other bytes
+        # or from the original batch and copy the translated bytes
+        self.fromtr = len(other) < len(alpha)
+        self.copies = other if self.fromtr else sorted(alpha)
+        self.copyruns = runs(self.copies)
+        self.changes = bool(alpha or self.swaps)
+
+    def convertbytes(self, data):
+        """ Return bytearray of the records in data (multiple of reclen)
+            converted to latin-1 and native byte order
+        """
+        rl = self.reclen
+        count, rest = divmod(len(data), rl)
+        if rest:
+            raise ConvertError('Length %d not a multiple of record length %d'
+                % (len(data), rl))
+        src = bytes(data)
+        if not self.changes:
+            return bytearray(src)
+        tr = src.translate(self.table) if self.table else src
+        if self.fromtr:
+            out, copy = bytearray(tr), src
+        else:
+            out, copy = bytearray(src), tr
+
+        swaps = self.swaps
+        columns = len(self.copies) + sum(length for off, length in swaps)
+        if count*(len(self.copyruns)+len(swaps)) < columns:
+            for i in range(0, len(src), rl):
+                for a, b in self.copyruns:
+                    out[i+a:i+b] = copy[i+a:i+b]
+                for off, length in swaps:
+                    out[i+off:i+off+length] = src[i+off:i+off+length][::-1]
+        else:
+            for p in self.copies:
+                out[p::rl] = copy[p::rl]
+            for off, length in swaps:
+                for j in range(length):
+                    out[off+j::rl] = src[off+length-1-j::rl]
+        return out
+
+    def convert(self, buf, offset=0, count=1):
+        """ Convert count records at offset in buf in place
+
+        :param buf: writable buffer, e.g. Abuf or bytearray
+        """
+        if not self.changes or count < 1:
+            return
+        size = self.reclen*count
+        buf[offset:offset+size] = bytes(self.convertbytes(buf[offset:offset+size]))
+
+
+def formatlayout(fields, encoding=EBCDIC, byteorder=NETWORKBO):
+    """ Return Layout of records of consecutive fields
+
+    :param fields: list of (length, Adabas format): format A is
+                   translated, F and G are reversed, others are left
+    :param encoding: code page of format A fields
+    :param byteorder: struct byte order of F and G fields
+    """
+    swap = swapping(byteorder)
+    layout = []
+    off = 0
+    for flen, fmt in fields:
+        if fmt == 'A':
+            layout.append((off, flen, 'A'))
+        elif swap and fmt in NUMFORMATS:
+            layout.append((off, flen, 'S'))
+        off += flen
+    return Layout(layout, off, encoding)
+
+
+FBTOKEN = re.compile(r'^(?:(?P<skip>\d+)X|(?P<fn>[A-Z][A-Z0-9]))$')
+
+
+def fblayout(fb, fdt, encoding=EBCDIC, byteorder=NETWORKBO):
+    """ Return Layout of the records read with format buffer fb
+
+    :param fb: format buffer string of field elements 'fn[,len][,fmt]'
+               and 'nX' (n blanks), e.g. 'AA,8,A,1X,AB,4,F.'
+    :param fdt: dictionary of field name to (length, format, options)
+                with the standard length and format of the fields, e.g.
+                from adapya.adabas.dbapi.Connection.fdt()
+    """
+    tokens = [t.strip().upper() for t in fb.strip().rstrip('.').split(',')]
+    fields = []
+    i = 0
+    while i < len(tokens):
+        m = FBTOKEN.match(tokens[i])
+        i += 1
+        if not m:
+            raise ConvertError('Format buffer element %r not supported'
+                % tokens[i-1])
+        if m.group('skip'):
+            fields.append((int(m.group('skip')), 'A'))
+            continue
+        fn = m.group('fn')
+        if fn not in fdt:
+            raise ConvertError('Field %s not in FDT' % fn)
+        flen, fmt, opts = fdt[fn]
+        if 'MU' in opts or 'PE' in opts:
+            raise ConvertError('Field %s: MU or PE field' % fn)
+        if i < len(tokens) and tokens[i].isdigit():
+            flen = int(tokens[i])
+            i += 1
+        if i < len(tokens) and len(tokens[i]) == 1 and tokens[i].isalpha():
+            fmt = tokens[i]
+            i += 1
+        if not flen:
+            raise ConvertError('Field %s has variable length' % fn)
+        fields.append((flen, fmt))
+    return formatlayout(fields, encoding, byteorder)
+
+
+def dmaplayout(dmap, reclen=None, swap=1):
+    """ Return Layout of the records mapped by Datamap dmap
+
+    String and Char fields of an EBCDIC Datamap or with option T_EBCDIC
+    are translated, numeric fields in network byte order reversed.
+    Filler fields (T_NONE), occurring fields and fields that redefine
+    bytes of preceding fields are left.
+
+    :param reclen: record length, default is the end of the last field
+    :param swap: 0 leaves the numeric fields
+    """
+    bo = dmap.__dict__.get('byteOrder') or datamap.byteOrder
+    layout = []
+    pos = 0
+    for fpos, i, key in sorted((dmap.keydict[k][1], i, k)
+            for i, k in enumerate(dmap.keylist)):
+        fty, fpos, size, opt, fdict = dmap.keydict[key]
+        if fpos < pos or opt & T_NONE or not size or fdict.get('occurs'):
+            continue
+        if fty in (T_STRING, T_CHAR):
+            if dmap.ebcdic or opt & T_EBCDIC:
+                layout.append((fpos, size, 'A'))
+        elif swap and fty in NUMTYPES and swapping(NETWORKBO
+                if opt & T_NWBO else bo):
+            layout.append((fpos, size, 'S'))
+        pos = fpos + size
+    return Layout(layout, pos if reclen is None else reclen)
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
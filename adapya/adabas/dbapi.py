@@ -0,0 +1,630 @@
+"""adapya.adabas.dbapi - Python DB-API 2.0 interface for Adabas
+=============================================================
+
+Implements the Python Database API Specification 2.0 (PEP 249)
+on top of the Adabasx class::
+
+    >>> from adapya.adabas import dbapi
+    >>> conn = dbapi.connect(dbid=8)
+    >>> cur = conn.cursor()
+    >>> cur.arraysize = 50
+    >>> cur.execute("SELECT AA,AC,AE FROM 11 WHERE AE = :name", {'name': 'SMITH'})
+    >>> for row in cur.fetchmany():
+    ...     print(row)
+    ('50005800', 'SEYMOUR', 'SMITH')
+    >>> conn.close()
+
+Queries have the form::
+
+    [SELECT] field[(length)],... FROM fnr [WHERE criteria] [ORDER BY descriptor]
+
+Fields are Adabas short names. The field length and format are taken
+from the FDT; fields of variable length need the length in parentheses.
+MU and PE fields and groups are not supported.
+
+The criteria are search terms connected by AND or OR and evaluated from
+left to right::
+
+    field op value              op is one of = != < <= > >=
+    field BETWEEN value AND value
+
+Values are numbers, quoted strings, words or parameters :name
+(paramstyle 'named') taken from the parameters dictionary.
+A value ending with * selects a range (e.g. 'SMI*').
+
+A query is compiled once per connection into format, search and
+value buffer and into a row decoder which returns plain tuples.
+
+- WHERE: find with ISN list (S1, S2 with ORDER BY) followed by
+  read by ISN list (L1 with option N)
+- ORDER BY without WHERE: read in logical sequence (L3)
+- otherwise: read physical (L2)
+
+The cursor arraysize is used as the number of records read with
+one multifetch call. Cursors of a connection share the Adabas session;
+each has its own command id (see adapya.adabas.api.Cursor).
+
+"""
+from __future__ import print_function          # PY3
+
+import binascii
+import datetime
+import re
+import struct
+import time
+
+from adapya.adabas import api
+from adapya.adabas.api import Adabasx, AdabasException, lowvalue
+from adapya.adabas.convert import formatlayout
+from adapya.adabas.fields import readfdt
+from adapya.base.datamap import Datamap, NETWORKBO
+
+apilevel = '2.0'
+threadsafety = 1        # threads may share module but not connections
+paramstyle = 'named'
+
+
+class Error(Exception): pass
+class Warning(Exception): pass
+class InterfaceError(Error): pass
+class DatabaseError(Error): pass
+class DataError(DatabaseError): pass
+class OperationalError(DatabaseError): pass
+class IntegrityError(DatabaseError): pass
+class InternalError(DatabaseError): pass
+class ProgrammingError(DatabaseError): pass
+class NotSupportedError(DatabaseError): pass
+
+# Adabas response codes mapped to DB-API exceptions
+RSPERRORS = {
+    9: OperationalError,    # transaction or session timeout
+    17: ProgrammingError,   # invalid file number
+    21: ProgrammingError,   # invalid command id
+    22: InterfaceError,     # invalid command
+    40: ProgrammingError,   # format buffer error
+    41: ProgrammingError,   # format buffer error
+    44: ProgrammingError,   # format buffer not usable
+    52: DataError,          # invalid value
+    55: DataError,          # conversion error
+    60: ProgrammingError,   # search buffer error
+    61: ProgrammingError,   # search buffer error
+    145: OperationalError,  # record in hold
+    148: OperationalError,  # database not active
+    198: IntegrityError,    # unique descriptor violation
+    }
+
+def error(e):
+    """ Return DB-API exception for AdabasException e """
+    rsp = e.apa.cb.rsp if getattr(e, 'apa', None) else 0
+    cls = RSPERRORS.get(rsp, InterfaceError if isinstance(e, api.InterfaceError)
+                                            else DatabaseError)
+    x = cls(e.value)
+    x.rsp = rsp
+    return x
+
+
+# type objects and constructors
+class DBAPITypeObject(object):
+    def __init__(self, *values):
+        self.values = values
+    def __eq__(self, other):
+        return other in self.values
+    def __ne__(self, other):
+        return other not in self.values
+    def __hash__(self):
+        return hash(self.values)
+
+STRING = DBAPITypeObject('A', 'W')
+BINARY = DBAPITypeObject('B')
+NUMBER = DBAPITypeObject('U', 'P', 'F', 'G')
+DATETIME = DBAPITypeObject()
+ROWID = DBAPITypeObject('ISN')
+
+Date = datetime.date
+Time = datetime.time
+Timestamp = datetime.datetime
+Binary = bytes
+
+def DateFromTicks(ticks):
+    return Date(*time.localtime(ticks)[:3])
+
+def TimeFromTicks(ticks):
+    return Time(*time.localtime(ticks)[3:6])
+
+def TimestampFromTicks(ticks):
+    return Timestamp(*time.localtime(ticks)[:6])
+
+
+def connect(dbid, arraysize=1, password='', mode=None, **kw):
+    """ Open an Adabas session and return Connection object
+
+    :param dbid: database id
+    :param arraysize: default arraysize (multifetch count) of cursors
+    :param password: Adabas file password
+    :param mode: open mode, see Adabas.open()
+    """
+    return Connection(dbid, arraysize=arraysize, password=password,
+                      mode=mode, **kw)
+
+
+class Connection(object):
+    """ Adabas session as DB-API connection """
+
+    Error = Error
+    Warning = Warning
+    InterfaceError = InterfaceError
+    DatabaseError = DatabaseError
+    DataError = DataError
+    OperationalError = OperationalError
+    IntegrityError = IntegrityError
+    InternalError = InternalError
+    ProgrammingError = ProgrammingError
+    NotSupportedError = NotSupportedError
+
+    def __init__(self, dbid, arraysize=1, password='', mode=None, **kw):
+        self.dbid = dbid
+        self.arraysize = arraysize
+        self.password = password
+        self.fdts = {}          # file number -> field dictionary
+        self.queries = {}       # operation -> compiled Query
+        self.cursors = []
+        # session buffers are small: cursors bring their own
+        self.apa = Adabasx(fbl=64, rbl=256, sbl=64, vbl=64, mbl=16,
+                           password=password, **kw)
+        self.apa.cb.dbid = dbid
+        try:
+            self.apa.open(mode=mode)
+        except AdabasException as e:
+            raise error(e)
+        self.closed = 0
+
+    def _check(self):
+        if self.closed:
+            raise InterfaceError('Connection is closed')
+
+    def close(self):
+        """ Close cursors and the Adabas session """
+        if self.closed:
+            return
+        for cur in self.cursors[:]:
+            cur.close()
+        try:
+            self.apa.close()
+        except AdabasException as e:
+            raise error(e)
+        finally:
+            self.closed = 1
+
+    def commit(self):
+        """ End transaction (ET) """
+        self._check()
+        try:
+            self.apa.et()
+        except AdabasException as e:
+            raise error(e)
+
+    def rollback(self):
+        """ Backout transaction (BT) """
+        self._check()
+        try:
+            self.apa.bt()
+        except AdabasException as e:
+            raise error(e)
+
+    def cursor(self):
+        """ Return new Cursor object """
+        self._check()
+        cur = Cursor(self)
+        self.cursors.append(cur)
+        return cur
+
+    def fdt(self, fnr):
+        """ Return dictionary of field name to (fieldlen, format, options)
+            for file fnr
+        """
+        fdt = self.fdts.get(fnr)
+        if fdt is None:
+            try:
+                fields = readfdt(self.dbid, fnr, pwd=self.password)
+            except AdabasException as e:
+                raise error(e)
+            fdt = dict((fn, (flen, fmt, opts)) for level, fn, flen, fmt, opts in fields)
+            self.fdts[fnr] = fdt
+        return fdt
+
+    def compile(self, operation):
+        """ Return compiled Query for operation string (cached) """
+        q = self.queries.get(operation)
+        if q is None:
+            q = Query(operation, self.fdt, self.apa.encoding,
+                      NETWORKBO if self.apa.bo == NETWORKBO else '=')
+            self.queries[operation] = q
+        return q
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+
+QUERYRE = re.compile(r'^\s*(?:SELECT\s+)?(?P<fields>.+?)\s+FROM\s+(?P<fnr>\d+)'
+    r'(?:\s+WHERE\s+(?P<where>.+?))?(?:\s+ORDER\s+BY\s+(?P<order>\w\w))?\s*$',
+    re.I | re.S)
+FIELDRE = re.compile(r'^(?P<fn>\w\w)(?:\s*\(\s*(?P<len>\d+)\s*\))?$')
+TOKENRE = re.compile(r"'[^']*'|\"[^\"]*\"|<=|>=|!=|<|>|=|[^\s<>=!]+")
+
+SEARCHOPS = {'=': '', '!=': 'NE', '<': 'LT', '<=': 'LE', '>': 'GT', '>=': 'GE'}
+CONNECTORS = {'AND': 'D', 'OR': 'O'}
+
+# format and length to struct format character
+NUMSTRUCT = {('F',1):'b', ('F',2):'h', ('F',4):'i', ('F',8):'q',
+             ('G',4):'f', ('G',8):'d'}
+
+
+def latin1(b):
+    """ Return string of alphanumeric bytes converted to latin-1 """
+    return b.decode('latin1').rstrip(' ')
+
+def unpacked(b):
+    """ Return integer of unpacked decimal bytes """
+    i = 0
+    for c in bytearray(b):
+        i = i*10 + (c & 0x0f)
+    return -i if bytearray(b[-1:])[0] & 0xf0 in (0x70, 0xb0, 0xd0) else i
+
+def packed(b):
+    """ Return integer of packed decimal bytes """
+    h = binascii.hexlify(b).decode('ascii')
+    i = int(h[:-1] or '0')
+    return -i if h[-1] in 'bd' else i
+
+
+class Query(object):
+    """ Compiled query with format buffer, search terms and row decoder
+
+    :param operation: query string
+    :param fdt: function returning field dictionary for a file number
+    :param encoding: encoding of alphanumeric fields
+    :param byteorder: struct byte order character
+
+    Multifetch batches of EBCDIC or network byte order sessions are
+    converted with the Layout in attribute layout (None if there is
+    nothing to convert) and decoded with decode(converted=1).
+    """
+    def __init__(self, operation, fdt, encoding='latin1', byteorder='='):
+        m = QUERYRE.match(operation)
+        if not m:
+            raise ProgrammingError('Invalid query: %s' % operation)
+        self.fnr = int(m.group('fnr'))
+        fdt = fdt(self.fnr)
+        self.encoding = encoding
+
+        fbl = []
+        fmts = [byteorder]
+        fields = []             # (length, format)
+        self.conv = []          # (index, function) for values to convert
+        self.description = []
+        self.reclen = 0
+        for i, fspec in enumerate(m.group('fields').split(',')):
+            fm = FIELDRE.match(fspec.strip())
+            if not fm:
+                raise ProgrammingError('Invalid field %r in query' % fspec)
+            fn = fm.group('fn').upper()
+            flen, fmt, opts = self.field(fdt, fn)
+            if fm.group('len'):
+                flen = int(fm.group('len'))
+            if not flen:
+                raise ProgrammingError('Field %s has variable length: specify %s(length)'
+                    % (fn, fn))
+            fbl.append('%s,%d,%s' % (fn, flen, fmt))
+            fields.append((flen, fmt))
+            if (fmt, flen) in NUMSTRUCT:
+                fmts.append(NUMSTRUCT[fmt, flen])
+            else:
+                fmts.append('%ds' % flen)
+                if fmt == 'A':
+                    self.conv.append((i, self.alpha))
+                elif fmt == 'W':
+                    self.conv.append((i, self.wide))
+                elif fmt == 'U':
+                    self.conv.append((i, unpacked))
+                elif fmt == 'P':
+                    self.conv.append((i, packed))
+                elif fmt == 'F':
+                    raise NotSupportedError('Field %s format F with length %d' % (fn, flen))
+            self.description.append((fn, fmt, flen, flen,
+                2*flen-1 if fmt == 'P' else (flen if fmt == 'U' else None),
+                0 if fmt in 'UP' else None, 'NU' in opts or 'NC' in opts))
+        self.fb = ','.join(fbl) + '.'
+        self.struct = struct.Struct(''.join(fmts))
+        self.reclen = self.struct.size
+        self.nstruct = struct.Struct('=' + ''.join(fmts[1:]))
+        self.layout = formatlayout(fields, encoding, byteorder)
+        # conv of records converted with layout, alphanumeric fields are
+        # latin-1 if the layout translates them
+        alpha = latin1 if self.layout.table else self.alpha
+        self.nconv = [(i, alpha if f == self.alpha else f)
+                      for i, f in self.conv]
+        if not self.layout.changes:
+            self.layout = None
+
+        self.order = m.group('order')
+        if self.order:
+            self.order = self.order.upper()
+            self.orderfield = self.field(fdt, self.order)
+            if 'DE' not in self.orderfield[2] and 'UQ' not in self.orderfield[2]:
+                raise ProgrammingError('ORDER BY %s: not a descriptor' % self.order)
+
+        self.terms = []         # (connector, fn, flen, fmt, op, value1, value2)
+        if m.group('where'):
+            self.parse(m.group('where'), fdt)
+
+    def field(self, fdt, fn):
+        f = fdt.get(fn)
+        if not f:
+            raise ProgrammingError('Field %s not in FDT of file %d' % (fn, self.fnr))
+        flen, fmt, opts = f
+        if not fmt or 'MU' in opts or 'PE' in opts:
+            raise NotSupportedError('Field %s: group, MU or PE field' % fn)
+        return f
+
+    def parse(self, where, fdt):
+        """ Parse search criteria into list of terms """
+        tokens = TOKENRE.findall(where)
+        conn = ''
+        while tokens:
+            if len(tokens) < 3:
+                raise ProgrammingError('Incomplete search criteria: %s' % where)
+            fn, op, v1 = tokens[0].upper(), tokens[1].upper(), tokens[2]
+            del tokens[:3]
+            flen, fmt, opts = self.field(fdt, fn)
+            v2 = None
+            if op == 'BETWEEN':
+                if len(tokens) < 2 or tokens[0].upper() != 'AND':
+                    raise ProgrammingError('Missing AND in BETWEEN: %s' % where)
+                v2 = tokens[1]
+                del tokens[:2]
+                op = ''
+            elif op not in SEARCHOPS:
+                raise ProgrammingError('Invalid search operator %s' % op)
+            else:
+                op = SEARCHOPS[op]
+            if fmt == 'G':
+                raise NotSupportedError('Search on floating point field %s' % fn)
+            self.terms.append((conn, fn, flen, fmt, op, v1, v2))
+            if tokens:
+                conn = CONNECTORS.get(tokens.pop(0).upper())
+                if not conn:
+                    raise ProgrammingError('Invalid connecting operator: %s' % where)
+                if not tokens:
+                    raise ProgrammingError('Missing search term after connecting '
+                        'operator: %s' % where)
+
+    def values(self, parameters):
+        """ Return terms with parameters and quoted strings resolved """
+        def value(v):
+            if v is None:
+                return None
+            if v[0] == ':':
+                try:
+                    return parameters[v[1:]]
+                except (KeyError, TypeError):
+                    raise ProgrammingError('Missing parameter %s' % v)
+            if v[0] == v[-1] and v[0] in ('"', "'"):
+                return v[1:-1]
+            return v
+        return [(conn, fn, flen, fmt, op, value(v1), value(v2))
+                for conn, fn, flen, fmt, op, v1, v2 in self.terms]
+
+    def searchsizes(self):
+        """ Return search and value buffer length for the search terms """
+        n = len(self.terms)
+        return 24*n + 8, sum(2*flen*(2 if v2 else 1)
+            for conn, fn, flen, fmt, op, v1, v2 in self.terms) + 8
+
+    def alpha(self, b):
+        return b.decode(self.encoding).rstrip(' ')
+
+    def wide(self, b):
+        return b.decode('utf-8').rstrip(' ')
+
+    def decode(self, buf, offset=0, converted=0):
+        """ Return row tuple from record at offset in buffer
+
+        :param converted: 1 if the record was converted with layout
+        """
+        if converted:
+            row = self.nstruct.unpack_from(buf, offset)
+            conv = self.nconv
+        else:
+            row = self.struct.unpack_from(buf, offset)
+            conv = self.conv
+        if conv:
+            row = list(row)
+            for i, func in conv:
+                row[i] = func(row[i])
+            row = tuple(row)
+        return row
+
+
+class Cursor(object):
+    """ DB-API cursor with its own Adabas command id and buffers
+
+    The rows of a query are read in batches of arraysize records
+    with multifetch when arraysize > 1 at execute() time.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+        self.arraysize = connection.arraysize
+        self.description = None
+        self.rowcount = -1
+        self.cursor = None      # adapya.adabas.api.Cursor
+        self.query = None
+        self.rows = None        # generator of current query
+        self.closed = 0
+
+    def _check(self):
+        if self.closed:
+            raise InterfaceError('Cursor is closed')
+        self.connection._check()
+
+    def _release(self):
+        if self.cursor:
+            try:
+                self.cursor.close()
+            except AdabasException as e:
+                raise error(e)
+            finally:
+                self.cursor = None
+                self.rows = None
+
+    def close(self):
+        """ Release command id and buffers of cursor """
+        if self.closed:
+            return
+        self._release()
+        self.closed = 1
+        if self in self.connection.cursors:
+            self.connection.cursors.remove(self)
+
+    def execute(self, operation, parameters=None):
+        """ Compile and start query
+
+        :param operation: query string (see module description)
+        :param parameters: dictionary of values for :name parameters
+        """
+        self._check()
+        self._release()
+        conn = self.connection
+        q = self.query = conn.compile(operation)
+        self.description = q.description
+        self.rowcount = -1
+
+        mfc = self.arraysize if self.arraysize > 1 else 0
+        sbl, vbl = q.searchsizes()
+        if q.order and not q.terms:
+            vbl = max(vbl, q.orderfield[0]+8)
+        cur = self.cursor = conn.apa.cursor(multifetch=mfc, fbl=len(q.fb),
+            rbl=q.reclen*max(mfc, 1), sbl=sbl, vbl=vbl)
+        cur.fb[0:len(q.fb)] = q.fb.encode('ascii')
+        cur.cb.fnr = q.fnr
+        if mfc:
+            cur.batchlayout = q.layout
+
+        try:
+            if q.terms:
+                for i, (cn, fn, flen, fmt, op, v1, v2) in enumerate(q.values(parameters)):
+                    if cn:
+                        cur.sb.write_text(',%s,' % cn)
+                    ffrm = fmt if fmt in 'UPFB' else ''
+                    if not ffrm and not isinstance(v1, str):
+                        v1 = str(v1)
+                    cur.searchfield(fn, flen, v1, crit=op if not v2 else '',
+                        ffrm=ffrm, first=i == 0)
+                    if v2 is not None:
+                        if not ffrm and not isinstance(v2, str):
+                            v2 = str(v2)
+                        cur.sb.write_text(',S,')
+                        # TO pads an alphanumeric upper value with x'FF'
+                        cur.searchfield(fn, flen, v2, ffrm=ffrm,
+                            crit='TO' if not ffrm and len(v2) < flen else '')
+                cur.sb.write_text('.')
+                cur.cb.isn = 0
+                cur.cb.isl = 0
+                # first record is read with L1 GET NEXT
+                cur.find(saveisn=1, sort=q.order or '', norecord=1)
+                self.rowcount = cur.cb.isq
+                seq = 'N'
+            elif q.order:
+                flen, fmt, opts = q.orderfield
+                cur.sb.write_text('%s,%d,%s.' % (q.order, flen, fmt))
+                cur.vb[0:flen] = lowvalue(flen, fmt, byteorder=conn.apa.bo)
+                seq = q.order
+            else:
+                seq = ''
+        except AdabasException as e:
+            raise error(e)
+
+        if self.rowcount == 0:
+            self.rows = iter(())
+        else:
+            self.rows = self._rows(seq)
+        return self
+
+    def _rows(self, seq):
+        """ Generator of row tuples """
+        dm = Datamap('Row')
+        decode = self.query.decode
+        converted = self.cursor.batchlayout is not None
+        try:
+            for isn, rec in self.cursor.read(seq=seq, dmap=dm):
+                yield decode(rec.buffer, rec.offset, converted)
+        except AdabasException as e:
+            raise error(e)
+
+    def executemany(self, operation, seq_of_parameters):
+        """ Execute query for each parameter set """
+        for parameters in seq_of_parameters:
+            self.execute(operation, parameters)
+
+    def fetchone(self):
+        """ Return next row tuple or None """
+        if self.rows is None:
+            raise ProgrammingError('No query executed')
+        return next(self.rows, None)
+
+    def fetchmany(self, size=None):
+        """ Return list of up to size (default arraysize) row tuples """
+        if self.rows is None:
+            raise ProgrammingError('No query executed')
+        if size is None:
+            size = self.arraysize
+        if size <= 0:
+            return []
+        rows = []
+        for row in self.rows:
+            rows.append(row)
+            if len(rows) >= size:
+                break
+        return rows
+
+    def fetchall(self):
+        """ Return list of remaining row tuples """
+        if self.rows is None:
+            raise ProgrammingError('No query executed')
+        return list(self.rows)
+
+    def __iter__(self):
+        if self.rows is None:
+            raise ProgrammingError('No query executed')
+        return self.rows
+
+    def setinputsizes(self, sizes):
+        pass
+
+    def setoutputsize(self, size, column=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
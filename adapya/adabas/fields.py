@@ -667,7 +667,8 @@ def readfdt(dbid, fnr, printfdt=0, fd=None, pwd='', xopt=1, specials=False ):
     if specials:
         from collections import OrderedDict
         od = OrderedDict(specs)
-        print('OrderedDict=%r' % od)
+        if debug:
+            print('OrderedDict=%r' % od)
         return fields, od
     else:
         return fields
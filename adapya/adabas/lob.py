@@ -0,0 +1,324 @@
+"""adapya.adabas.lob - Large object field streams
+===============================================
+
+open_lob() returns a file-like object for reading or writing a large
+object (LB) field of one record in segments. Each segment is read or
+written with partial LOB notation in the format buffer, e.g.
+'LB(1025,1024).' for bytes 1025 to 2048, so that the record buffer
+only needs to hold one segment.
+
+Reading a document into a file::
+
+    >>> import shutil
+    >>> from adapya.adabas.api import Adabasx
+    >>> from adapya.adabas.lob import open_lob
+    >>> c1 = Adabasx(fbl=64, rbl=1024)
+    >>> c1.cb.dbid = 8
+    >>> with open_lob(c1, 9, 1, 'RA', segment=1<<20, readahead=2) as lob, \\
+    ...         open('photo.jpg', 'wb') as f:
+    ...     shutil.copyfileobj(lob, f, 1<<20)
+
+With readahead the next segments are read by a background thread in
+a separate Adabas session while the current segment is processed.
+readinto() copies a segment directly from the record buffer into the
+caller's buffer.
+
+Writing segments updates the record with A1 which puts the record in
+hold. The changes must be committed with et() on the session (or on
+the session given by the writer's apa attribute).
+
+"""
+from __future__ import print_function          # PY3
+
+import ctypes
+import io
+import itertools
+import threading
+
+try:
+    import queue                # PY3
+except ImportError:
+    import Queue as queue       # PY2
+
+from adapya.base.defs import Abuf
+from adapya.base.datamap import funpack, fpack
+from adapya.adabas.api import Adabasx
+
+SEGMENT = 65536     # default segment size
+
+_threads = itertools.count(0x8000)  # thread numbers of read-ahead sessions
+
+
+def open_lob(apa, fnr, isn, field, mode='r', segment=SEGMENT, readahead=0,
+             password=''):
+    """ Return file-like object for the LB field of a record
+
+    :param apa: Adabas or Adabasx session, the segments are read or
+                written with a cursor on this session
+    :param fnr: file number
+    :param isn: ISN of the record
+    :param field: name of the LB field
+    :param mode: 'r' read, 'w' write (truncates) or 'a' append
+    :param segment: maximum number of bytes per Adabas call
+    :param readahead: number of segments read ahead in a background
+                      thread (reading only)
+    :param password: file password for the read-ahead session
+    """
+    if mode == 'r':
+        return LobReader(apa, fnr, isn, field, segment=segment,
+            readahead=readahead, password=password)
+    elif mode in ('w', 'a'):
+        return LobWriter(apa, fnr, isn, field, segment=segment,
+            append=mode == 'a')
+    raise ValueError('Invalid LOB mode %r' % (mode,))
+
+
+def loblength(apa, field, byteorder=None):
+    """ Read LOB length of the record with ISN in control block of apa
+        (Adabas session or cursor)
+    """
+    fb = '%sL,4,B.' % field
+    apa.fb[0:len(fb)] = fb.encode('ascii')
+    apa.call(cmd='L1', op1=' ', op2=' ')
+    return funpack(apa.rb[0:4], 'u', byteorder=byteorder)
+
+
+def readsegment(apa, field, offset, n):
+    """ Read n bytes of the LOB at offset (0 based) into the record
+        buffer of apa (Adabas session or cursor)
+    """
+    fb = '%s(%d,%d).' % (field, offset+1, n)
+    apa.fb[0:len(fb)] = fb.encode('ascii')
+    apa.call(cmd='L1', op1=' ', op2=' ')
+
+
+class LobReader(io.RawIOBase):
+    """ Readable and seekable stream of an LB field (see open_lob()) """
+    def __init__(self, apa, fnr, isn, field, segment=SEGMENT, readahead=0,
+                 password=''):
+        io.RawIOBase.__init__(self)
+        self.apa = apa
+        self.fnr = fnr
+        self.isn = isn
+        self.field = field[:2]
+        self.segment = segment
+        self.readahead = readahead
+        self.password = password
+        self.pos = 0
+        self.worker = None      # read-ahead thread
+        self.ahead = None       # (offset, length, buffer) of current segment
+        self.cur = None
+
+        self.cur = apa.cursor(multifetch=0, fbl=32, rbl=segment)
+        self.cur.cb.fnr = fnr
+        self.cur.cb.isn = isn
+        self.length = loblength(self.cur, self.field, byteorder=apa.bo)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += self.length
+        if offset < 0:
+            raise ValueError('Negative seek position %d' % offset)
+        self.pos = offset
+        return self.pos
+
+    def readinto(self, b):
+        """ Read up to len(b) bytes into b, return number of bytes read """
+        n = min(len(b), self.length-self.pos)
+        if n <= 0:
+            return 0
+        if self.readahead:
+            off, m, buf = self.nextsegment()
+            n = min(n, off+m-self.pos)
+            ctypes.memmove((ctypes.c_char*n).from_buffer(b),
+                ctypes.addressof(buf)+self.pos-off, n)
+            if self.pos+n == off+m:     # segment consumed
+                self.free.put(buf)
+                self.ahead = None
+        else:
+            n = min(n, self.segment)
+            readsegment(self.cur, self.field, self.pos, n)
+            ctypes.memmove((ctypes.c_char*n).from_buffer(b), self.cur.rb, n)
+        self.pos += n
+        return n
+
+    def nextsegment(self):
+        """ Return read-ahead segment containing the current position """
+        if self.ahead:
+            off, m, buf = self.ahead
+            if off <= self.pos < off+m:
+                return self.ahead
+            self.free.put(buf)
+            self.ahead = None
+        while self.worker:
+            try:
+                item = self.full.get(timeout=0.5)
+            except queue.Empty:
+                if self.worker.is_alive():
+                    continue
+                break           # thread ended before current position
+            if isinstance(item, Exception):
+                self.stopahead()
+                raise item
+            off, m, buf = item
+            if off == self.pos or off < self.pos < off+m:
+                self.ahead = item
+                return item
+            self.free.put(buf)
+            if off > self.pos:
+                break           # position before read-ahead after seek
+        self.stopahead()
+        self.startahead()
+        return self.nextsegment()
+
+    def startahead(self):
+        """ Start read-ahead thread at current position """
+        self.stop = threading.Event()
+        self.free = queue.Queue()
+        self.full = queue.Queue()
+        for i in range(self.readahead+1):
+            self.free.put(Abuf(self.segment))
+        self.worker = threading.Thread(target=self.readsegments,
+            args=(self.pos, self.stop, self.free, self.full))
+        self.worker.daemon = True
+        self.worker.start()
+
+    def stopahead(self):
+        """ Stop read-ahead thread """
+        if self.worker:
+            self.stop.set()
+            self.free.put(None)     # wake up waiting thread
+            self.worker.join()
+            self.worker = None
+            self.ahead = None
+
+    def readsegments(self, offset, stop, free, full):
+        """ Read segments from offset into free buffers and put them
+            with (offset, length, buffer) into the full queue
+        """
+        c = None
+        try:
+            c = Adabasx(fbl=32, rbl=self.segment, thread=next(_threads),
+                password=self.password)
+            c.cb.dbid = self.apa.cb.dbid
+            c.cb.fnr = self.fnr
+            c.cb.isn = self.isn
+            while offset < self.length and not stop.is_set():
+                buf = free.get()
+                if buf is None or stop.is_set():
+                    break
+                n = min(self.segment, self.length-offset)
+                readsegment(c, self.field, offset, n)
+                ctypes.memmove(buf, c.rb, n)
+                full.put((offset, n, buf))
+                offset += n
+        except Exception as e:
+            full.put(e)
+        finally:
+            if c:
+                try:
+                    c.close()
+                except Exception:
+                    pass
+
+    def close(self):
+        if not self.closed:
+            self.stopahead()
+            if self.cur:
+                self.cur.close()
+        io.RawIOBase.close(self)
+
+
+class LobWriter(io.RawIOBase):
+    """ Writable stream of an LB field (see open_lob())
+
+    Data is collected in a buffer of segment size and written with one
+    A1 call per segment. Without append the LOB is truncated first.
+    """
+    def __init__(self, apa, fnr, isn, field, segment=SEGMENT, append=0):
+        io.RawIOBase.__init__(self)
+        self.apa = apa
+        self.field = field[:2]
+        self.segment = segment
+        self.n = 0              # bytes in segment buffer
+        self.pos = 0
+        self.cur = None
+
+        self.cur = apa.cursor(multifetch=0, fbl=32, rbl=max(segment, 4))
+        self.cur.cb.fnr = fnr
+        self.cur.cb.isn = isn
+        if append:
+            self.pos = loblength(self.cur, self.field, byteorder=apa.bo)
+        else:
+            # empty LOB: variable length value with 4 byte length
+            # prefix that counts itself
+            self.update('%s,0,A.' % self.field,
+                fpack(4, 'F', 4, byteorder=apa.bo))
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.pos + self.n
+
+    def update(self, fb, data=None):
+        """ Update record with format buffer, data in record buffer """
+        cur = self.cur
+        cur.fb[0:len(fb)] = fb.encode('ascii')
+        if data is not None:
+            cur.rb[0:len(data)] = data
+        cur.call(cmd='A1', op1=' ', op2='H')   # A1 puts record in hold
+
+    def write(self, b):
+        """ Write bytes-like object b, return number of bytes written """
+        mv = memoryview(b)
+        size = len(mv)
+        done = 0
+        while done < size:
+            n = min(self.segment-self.n, size-done)
+            self.cur.rb[self.n:self.n+n] = mv[done:done+n].tobytes()
+            self.n += n
+            done += n
+            if self.n == self.segment:
+                self.flush()
+        return size
+
+    def flush(self):
+        """ Write collected data as one segment """
+        if self.n and self.cur and not self.closed:
+            self.update('%s(%d,%d).' % (self.field, self.pos+1, self.n))
+            self.pos += self.n
+            self.n = 0
+
+    def close(self):
+        if not self.closed and self.cur:
+            try:
+                self.flush()
+            finally:
+                self.cur.close()
+        io.RawIOBase.close(self)
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
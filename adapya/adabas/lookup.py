@@ -0,0 +1,181 @@
+"""adapya.adabas.lookup - Batched lookup of records by descriptor values
+======================================================================
+
+lookup_many() finds the records for many descriptor values with few
+Adabas calls instead of a find and read for each value:
+
+- the keys are encoded to descriptor values and duplicate values are
+  searched once, keys with the same value (e.g. 'SMITH' and 'SMITH ')
+  get the same records
+- runs of consecutive numbers are read with one L3 in the value range
+- the other values are combined with OR into one S1 per batch
+  (the batch size is limited by the search and value buffer size)
+- the records found are read with L1 GET NEXT and multifetch
+
+The descriptor value is read with each record to assign the record to
+its key. If a record cannot be assigned, e.g. for a multiple-value
+field, the values of the batch are searched one by one.
+
+Example on the Employees file::
+
+    >>> from adapya.adabas.api import Adabasx
+    >>> from adapya.adabas.lookup import lookup_many
+    >>> c1 = Adabasx(fbl=64, rbl=256, sbl=64, vbl=64, mbl=16)
+    >>> c1.cb.dbid = 8
+    >>> recs = lookup_many(c1, 11, 'AA', 8, ['50005800', '11100301'],
+    ...     'AE,20,A.', 20)
+    >>> recs['50005800']
+    [(241, b'SCHIRM              ')]
+
+"""
+from __future__ import print_function          # PY3
+
+from adapya.base.datamap import Datamap
+from adapya.adabas.api import fvalue
+
+MAXSVBL = 32767     # maximum search/value buffer length with ACB
+
+
+def keyruns(keys, minrun):
+    """ Split sorted keys into runs of consecutive integers with at least
+        minrun keys and the other keys
+
+    :returns: tuple of list of (first, last) runs and list of other keys
+    """
+    runs, others = [], []
+    i, n = 0, len(keys)
+    while i < n:
+        j = i
+        if isinstance(keys[i], int) and minrun > 1:
+            while j+1 < n and isinstance(keys[j+1], int) \
+                    and keys[j+1] == keys[j]+1:
+                j += 1
+        if minrun > 1 and j+1-i >= minrun:
+            runs.append((keys[i], keys[j]))
+        else:
+            others.extend(keys[i:j+1])
+        i = j+1
+    return runs, others
+
+
+def lookup_many(apa, fnr, descriptor, fieldlen, keys, fb, reclen, ffrm='A',
+                batch=100, multifetch=20, minrun=16):
+    """ Return dictionary of key to list of (ISN, record bytes)
+        for the records with the descriptor values in keys
+
+    :param apa: Adabas or Adabasx session, the records are read
+                with a cursor on this session
+    :param fnr: file number
+    :param descriptor: descriptor name
+    :param fieldlen, ffrm: length and format of the descriptor values
+    :param keys: iterable of descriptor values (str, int or bytes)
+    :param fb: format buffer of the records, e.g. 'AE,20,A.'
+    :param reclen: length of the record returned for fb
+    :param batch: maximum number of values per S1 call
+    :param multifetch: records per L1 or L3 call
+    :param minrun: minimum number of consecutive integer keys
+                   read with L3 on a descriptor of format U, P or F,
+                   0 disables range reads
+
+    Keys without records are returned with an empty list. Integer keys
+    may be mixed with keys of other types, on a descriptor of format
+    A or W they are searched as decimal strings.
+    """
+    de = descriptor[:2]
+    term = '%s,%d,%s' % (de, fieldlen, ffrm)
+    fb = fb.strip().rstrip('.')
+    fb = term + (',' + fb if fb else '') + '.'     # descriptor value first
+    rlen = fieldlen + reclen
+
+    numeric = ffrm in ('U', 'P', 'F')
+    vkeys = {}      # value bytes to list of keys
+    for key in keys:
+        ks = vkeys.setdefault(fvalue(key if numeric or not isinstance(key, int)
+            else str(key), fieldlen, ffrm, byteorder=apa.bo,
+            encoding=apa.encoding), [])
+        if key not in ks:
+            ks.append(key)
+    result = dict((key, []) for ks in vkeys.values() for key in ks)
+    if not vkeys:
+        return result
+    ivals = {}      # integer key to value bytes, for range reads
+    for v, ks in vkeys.items():
+        for key in ks:
+            if numeric and isinstance(key, int) and not isinstance(key, bool):
+                ivals[key] = v
+                break
+
+    maxbatch = MAXSVBL // max(fieldlen, len(term)+3)
+    batch = max(1, min(batch, maxbatch, len(vkeys)))
+    mfc = multifetch if multifetch > 1 else 0
+    buflens = dict(fbl=len(fb), rbl=rlen*max(mfc, 1),
+        sbl=max((len(term)+3)*batch, 32), vbl=max(fieldlen*batch, 2*fieldlen))
+    dm = Datamap('Lookup record')
+
+    def records(rows):
+        """ Return list of (value, ISN, record bytes) """
+        return [(bytes(rec.buffer[rec.offset:rec.offset+fieldlen]), isn,
+                 rec.buffer[rec.offset+fieldlen:rec.offset+rlen])
+                for isn, rec in rows]
+
+    def find(values):
+        """ Find and read records with any of the values """
+        cur.sb.seek(0)
+        cur.sb.write_text(',O,'.join([term]*len(values)) + '.')
+        cur.vb[0:fieldlen*len(values)] = b''.join(values)
+        cur.cb.isn = 0
+        cur.cb.isl = 0
+        cur.find(saveisn=1, norecord=1)
+        if cur.cb.isq == 0:
+            return []
+        return records(cur.read(seq='N', dmap=dm))
+
+    def assign(recs, values):
+        """ Add records to result, return 0 if a record has a value
+            not in values """
+        for v, isn, rec in recs:
+            if v not in values:
+                return 0
+        for v, isn, rec in recs:
+            for key in vkeys[v]:
+                result[key].append((isn, rec))
+        return 1
+
+    def single(values):
+        """ Search values one by one """
+        for v in values:
+            recs = [(isn, rec) for _, isn, rec in find([v])]
+            for key in vkeys[v]:
+                result[key].extend(recs)
+
+    runs = keyruns(sorted(ivals), minrun)[0]
+    ranged = set(ivals[k] for first, last in runs
+                 for k in range(first, last+1))
+    others = sorted(v for v in vkeys if v not in ranged)
+    with apa.cursor(multifetch=mfc, **buflens) as cur:
+        cur.fb[0:len(fb)] = fb.encode('ascii')
+        cur.cb.fnr = fnr
+        for first, last in runs:
+            values = set(ivals[k] for k in range(first, last+1))
+            cur.descrange(de, fieldlen, ffrm, start=first, stop=last)
+            if not assign(records(cur.read(seq=de, dmap=dm)), values):
+                single(sorted(values))
+        for i in range(0, len(others), batch):
+            values = others[i:i+batch]
+            if not assign(find(values), set(values)):
+                single(values)
+    return result
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
@@ -0,0 +1,235 @@
+"""adapya.adabas.occurs - Occurrence-aware reading of MU and PE fields
+===================================================================
+
+Reading multiple-value (MU) fields and periodic groups (PE) with a
+fixed number of occurrences in the format buffer either transfers
+many empty occurrences or misses occurrences beyond the fixed number.
+
+An Occurrences object reads records in two phases:
+
+1. the fixed fields and the occurrence counts (e.g. 'AZC,2,B') are
+   read in the requested sequence with multifetch
+2. for records that have occurrences these are read with L1 and a
+   format buffer for the number of occurrences actually present,
+   e.g. 'AZ1-2,3,A' for two occurrences
+
+The phase 2 format buffer and record layout are compiled once per
+occurrence profile (tuple of the counts) and cached.
+
+Example on the Employees file with MU field AZ (language) and the
+PE group AQ (income)::
+
+    >>> from adapya.adabas.api import Adabasx
+    >>> from adapya.adabas.occurs import Occurrences
+    >>> c1 = Adabasx(fbl=64, rbl=256, sbl=64, vbl=64, mbl=4+16*20,
+    ...     multifetch=20)
+    >>> c1.cb.dbid = 8
+    >>> c1.cb.fnr = 11
+    >>> occ = Occurrences(fixed=[('AA', 8, 'A'), ('AE', 20, 'A')],
+    ...     mu=[('AZ', 3, 'A')],
+    ...     pe=[('AQ', [('AR', 3, 'A'), ('AS', 5, 'P')])])
+    >>> for isn, fixed, occs in occ.read(c1):
+    ...     print(isn, fixed, occs['AZ'], occs['AR'])
+    1 b'50005800SCHIRM              ' [b'FRE', b'ENG'] [b'EUR']
+
+"""
+from __future__ import print_function          # PY3
+
+from adapya.base.datamap import Datamap, funpack
+
+COUNTLEN = 2        # length of binary occurrence counts in record buffer
+
+# Predict format to Adabas format and function for Adabas field length
+# from Predict length and precision
+PRD2ADA = {
+    'A': ('A', lambda n, p: n),
+    'B': ('B', lambda n, p: n),
+    'F': ('G', lambda n, p: n),
+    'I': ('F', lambda n, p: n),
+    'N': ('U', lambda n, p: n+p),
+    'P': ('P', lambda n, p: (n+p)//2+1),
+    'W': ('W', lambda n, p: n),
+    }
+
+
+class Occurrences(object):
+    """ Two-phase reader for records with MU fields and PE groups
+
+    :param fixed: list of (field name, length, format) of the
+                  fields read with the counts
+    :param mu: list of (field name, length, format) of MU fields
+    :param pe: list of (PE group name, list of (field name, length,
+               format)) of PE groups. MU fields within PE groups
+               are not supported.
+    :param byteorder: byte order of the database (for the counts),
+                      None: byte order of the session (apa.bo)
+
+    Occurrences of a PE group are returned field by field: each field of
+    the group has a list of values with one value per occurrence.
+    """
+    def __init__(self, fixed=(), mu=(), pe=(), byteorder=None):
+        self.fixed = list(fixed)
+        self.mu = list(mu)
+        self.pe = list(pe)
+        self.byteorder = byteorder
+        self.fixedlen = sum(flen for fn, flen, ffrm in self.fixed)
+        self.counted = [fn for fn, flen, ffrm in self.mu] + \
+            [pen for pen, pfields in self.pe]
+        self.templates = {}     # occurrence profile: (fb, reclen, layout)
+
+        fbl = ['%s,%d,%s' % f for f in self.fixed]
+        fbl += ['%sC,%d,B' % (fn, COUNTLEN) for fn in self.counted]
+        self.countfb = ','.join(fbl) + '.'
+        self.countlen = self.fixedlen + COUNTLEN*len(self.counted)
+
+    @classmethod
+    def fromsysdic(cls, fieldlist, **kw):
+        """ Return Occurrences from the Predict field list returned by
+            sysdic.getFieldList() (fields of unknown format are skipped)
+        """
+        fixed, mu, pe = [], [], []
+        pelevel = 0
+        for pf in fieldlist:
+            if pelevel:
+                if pf.level > pelevel:
+                    if pf.type not in ('GR', 'MU') and pf.format in PRD2ADA:
+                        ffrm, flen = PRD2ADA[pf.format]
+                        pe[-1][1].append((pf.fn, flen(pf.length, pf.precision), ffrm))
+                    continue
+                pelevel = 0
+            if pf.type == 'PE':
+                pelevel = pf.level
+                pe.append((pf.fn, []))
+            elif pf.type in ('', 'MU') and pf.format in PRD2ADA:
+                ffrm, flen = PRD2ADA[pf.format]
+                (mu if pf.type == 'MU' else fixed).append(
+                    (pf.fn, flen(pf.length, pf.precision), ffrm))
+        return cls(fixed=fixed, mu=mu, pe=[p for p in pe if p[1]], **kw)
+
+    def profile(self, rec, offset=0, byteorder=None):
+        """ Return tuple of occurrence counts from phase 1 record
+
+        :param byteorder: byte order of the counts if self.byteorder
+                          is None
+        """
+        off = offset + self.fixedlen
+        bo = self.byteorder or byteorder
+        return tuple(funpack(rec[off+i*COUNTLEN:off+(i+1)*COUNTLEN], 'u',
+                             byteorder=bo)
+                     for i in range(len(self.counted)))
+
+    def template(self, profile):
+        """ Return (format buffer, record length, layout) for reading the
+            occurrences of profile, layout is a list of
+            (field name, number of occurrences, length)
+        """
+        t = self.templates.get(profile)
+        if t:
+            return t
+        fbl = []
+        layout = []
+        counts = dict(zip(self.counted, profile))
+        fields = [(fn, flen, ffrm, counts[fn]) for fn, flen, ffrm in self.mu]
+        for pen, pfields in self.pe:
+            fields += [(fn, flen, ffrm, counts[pen]) for fn, flen, ffrm in pfields]
+        for fn, flen, ffrm, n in fields:
+            if n:
+                fbl.append('%s1-%d,%d,%s' % (fn, n, flen, ffrm))
+            layout.append((fn, n, flen))
+        reclen = sum(n*flen for fn, n, flen in layout)
+        t = self.templates[profile] = (','.join(fbl) + '.', reclen, layout)
+        return t
+
+    def decode(self, rec, layout, offset=0):
+        """ Return dictionary of field name to list of occurrence values """
+        occs = {}
+        off = offset
+        for fn, n, flen in layout:
+            occs[fn] = [rec[off+i*flen:off+(i+1)*flen] for i in range(n)]
+            off += n*flen
+        return occs
+
+    def occurrences(self, cur, isn, profile):
+        """ Read occurrences of profile for record isn with cursor cur
+            (phase 2)
+
+        :returns: tuple of cursor and occurrences dictionary. The cursor
+                  is replaced by a new one if its buffers are too small.
+        """
+        fb, reclen, layout = self.template(profile)
+        if not reclen:
+            return cur, self.decode(b'', layout)
+        if len(cur.rb) < reclen or len(cur.fb) < len(fb):
+            apa = cur.apa
+            cur.close()
+            cur = self.cursor(apa, fbl=len(fb), rbl=reclen)
+        cur.fb[0:len(fb)] = fb.encode('ascii')
+        cur.call(cmd='L1', op1=' ', op2=' ', isn=isn)
+        return cur, self.decode(cur.rb[0:reclen], layout)
+
+    def cursor(self, apa, fbl=0, rbl=0, multifetch=0):
+        """ Return cursor for reading phase 1 or phase 2 records """
+        cur = apa.cursor(multifetch=multifetch, fbl=max(fbl, 256),
+            rbl=max(rbl, 256))
+        cur.cb.fnr = apa.cb.fnr
+        return cur
+
+    def read(self, apa, seq='', multifetch=None, **kw):
+        """ Generator of (ISN, fixed fields bytes, occurrences dictionary)
+            read in sequence
+
+        :param apa: Adabas or Adabasx session with fnr in control block,
+                    search and value buffer set for seq=descriptor
+        :param seq: read sequence, see Adabas.read()
+        :param multifetch: records per phase 1 call,
+                           default is the multifetch setting of apa
+        :param kw: other parameters of Adabas.read()
+        """
+        mfc = apa.mfc if multifetch is None else multifetch
+        mfc = mfc if mfc > 1 else 0
+        cur1 = self.cursor(apa, fbl=len(self.countfb),
+            rbl=self.countlen*max(mfc, 1), multifetch=mfc)
+        cur2 = self.cursor(apa)
+        try:
+            if apa.sb is not None and cur1.sb is not None:
+                cur1.sb[0:len(apa.sb)] = apa.sb.raw
+                cur1.vb[0:len(apa.vb)] = apa.vb.raw
+            cur1.fb[0:len(self.countfb)] = self.countfb.encode('ascii')
+            dm = Datamap('Count record')
+            for isn, rec in cur1.read(seq=seq, dmap=dm, **kw):
+                r = rec.buffer[rec.offset:rec.offset+self.countlen]
+                cur2, occs = self.occurrences(cur2, isn,
+                    self.profile(r, byteorder=apa.bo))
+                yield isn, r[:self.fixedlen], occs
+        finally:
+            cur1.close()
+            cur2.close()
+
+    def get(self, apa, isn):
+        """ Return (fixed fields bytes, occurrences dictionary) of
+            record isn
+        """
+        cur = self.cursor(apa, fbl=len(self.countfb), rbl=self.countlen)
+        try:
+            cur.fb[0:len(self.countfb)] = self.countfb.encode('ascii')
+            cur.call(cmd='L1', op1=' ', op2=' ', isn=isn)
+            r = cur.rb[0:self.countlen]
+            cur, occs = self.occurrences(cur, isn,
+                self.profile(r, byteorder=apa.bo))
+            return r[:self.fixedlen], occs
+        finally:
+            cur.close()
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
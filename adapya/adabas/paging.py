@@ -0,0 +1,213 @@
+"""adapya.adabas.paging - Keyset pagination of search results
+==========================================================
+
+A Paginator returns a result in pages of a fixed number of records.
+Each page is read with a new command sequence that starts behind the
+last record of the previous page. No command id and ISN list is kept
+between the pages, so a page may be requested at any time later
+without running into a timeout of the Adabas session.
+
+The position behind the last record is returned as a continuation
+token, a string that is passed unchanged to get the next page:
+
+- reading in descriptor sequence (L3) the token holds the descriptor
+  value and the ISN of the last record; the next page starts
+  with that value and the next higher ISN
+- with search criteria (S1) the token holds the last ISN which is used
+  as ISN lower limit; the records are returned in ISN sequence
+
+With multifetch a page takes one L3 call or an S1 and an L1 call
+(plus an RC to release the command id).
+
+Example reading the Employees file by name::
+
+    >>> from adapya.adabas.api import Adabasx
+    >>> from adapya.adabas.paging import Paginator
+    >>> c1 = Adabasx(fbl=64, rbl=256, sbl=64, vbl=64, mbl=16)
+    >>> c1.cb.dbid = 8
+    >>> pg = Paginator(c1, 11, 'AA,8,A.', 8, pagesize=10,
+    ...     descriptor='AE', fieldlen=20)
+    >>> recs, token = pg.page()
+    >>> recs[0]
+    (241, b'50005800')
+    >>> recs, token = pg.page(token)       # next 10 records
+
+and with search criteria::
+
+    >>> pg = Paginator(c1, 11, 'AA,8,A.', 8, pagesize=10,
+    ...     view={'city': ('AJ', 20, 'A')}, criteria='city = PARIS')
+
+"""
+from __future__ import print_function          # PY3
+
+import binascii
+
+from adapya.base.datamap import Datamap
+from adapya.adabas.api import ProgrammingError, lowvalue
+from adapya.adabas.superde import Superdescriptor
+
+
+class Paginator(object):
+    """ Read records in pages with continuation tokens
+
+    :param apa: Adabas or Adabasx session, each page is read with
+                a cursor on this session
+    :param fnr: file number
+    :param fb: format buffer of the records, e.g. 'AA,8,A.'
+    :param reclen: length of the record returned for fb
+    :param pagesize: number of records per page
+    :param descriptor: descriptor name for pages in descriptor sequence
+    :param fieldlen, ffrm: length and format of the descriptor values
+    :param start, stop: optional descriptor value range
+    :param view: Datamap or dictionary of field name to
+                 (Adabas short name, length, format), see searchcrits()
+    :param criteria: search criteria for pages in ISN sequence,
+                 e.g. 'city = PARIS'
+
+    Either descriptor or criteria must be given. The descriptor should be
+    an elementary field that is not multiple-value: its value is read
+    with the record to build the token. For a super descriptor pass a
+    Superdescriptor object (fieldlen and ffrm are then taken from it):
+    its parent fields are read to build the token.
+    """
+    def __init__(self, apa, fnr, fb, reclen, pagesize=20, descriptor=None,
+                 fieldlen=0, ffrm='A', start=None, stop=None,
+                 view=None, criteria=None):
+        if bool(descriptor) == bool(criteria):
+            raise ProgrammingError(
+                'Paginator requires either descriptor or criteria', apa)
+        self.apa = apa
+        self.fnr = fnr
+        self.pagesize = pagesize
+        self.superde = None
+        if isinstance(descriptor, Superdescriptor):
+            self.superde = descriptor
+            descriptor = descriptor.name
+            fieldlen = self.superde.length
+            ffrm = self.superde.ffrm
+        self.descriptor = descriptor[:2] if descriptor else None
+        self.fieldlen = fieldlen if descriptor else 0
+        self.ffrm = ffrm
+        self.start = start
+        self.stop = stop
+        self.view = view
+        self.criteria = criteria
+        self.total = -1     # number of records found by last S1
+
+        # descriptor value or super descriptor parents precede record
+        if self.superde:
+            keyfb = self.superde.parentfb()
+            self.keylen = self.superde.parentlen
+        elif self.descriptor:
+            keyfb = '%s,%d,%s' % (self.descriptor, fieldlen, ffrm)
+            self.keylen = fieldlen
+        else:
+            keyfb = ''
+            self.keylen = 0
+        fb = fb.strip().rstrip('.')
+        self.fb = ','.join(x for x in (keyfb, fb) if x) + '.'
+        self.reclen = reclen + self.keylen
+
+    def cursor(self):
+        """ Return cursor on the session for reading one page """
+        n = self.pagesize + 1   # one more record tells if there is a next page
+        buflens = dict(fbl=len(self.fb), rbl=self.reclen*n)
+        if self.descriptor:
+            buflens.update(sbl=32, vbl=2*self.fieldlen)
+        cur = self.apa.cursor(multifetch=n if n > 1 else 0, **buflens)
+        cur.fb[0:len(self.fb)] = self.fb.encode('ascii')
+        cur.cb.fnr = self.fnr
+        return cur
+
+    def page(self, token=None):
+        """ Read page of records
+
+        :param token: continuation token returned with previous page,
+                      None reads the first page
+        :returns: tuple of list of (ISN, record bytes) and the token for
+                  the next page or None if there are no more records
+        """
+        kind, isn, value = self.parse(token)
+        flen = self.fieldlen
+        klen = self.keylen
+        recs = []
+        more = 0
+        dm = Datamap('Page record')
+        with self.cursor() as cur:
+            if self.descriptor:
+                if value is None:
+                    value = self.start if self.start is not None else \
+                        lowvalue(flen, self.ffrm, byteorder=self.apa.bo)
+                cur.descrange(self.descriptor, flen, self.ffrm,
+                    start=value, stop=self.stop)
+                rows = cur.read(seq=self.descriptor, dmap=dm, startisn=isn)
+            else:
+                cur.sb.seek(0)
+                cur.vb.seek(0)
+                cur.searchcrits(self.view, self.criteria)
+                cur.cb.isn = 0
+                cur.cb.isl = isn
+                cur.find(saveisn=1, norecord=1)
+                self.total = cur.cb.isq
+                rows = cur.read(seq='N', dmap=dm) if self.total else ()
+
+            # with S1 the ISN quantity tells if there is a next page
+            n = min(self.total, self.pagesize) if self.total >= 0 else -1
+            for risn, rec in rows:
+                if len(recs) == self.pagesize:
+                    more = 1
+                    break
+                recs.append((risn, rec.buffer[rec.offset:rec.offset+self.reclen]))
+                if len(recs) == n:
+                    more = self.total > n
+                    break
+
+        if not more:
+            token = None
+        elif self.superde:
+            isn, rec = recs[-1]
+            token = self.token(isn, self.superde.fromrecord(bytes(rec[:klen])))
+        elif self.descriptor:   # descriptor value precedes record data
+            isn, rec = recs[-1]
+            token = self.token(isn, bytes(rec[:klen]))
+        else:
+            token = self.token(recs[-1][0])
+        if klen:
+            recs = [(risn, rec[klen:]) for risn, rec in recs]
+        return recs, token
+
+    def token(self, isn, value=None):
+        """ Return continuation token for ISN and descriptor value """
+        if value is None:
+            return 'S:%d' % isn
+        return 'D:%d:%s' % (isn, binascii.hexlify(value).decode('ascii'))
+
+    def parse(self, token):
+        """ Return kind, ISN and descriptor value bytes from token """
+        if not token:
+            return '', 0, None
+        try:
+            parts = token.split(':')
+            kind, isn = parts[0], int(parts[1])
+            value = binascii.unhexlify(parts[2]) if kind == 'D' else None
+        except (IndexError, ValueError, TypeError, binascii.Error):
+            raise ValueError('Invalid continuation token %r' % (token,))
+        if kind != ('D' if self.descriptor else 'S') or (
+                value is not None and len(value) != self.fieldlen):
+            raise ValueError('Continuation token %r does not match paginator'
+                % (token,))
+        return kind, isn, value
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
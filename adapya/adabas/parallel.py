@@ -0,0 +1,222 @@
+"""adapya.adabas.parallel - Parallel read in descriptor sequence
+============================================================
+
+The descriptor value range of a file is split into partitions with
+about the same number of records. The partitions are read in parallel
+with L3 commands in separate Adabas sessions (one thread each) and
+returned concatenated in descriptor order.
+
+The partition boundaries are taken from the L9 histogram of the
+descriptor (value and quantity of records). Since the boundaries are
+balanced by record counts a skewed descriptor is also split evenly.
+The records of one descriptor value always belong to one partition.
+
+Example reading the Employees file in 4 partitions by name::
+
+    >>> from adapya.adabas.parallel import ParallelReader
+    >>> pr = ParallelReader(8, 11, 'AE', 20, fb='AE,20,A,AA,8,A.',
+    ...     partitions=4, multifetch=20)
+    >>> for isn, rec in pr:
+    ...     print(isn, rec)
+    241 b'ADAM                50005800'
+    ...
+
+Each partition delivers its records through a bounded queue so that
+partitions ahead of the current one read at most queuesize records
+before they wait.
+
+"""
+from __future__ import print_function          # PY3
+
+import threading
+
+try:
+    import queue                # PY3
+except ImportError:
+    import Queue as queue       # PY2
+
+from adapya.base.datamap import Datamap
+from adapya.adabas.api import Adabasx
+
+ENDOFDATA = None    # queue element after last record of partition
+
+
+def histogram(apa, descriptor, fieldlen, ffrm='A', start=None, stop=None):
+    """ Generator of (value, quantity) of a descriptor with L9
+
+    :param apa: Adabas or Adabasx object with fnr set in control block,
+                buffers must hold the values with multifetch
+    :param descriptor: descriptor name
+    :param fieldlen, ffrm: length and format of the descriptor values
+    :param start, stop: optional value range (see Adabas.descrange())
+    :returns: value as bytes and number of records with that value
+    """
+    fb = '%s,%d,%s.' % (descriptor[:2], fieldlen, ffrm)
+    apa.fb.seek(0)
+    apa.fb.write_text(fb)
+    apa.descrange(descriptor, fieldlen, ffrm, start=start, stop=stop)
+    dm = Datamap('Histogram value')
+    for isn, val, isq in apa.histogram(seq=descriptor, dmap=dm):
+        yield val.buffer[val.offset:val.offset+fieldlen], isq
+
+
+def quantiles(values, partitions):
+    """ Split histogram values into ranges with about equal record counts
+
+    :param values: list of (value, quantity) in descriptor sequence
+    :param partitions: number of ranges
+    :returns: list of (first value, last value, number of records)
+    """
+    total = sum(q for v, q in values)
+    ranges = []
+    if not values:
+        return ranges
+    first = values[0][0]
+    cum = n = 0
+    for i, (v, q) in enumerate(values):
+        cum += q
+        n += q
+        if cum*partitions >= total*(len(ranges)+1) and i < len(values)-1 \
+                and len(ranges) < partitions-1:
+            ranges.append((first, v, n))
+            first = values[i+1][0]
+            n = 0
+    ranges.append((first, values[-1][0], n))
+    return ranges
+
+
+class ParallelReader(object):
+    """ Read a file in descriptor sequence with partitions read in parallel
+
+    :param dbid: database id
+    :param fnr: file number
+    :param descriptor: descriptor name
+    :param fieldlen: length of descriptor value
+    :param ffrm: format of descriptor value
+    :param fb: format buffer
+    :param rbl: record buffer length for one record
+    :param partitions: number of parallel sessions
+    :param multifetch: records per L3 call
+    :param queuesize: maximum number of records queued per partition
+    :param start, stop: optional value range to be read
+    :param password: file password
+
+    Iterating yields (ISN, record bytes) in descriptor sequence.
+    Adabas errors of a partition are raised in the iterating thread.
+    """
+    def __init__(self, dbid, fnr, descriptor, fieldlen, ffrm='A', fb='',
+                 rbl=256, partitions=4, multifetch=10, queuesize=1000,
+                 start=None, stop=None, password=''):
+        self.dbid = dbid
+        self.fnr = fnr
+        self.descriptor = descriptor[:2]
+        self.fieldlen = fieldlen
+        self.ffrm = ffrm
+        self.fb = fb
+        self.rbl = rbl
+        self.partitions = partitions
+        self.multifetch = multifetch
+        self.queuesize = queuesize
+        self.start = start
+        self.stop = stop
+        self.password = password
+        self.counts = []        # records read per partition
+
+    def session(self, thread=0, fbl=0, rbl=0, vbl=0, multifetch=0):
+        mfc = multifetch if multifetch > 1 else 0
+        c = Adabasx(fbl=max(fbl, 64), rbl=rbl*max(mfc, 1),
+            sbl=64, vbl=max(vbl, 2*self.fieldlen), mbl=4+16*mfc,
+            multifetch=mfc, thread=thread, password=self.password)
+        c.cb.dbid = self.dbid
+        c.cb.fnr = self.fnr
+        return c
+
+    def ranges(self):
+        """ Return list of (first value, last value, number of records)
+            of the partitions from the descriptor histogram
+        """
+        c = self.session(rbl=self.fieldlen, multifetch=100)
+        try:
+            values = list(histogram(c, self.descriptor, self.fieldlen,
+                self.ffrm, start=self.start, stop=self.stop))
+        finally:
+            c.close()
+        return quantiles(values, self.partitions)
+
+    def worker(self, ident, first, last, q, stopevent):
+        """ Read partition and put records into queue q """
+        def put(item):
+            while not stopevent.is_set():
+                try:
+                    q.put(item, timeout=0.5)
+                    return 1
+                except queue.Full:
+                    pass
+            return 0
+
+        c = None
+        try:
+            c = self.session(thread=ident, fbl=len(self.fb)+1, rbl=self.rbl,
+                multifetch=self.multifetch)
+            c.fb.seek(0)
+            c.fb.write_text(self.fb)
+            c.descrange(self.descriptor, self.fieldlen, self.ffrm,
+                start=first, stop=last)
+            dm = Datamap('Record')
+            for isn, rec in c.read(seq=self.descriptor, dmap=dm):
+                if not put((isn, rec.buffer[rec.offset:rec.offset+rec.dmlen])):
+                    return
+            put(ENDOFDATA)
+        except Exception as e:
+            put(e)
+        finally:
+            if c:
+                try:
+                    c.close()
+                except Exception:
+                    pass
+
+    def __iter__(self):
+        ranges = self.ranges()
+        stopevent = threading.Event()
+        queues = []
+        threads = []
+        for i, (first, last, n) in enumerate(ranges):
+            q = queue.Queue(self.queuesize)
+            t = threading.Thread(target=self.worker,
+                args=(i+1, first, last, q, stopevent))
+            t.daemon = True
+            queues.append(q)
+            threads.append(t)
+            t.start()
+        self.counts = []
+        try:
+            for q in queues:
+                n = 0
+                while 1:
+                    item = q.get()
+                    if item is ENDOFDATA:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    n += 1
+                    yield item
+                self.counts.append(n)
+        finally:
+            stopevent.set()
+            for t in threads:
+                t.join()
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
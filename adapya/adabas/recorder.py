@@ -0,0 +1,399 @@
+"""adapya.adabas.recorder - Record Adabas calls and replay them
+============================================================
+
+A Recorder set in the *recorder* attribute of an Adabas or Adabasx
+object appends a compact binary record for each call to a memory
+mapped log file. A record holds
+
+- start time, duration, thread ident and session (Adabas thread number)
+- the control block as sent to Adabas and the response code
+- the bytes of the buffers sent to Adabas
+- for ACBX calls the receive lengths of all buffers
+
+replay() reissues the recorded calls against a database with the
+original or scaled inter-arrival times in a number of threads and
+returns throughput and latency percentiles (see scripts/replay.py).
+
+Usage::
+
+    from adapya.adabas.api import Adabasx
+    from adapya.adabas.recorder import Recorder
+
+    rec = Recorder('calls.rec')
+    c1 = Adabasx(fbl=64, rbl=256)
+    c1.recorder = rec
+
+    ...   # Adabas calls as usual
+
+    rec.close()
+
+Note: the password in additions 3 is blanked in the recorded control
+block unless Recorder(keeppwd=1) is given.
+
+"""
+from __future__ import print_function          # PY3
+
+import ctypes
+import mmap
+import struct
+import threading
+import time
+try:
+    from threading import get_ident
+except ImportError:
+    from thread import get_ident  # PY2
+
+from adapya.base.defs import Abuf
+from adapya.base.datamap import NETWORKBO
+from adapya.adabas.api import Adabas, Adabasx, Acb, Acbx
+from adapya.adabas.api import ACBXLEN, RDAAEBC
+from adapya.adabas.callring import cmdbufmask, INCBUF, INCACBX, INCEBC, INCNWBO
+from adapya.base.defs import LOGFB,LOGRB,LOGSB,LOGVB,LOGIB
+
+RECEYE = b'ADAR'
+RECVERS = 1
+
+# file header: eye, version
+RECFHDR = struct.Struct('!4sH2x')
+# record header: record length, flags, number of buffers, number of receive
+#   lengths, start time, call duration in seconds, thread ident,
+#   session (Adabas thread number), response code, control block length
+RECHDR = struct.Struct('!LBBBxdfQHHH2x')
+# buffer header: id, length of ABD (ACBX only), length of data sent
+RECBUF = INCBUF
+RECRCV = struct.Struct('!Q')
+
+# ABD offsets of send and receive size
+ABDSEND = 24
+ABDRECV = 32
+
+# ACB buffers and their sent data: logging option, buffer id, attribute name
+ACBBUFS = ((LOGFB,'F','fb'), (LOGRB,'R','rb'), (LOGSB,'S','sb'),
+           (LOGVB,'V','vb'), (LOGIB,'I','ib'))
+
+AD3ACB = Acb().keydict['ad3'][1]    # offset of additions 3 (password)
+AD3ACBX = Acbx().keydict['ad3'][1]
+
+
+class Recorder(object):
+    """ Append binary call records to memory mapped file
+
+    :param fname: name of the record file, it is overwritten
+    :param size: initial size of the mapped file, it is
+                 doubled when full and truncated on close()
+    :param keeppwd: if set, do not blank out the password in additions 3
+
+    A Recorder may be shared by Adabas objects of several threads.
+    """
+    def __init__(self, fname, size=1<<24, keeppwd=0):
+        self.fname = fname
+        self.keeppwd = keeppwd
+        self.lock = threading.Lock()
+        self.count = 0          # number of calls recorded
+        self.f = open(fname, 'w+b')
+        self.f.write(RECFHDR.pack(RECEYE, RECVERS))
+        self.size = max(size, mmap.PAGESIZE)
+        self.f.truncate(self.size)
+        self.mm = mmap.mmap(self.f.fileno(), self.size)
+        self.pos = RECFHDR.size
+
+    def before(self, apa):
+        """ Capture control block and sent buffers before the call.
+            This is called from Adabas.call()
+
+        :returns: state to be passed to after()
+        """
+        acb = apa.acb.raw
+        bufs = []
+        if len(acb) == ACBXLEN:
+            ad3 = AD3ACBX
+            fmt = apa.bo+'Q'
+            for abdb, buf in zip(apa.abds, apa.bufs):
+                send = struct.unpack_from(fmt, abdb, ABDSEND)[0]
+                bufs.append((abdb[4], abdb.raw, buf[0:send] if send else b''))
+        else:
+            ad3 = AD3ACB
+            mask = cmdbufmask(apa.cb.cmd, received=0)
+            for lopt, bid, attr in ACBBUFS:
+                if mask & lopt:
+                    buf = getattr(apa, attr)
+                    if buf:
+                        bufs.append((bid.encode('ascii'), b'', buf.raw))
+        if apa.password and not self.keeppwd:
+            blank = b'\x40' if apa.ebcdic else b' '
+            acb = acb[:ad3] + blank*8 + acb[ad3+8:]
+        return (time.time(), acb, bufs)
+
+    def after(self, apa, state):
+        """ Write call record after the call. This is called
+            from Adabas.call()
+
+        :param state: value returned from before()
+        """
+        t0, acb, bufs = state
+        elapsed = time.time()-t0
+        flags = (INCEBC if apa.ebcdic else 0) | \
+                (INCNWBO if apa.bo == NETWORKBO else 0)
+        recv = []
+        if len(acb) == ACBXLEN:
+            flags |= INCACBX
+            fmt = apa.bo+'Q'
+            recv = [struct.unpack_from(fmt, abdb, ABDRECV)[0] for abdb in apa.abds]
+
+        parts = [None, acb]
+        for bid, abdb, data in bufs:
+            parts.append(RECBUF.pack(bid, len(abdb), len(data)))
+            parts.append(abdb)
+            parts.append(data)
+        for r in recv:
+            parts.append(RECRCV.pack(r))
+        reclen = RECHDR.size + sum(len(p) for p in parts[1:])
+        parts[0] = RECHDR.pack(reclen, flags, len(bufs), len(recv), t0, elapsed,
+            get_ident(), apa.thread & 0xffff, apa.cb.rsp, len(acb))
+        self.write(b''.join(parts))
+
+    def write(self, data):
+        with self.lock:
+            n = len(data)
+            if self.pos + n + 4 > self.size:   # keep space for end marker
+                self.mm.flush()
+                self.mm.close()
+                self.size = max(2*self.size, self.pos+n+4)
+                self.f.truncate(self.size)
+                self.mm = mmap.mmap(self.f.fileno(), self.size)
+            self.mm[self.pos:self.pos+n] = data
+            self.pos += n
+            self.count += 1
+
+    def close(self):
+        """ Flush records and truncate file to recorded size """
+        with self.lock:
+            if self.mm:
+                self.mm.flush()
+                self.mm.close()
+                self.mm = None
+                self.f.truncate(self.pos)
+                self.f.close()
+
+
+class CallRecord(object):
+    """ Recorded Adabas call
+
+    :ivar flags: INCACBX, INCEBC, INCNWBO
+    :ivar time: start of call in seconds since epoch
+    :ivar elapsed: call duration in seconds
+    :ivar thread: thread ident
+    :ivar session: Adabas thread number of the Adabas object
+    :ivar rsp: response code
+    :ivar acb: control block bytes as sent
+    :ivar bufs: list of (buffer id, ABD bytes, sent bytes)
+    :ivar recv: list of receive lengths (ACBX only)
+    """
+    __slots__ = ('flags','time','elapsed','thread','session','rsp','acb','bufs','recv')
+
+    def __init__(self, flags, time, elapsed, thread, session, rsp, acb, bufs, recv):
+        self.flags = flags
+        self.time = time
+        self.elapsed = elapsed
+        self.thread = thread
+        self.session = session
+        self.rsp = rsp
+        self.acb = acb
+        self.bufs = bufs
+        self.recv = recv
+
+    @property
+    def cmd(self):
+        cmd = self.acb[6:8] if self.flags & INCACBX else self.acb[2:4]
+        return cmd.decode('cp037' if self.flags & INCEBC else 'latin1')
+
+
+def readrecords(fname):
+    """ Generator returning CallRecord objects from record file """
+    with open(fname, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            eye, vers = RECFHDR.unpack_from(mm, 0)
+            if eye != RECEYE:
+                raise ValueError('%s is not an Adabas call record file' % fname)
+            p = RECFHDR.size
+            end = len(mm)
+            while p + RECHDR.size <= end:
+                reclen, flags, nbufs, nrecv, t0, elapsed, ident, session, rsp, acbl = \
+                    RECHDR.unpack_from(mm, p)
+                if reclen == 0:     # end of records if not truncated
+                    break
+                q = p + RECHDR.size
+                acb = mm[q:q+acbl]
+                q += acbl
+                bufs = []
+                for i in range(nbufs):
+                    bid, abdl, dlen = RECBUF.unpack_from(mm, q)
+                    q += RECBUF.size
+                    bufs.append((bid.decode('ascii') if not flags&INCEBC
+                        else bid.decode('cp037'), mm[q:q+abdl], mm[q+abdl:q+abdl+dlen]))
+                    q += abdl+dlen
+                recv = [RECRCV.unpack_from(mm, q+8*i)[0] for i in range(nrecv)]
+                yield CallRecord(flags, t0, elapsed, ident, session, rsp, acb, bufs, recv)
+                p += reclen
+        finally:
+            mm.close()
+
+
+class ReplaySession(object):
+    """ Adabas object to reissue the recorded calls of one session
+
+    :param session: recorded session number
+    :param flags: flags of first record of session
+    :param dbid: if not zero: database id replacing the recorded dbid
+    """
+    def __init__(self, session, flags, dbid=0):
+        self.dbid = dbid
+        self.acbx = flags & INCACBX
+        archit = RDAAEBC if flags & INCEBC else None
+        thread = (session + 1) & 0xffff or 1    # non-zero for own Adabas user id
+        if self.acbx:
+            self.c = Adabasx(thread=thread, archit=archit, clientinfo=False,
+                             noexceptions=1)
+        else:
+            self.c = Adabas(thread=thread, archit=archit, noexceptions=1)
+        self.layout = None      # buffer ids of current ABD list
+        self.abdmaps = []
+
+    def setcall(self, rec):
+        """ Set control block and buffers from call record """
+        c = self.c
+        c.acb[0:len(rec.acb)] = rec.acb
+        if self.acbx:
+            layout = tuple(b[0] for b in rec.bufs)
+            if layout != self.layout:
+                c.abds = []
+                c.bufs = []
+                self.abdmaps = [c.addbuffer(bid, Abuf(max(len(data),1)))
+                    for bid, abdb, data in rec.bufs]
+                self.layout = layout
+            for i, (bid, abdb, data) in enumerate(rec.bufs):
+                c.abds[i][0:len(abdb)] = abdb
+                abd = self.abdmaps[i]
+                buf = c.bufs[i]
+                if len(buf) < abd.size:
+                    buf = c.bufs[i] = Abuf(abd.size)
+                abd.addr = ctypes.addressof(buf)
+                if data:
+                    buf[0:len(data)] = data
+            if self.dbid:
+                c.cb.dbid = self.dbid
+        else:
+            cb = c.cb
+            for lopt, bid, attr in ACBBUFS:
+                bl = getattr(cb, attr+'l')
+                buf = getattr(c, attr)
+                if bl > 0 and (not buf or len(buf) < bl):
+                    setattr(c, attr, Abuf(bl))
+            for bid, abdb, data in rec.bufs:
+                buf = getattr(c, bid.lower()+'b')
+                n = min(len(data), len(buf))
+                buf[0:n] = data[0:n]
+            c.dbid = self.dbid or cb.dbid   # ACB dbid is in response field
+
+
+def percentile(values, p):
+    """ Return p-th percentile (0..100) of sorted list of values """
+    if not values:
+        return 0.
+    i = min(len(values)-1, int(round(p/100. * (len(values)-1))))
+    return values[i]
+
+
+def replay(fname, threads=1, scale=1.0, dbid=0, maxcalls=0):
+    """ Reissue recorded calls
+
+    Calls of one recorded session are issued by the same replay thread
+    in the recorded sequence. Sessions are distributed over the threads.
+
+    :param fname: name of the record file
+    :param threads: number of replay threads
+    :param scale: factor for the inter-arrival times of the calls,
+                  1.0 = original timing, 0.5 = double speed,
+                  0 = issue calls without waiting
+    :param dbid: if not zero: database id replacing the recorded dbid
+    :param maxcalls: maximum number of calls to replay (0 = all)
+
+    :returns: dict with replay statistics: calls, duration, throughput,
+              latency percentiles (p50, p90, p99, max) and the same for
+              the recorded latencies (rec_p50 ...), number of calls
+              with a response code different from the recorded one
+              (rspdiff) and number of calls per command (cmds)
+    """
+    work = [[] for i in range(threads)]
+    sessions = {}   # session -> thread index
+    first = None
+    n = 0
+    for rec in readrecords(fname):
+        if maxcalls and n >= maxcalls:
+            break
+        if first is None:
+            first = rec.time
+        i = sessions.setdefault(rec.session, len(sessions) % threads)
+        work[i].append(rec)
+        n += 1
+
+    latencies = [[] for i in range(threads)]
+    rspdiff = [0]*threads
+    start = time.time()
+
+    def task(i):
+        rsess = {}
+        lat = latencies[i]
+        for rec in work[i]:
+            rs = rsess.get(rec.session)
+            if rs is None:
+                rs = rsess[rec.session] = ReplaySession(rec.session, rec.flags, dbid)
+            if scale:
+                delay = start + (rec.time - first)*scale - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            rs.setcall(rec)
+            t0 = time.time()
+            rs.c.call()
+            lat.append(time.time()-t0)
+            if rs.c.cb.rsp != rec.rsp:
+                rspdiff[i] += 1
+
+    tl = [threading.Thread(target=task, args=(i,)) for i in range(threads)]
+    for t in tl:
+        t.start()
+    for t in tl:
+        t.join()
+    duration = time.time()-start
+
+    lat = sorted(x for l in latencies for x in l)
+    rlat = sorted(rec.elapsed for w in work for rec in w)
+    cmds = {}
+    for w in work:
+        for rec in w:
+            cmds[rec.cmd] = cmds.get(rec.cmd, 0) + 1
+
+    stats = dict(calls=len(lat), duration=duration,
+                 throughput=len(lat)/duration if duration else 0.,
+                 rspdiff=sum(rspdiff), cmds=cmds)
+    for p in (50, 90, 99):
+        stats['p%d'%p] = percentile(lat, p)
+        stats['rec_p%d'%p] = percentile(rlat, p)
+    stats['max'] = lat[-1] if lat else 0.
+    stats['rec_max'] = rlat[-1] if rlat else 0.
+    return stats
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
@@ -0,0 +1,230 @@
+"""adapya.adabas.retry - Retry of hold conflicts with conflict statistics
+=====================================================================
+
+A command that puts a record in hold without waiting (e.g. L4 or A1
+with option R) returns response 145 if the record is held by another
+user. A RetryPolicy repeats such a call after a backoff delay:
+
+- the delay grows by factor from backoff up to maxbackoff and is
+  shortened by a random jitter so that conflicting users do not retry
+  at the same time
+- retrying ends after retries attempts or when maxwait seconds would
+  be exceeded, then the DatabaseError is raised or, with waithold,
+  the call is issued once more waiting for the hold (wait=1)
+
+On the first conflict of a call the event information of the response
+is read from the information view (file -4, see eventinfo()) which
+tells the job and user holding the record. It is read quietly on a
+session of the RetryPolicy and its command id is released after each
+read. The conflicts are counted in a ConflictStats object per file
+and ISN range and per record so that the records with most conflicts
+(hot spots) can be reported. A conflict is counted for each
+response 145.
+
+Example::
+
+    >>> from adapya.adabas.api import Adabas, UPD
+    >>> from adapya.adabas.retry import RetryPolicy
+    >>> c1 = Adabas(fbl=64, rbl=128)
+    >>> c1.dbid = 8
+    >>> c1.cb.fnr = 12
+    >>> c1.open(mode=UPD)
+    >>> policy = RetryPolicy(retries=8, maxwait=5.0, waithold=1)
+    >>> policy.run(c1.get, isn=7, hold=1)   # L4 with retries
+    >>> ...
+    >>> policy.run(c1.update)
+    >>> c1.et()
+    >>> policy.stats.report()
+    Hold conflicts: 4 calls delayed, 1 failed, 1.734 sec waited
+      fnr   ISN from     ISN to  conflicts   wait sec
+       12          0        999         12      1.734
+      fnr        ISN  conflicts  holder
+       12          7          9  TICKER   USER1
+
+"""
+from __future__ import print_function          # PY3
+
+import random
+import sys
+import time
+
+from adapya.adabas.api import Adabasx, AdabasException, DatabaseError, \
+    Infomap, INFOFB, \
+    INFOFIELDS
+
+RSPHOLD = 145       # record held by another user
+
+
+class ConflictStats(object):
+    """ Statistics of hold conflicts per file and ISN range and per record
+
+    :param isnrange: number of ISNs per range
+    """
+    def __init__(self, isnrange=1000):
+        self.isnrange = isnrange
+        self.conflicts = 0      # number of calls with conflicts
+        self.failed = 0         # calls failed after retrying
+        self.waited = 0.        # seconds waited in backoff
+        self.ranges = {}        # (fnr, range number): [conflicts, wait]
+        self.records = {}       # (fnr, isn): [conflicts, {holder: count}]
+
+    def add(self, fnr, isn, waited=0., holder=None):
+        """ Count a conflict on record isn of file fnr """
+        r = self.ranges.setdefault((fnr, isn//self.isnrange), [0, 0.])
+        r[0] += 1
+        r[1] += waited
+        rec = self.records.setdefault((fnr, isn), [0, {}])
+        rec[0] += 1
+        if holder:
+            rec[1][holder] = rec[1].get(holder, 0) + 1
+
+    def hotranges(self, n=10):
+        """ Return list of the n ISN ranges with most conflicts as
+            (fnr, first ISN, last ISN, conflicts, wait seconds)
+        """
+        top = sorted(self.ranges.items(), key=lambda x: -x[1][0])[:n]
+        return [(fnr, i*self.isnrange, (i+1)*self.isnrange-1, c, w)
+                for (fnr, i), (c, w) in top]
+
+    def hotspots(self, n=10):
+        """ Return list of the n records with most conflicts as
+            (fnr, isn, conflicts, most frequent holder or None)
+        """
+        top = sorted(self.records.items(), key=lambda x: -x[1][0])[:n]
+        return [(fnr, isn, c, max(h, key=h.get) if h else None)
+                for (fnr, isn), (c, h) in top]
+
+    def report(self, n=10, file=None):
+        """ Print conflict summary, hot ISN ranges and hot spot records """
+        f = file or sys.stdout
+        print('Hold conflicts: %d calls delayed, %d failed, %.3f sec waited'
+              % (self.conflicts, self.failed, self.waited), file=f)
+        if not self.ranges:
+            return
+        print('  fnr   ISN from     ISN to  conflicts   wait sec', file=f)
+        for fnr, first, last, c, w in self.hotranges(n):
+            print('%5d %10d %10d %10d %10.3f' % (fnr, first, last, c, w), file=f)
+        print('  fnr        ISN  conflicts  holder', file=f)
+        for fnr, isn, c, holder in self.hotspots(n):
+            print('%5d %10d %10d  %s' % (fnr, isn, c, holder or ''), file=f)
+
+
+class RetryPolicy(object):
+    """ Retry of calls failing with response 145
+
+    :param retries: maximum number of retries
+    :param backoff: first delay in seconds
+    :param factor: growth factor of the delay per retry
+    :param maxbackoff: maximum delay in seconds
+    :param jitter: fraction 0 to 1 by which each delay is randomly
+                   shortened
+    :param maxwait: maximum seconds waited in backoff per call
+    :param waithold: if true the call is issued with wait=1 after the
+                     last retry: it waits in the nucleus until the
+                     record is released
+    :param sample: if true the event information is read on the first
+                   conflict of a call to record the holding user
+    :param stats: ConflictStats object, default a new one
+    """
+    def __init__(self, retries=10, backoff=0.01, factor=2.0, maxbackoff=1.0,
+                 jitter=0.5, maxwait=10.0, waithold=0, sample=1, stats=None):
+        self.retries = retries
+        self.backoff = backoff
+        self.factor = factor
+        self.maxbackoff = maxbackoff
+        self.jitter = jitter
+        self.maxwait = maxwait
+        self.waithold = waithold
+        self.sample = sample
+        self.stats = stats if stats is not None else ConflictStats()
+        self.info = None        # session reading the event information
+        self.infomap = None
+
+    def delay(self, attempt):
+        """ Return delay in seconds before retry attempt (0 based) """
+        d = min(self.maxbackoff, self.backoff*self.factor**attempt)
+        return d*(1.-self.jitter*random.random())
+
+    def holder(self, apa):
+        """ Return 'jobname userid' of the user holding the record from
+            the event information of the last response or None
+        """
+        if self.info is None:
+            self.info = Adabasx(fbl=100, rbl=200)
+            self.info.fb.seek(0)
+            self.info.fb.write_text(INFOFB)
+            self.infomap = Infomap(*INFOFIELDS)
+        info, ev = self.info, self.infomap
+        info.cb.dbid = apa.cb.dbid
+        info.cb.fnr = -4        # information view
+        info.cb.cidn = -1       # command id assigned by Adabas
+        try:
+            info.readphysical(dmap=ev)
+        except AdabasException:
+            return None         # e.g. no information view
+        finally:
+            if info.cb.cidn != -1:
+                try:
+                    info.rc()   # release command id of the read sequence
+                except AdabasException:
+                    pass
+        if ev.response != RSPHOLD:
+            return None
+        return ' '.join(x.strip() for x in (ev.holder_jobname, ev.holder_userid)
+                        if x.strip()) or None
+
+    def run(self, func, *args, **kw):
+        """ Call func(*args, **kw) and retry on response 145
+
+        :param func: method of an Adabas session that puts a record
+                     in hold and accepts the wait parameter, e.g.
+                     get(hold=1), hold(), update(hold=1) or delete()
+        :returns: return value of func
+        """
+        waited = 0.
+        holder = None
+        attempt = 0
+        while 1:
+            try:
+                return func(*args, **kw)
+            except DatabaseError as e:
+                apa = e.apa
+                if apa.cb.rsp != RSPHOLD:
+                    raise
+                fnr, isn = apa.cb.fnr, apa.cb.isn
+                if attempt == 0:
+                    self.stats.conflicts += 1
+                    if self.sample:
+                        holder = self.holder(apa)
+                d = self.delay(attempt)
+                if attempt >= self.retries or waited+d > self.maxwait:
+                    self.stats.add(fnr, isn, 0., holder)
+                    if not self.waithold:
+                        self.stats.failed += 1
+                        raise
+                    break
+                time.sleep(d)
+                waited += d
+                self.stats.waited += d
+                self.stats.add(fnr, isn, d, holder)
+                attempt += 1
+        kw['wait'] = 1
+        try:
+            return func(*args, **kw)
+        except DatabaseError:
+            self.stats.failed += 1
+            raise
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
@@ -6,8 +6,18 @@
         -d  --dsn      <smf dataset name>  remote SMF file
         -f  --file     <file> local SMF file
         -b  --bfile    <file> local SMF file VB blocked with BDW
+        -a  --afile    <file> local SMF file with or without BDW (detected)
 
+        -i, --index    use/update index file <file>.idx to locate records
         -m, --maxrec   <int>  maximum number of records (default 10)
+        -s, --sty      <int>  select records of subtype (e.g. 3 interval)
+            --dbid     <int>  select records of database id
+            --nucx     <int>  select records of external nucleus id
+            --jbn      <name> select records of job name
+            --sid      <name> select records of system id
+            --from     <time> select intervals ending after time
+            --to       <time> select intervals starting before time
+                       (time is 'YYYY-MM-DD[ HH:MM[:SS]]' local time)
         -n, --nullprint  print fields with null value
         -p, --pwd      <password>  FTP ser1.3.0ogin password (*)
         -u, --user     <userid> FTP ser1.3.0ogin userid      (*)
@@ -28,6 +38,8 @@
 
     Option -b/--bfile if file includes block descriptor word (BDW)
     e.g. when running on z/OS with DCB=(RECFM=U) override on DD stmt
+    Option -a/--afile detects from the first block if the file includes
+    BDWs.
 
     Examples:
 
@@ -37,13 +49,20 @@
     2. read remote SMF dataset and print
         asmfreader -d mm.db8.smf -h da3f
 
+    3. print interval statistics records of DBID 8 of one day
+        asmfreader -f db8.smf -s 3 --dbid 8 --from 2023-03-01 --to 2023-03-02
+
+    The selection options are checked on the header and ID section
+    fields before a record is decoded.
+
 """
 from __future__ import print_function          # PY3
-import sys,os
+import sys
 import getopt
 from adapya.base.jconfig import getparms,setparms,SHOWCONFIG
 from adapya.base.dump import dump
-from adapya.adabas.asmfrec import Asbase0,ASBASELN0,Aspid0,Asunknown
+from adapya.adabas.asmfrec import Asbase0,Aspid0,Asunknown
+from adapya.adabas.smf import smfopen, SmfFilter
 
 __date__='$Date: 2023-01-04 10:56:59 +0100 (Wed, 04 Jan 2023) $'
 __version__='$Rev: 1050 $'
@@ -58,12 +77,13 @@ certfile = None
 dsn = ''         # Dataset name
 fname = ''       # local file name
 verbose = 0
-BDW = 0          # with BDW block descriptor word prefix
-block_rlen = 0   # block rest length
+BDW = 0          # with BDW block descriptor word prefix, None: detect
 maxrec = 10      # default 10 records
 skipnull = 1     # do not print fields with null values
 recno = 0        # record counter
 version = 0      # version unknown
+select = {}      # SmfFilter parameters
+index = 0        # use index file
 MONTHDICT = {'JANUARY':'01', 'FEBRUARY':'02', 'MARCH':'03', 'APRIL':'04',
              'MAY':'05', 'JUNE':'06', 'JULY':'07', 'AUGUST':'08',
              'SEPTEMBER':'09', 'OCTOBER':'10', 'NOVEMBER':'11', 'DECEMBER':'12'}
@@ -277,9 +297,10 @@ def setsect(idsect):
 
 try:
   opts, args = getopt.getopt(sys.argv[1:],
-    '?b:d:f:h:m:np:u:cC:v',
-    ['help','bfile=','file=','host=','pwd=','maxrec=',
-        'nullprint','user=','config','certfile=','verbose'])
+    '?a:b:d:f:h:im:np:s:u:cC:v',
+    ['help','afile=','bfile=','file=','host=','index','pwd=','maxrec=',
+        'nullprint','user=','config','certfile=','verbose',
+        'sty=','dbid=','nucx=','jbn=','sid=','from=','to='])
 except getopt.GetoptError:
   print( sys.argv[1:])
   usage()
@@ -303,8 +324,13 @@ for opt, arg in opts:
   elif opt in ('-b', '--bfile'):
     fname = arg
     BDW = 1
+  elif opt in ('-a', '--afile'):
+    fname = arg
+    BDW = None
   elif opt in ('-h', '--host'):
       host=arg
+  elif opt in ('-i', '--index'):
+    index = 1
   elif opt in ('-m', '--maxrec'):
     maxrec = int(arg)
   elif opt in ('-n', '--nullprint'):
@@ -315,6 +341,16 @@ for opt, arg in opts:
       user=arg
   elif opt in ('-v', '--verbose'):
       verbose=1
+  elif opt in ('-s', '--sty'):
+    select['sty'] = int(arg)
+  elif opt in ('--dbid', '--nucx'):
+    select[opt[2:]] = int(arg)
+  elif opt in ('--jbn', '--sid'):
+    select[opt[2:]] = arg.upper()
+  elif opt == '--from':
+    select['start'] = arg
+  elif opt == '--to':
+    select['end'] = arg
 
 if config:
     """
@@ -357,44 +393,22 @@ if dsn:
     ftp.quit()     # do not reuse ftp.
     # now the file is locally accessible
 
-f=open(fname,'rb')
-
+selfilter = SmfFilter(**select) if select else None
+smf=smfopen(fname, bdw=BDW, filter=selfilter, index=index)
+nrec = 0         # records printed
 smfrec=Asbase0() # Base record
 idsect=Aspid0()   # ID section
 secttab = None
 
-while 1:
+for rec in smf:
     try:
-        if recno > maxrec:
+        if nrec > maxrec:
             print( 'Local SMF file; processed maxrec=%i SMF records' % maxrec)
-            f.close()
-            break
-        smfrecbuf = f.read(4)
-        if len(smfrecbuf)<4:
-            print( 'EOF in local SMF file; processed %i SMF records' % recno)
-            f.close()
-            break
-        smfrec.buffer=smfrecbuf # update underlying buffer
-        rlen = smfrec.rlen
-
-        if BDW:
-            if block_rlen > 4:
-                block_rlen -= rlen
-            else: # need to consume BDW block header 4 bytes
-                block_rlen = smfrec.rlen
-
-                if verbose:
-                    dump(smfrecbuf[0:4],header='SMF block header')
-                continue  # need to read RDW
-
-        recno += 1
-
-        if rlen < ASBASELN0 :
-            print( 'Record %d has invalid record length %d (shorter than %d)' % (
-                recno, rlen, ASBASELN0))
             break
-        f.seek(-4, os.SEEK_CUR) # rewind to record start
-        smfrecbuf = f.read(rlen)# read complete record into buffer
+        nrec += 1
+        recno = rec.recno
+        rlen = rec.length
+        smfrecbuf = bytes(rec.data) # record from mapped file
         smfrec.buffer=smfrecbuf # update underlying buffer
 
         if verbose:
@@ -485,5 +499,11 @@ while 1:
 
         smfrec.offset=0 # reset offset
     except:
+        smf.close()
         raise
+else:
+    print( 'EOF in local SMF file; processed %i SMF records' % nrec)
+if selfilter:
+    print( selfilter.report())
+smf.close()
 
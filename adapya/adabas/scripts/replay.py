@@ -0,0 +1,120 @@
+""" replay - reissue Adabas calls recorded with adapya.adabas.recorder
+
+    Usage:
+
+        python replay.py --file <recfile> [--dbid <dbid>] [--threads <n>]
+                         [--scale <factor>]
+
+    Options:
+
+        -f, --file          <recfile> file written by Recorder
+        -d, --dbid          <dbid> replaces the recorded database id
+        -t, --threads       number of replay threads (default 1)
+        -s, --scale         factor for the recorded inter-arrival times
+                                1 = original timing (default)
+                                0.5 = double speed, 0 = no wait
+        -m, --maxcalls      maximum number of calls to replay
+        -l, --list          list recorded calls, do not replay
+        -r, --replytimeout <sec>  Adalink max. wait time on reply
+        -h, --help          display this help
+
+    Examples:
+
+        python replay.py -f calls.rec -l
+        python replay.py -f calls.rec -d 12 -t 8 -s 0
+
+"""
+from __future__ import print_function          # PY3
+
+import getopt
+import sys
+import time
+
+from adapya.adabas.api import adaSetTimeout
+from adapya.adabas.recorder import readrecords, replay
+
+
+def usage():
+    print(__doc__)
+    print("Running Python version", sys.version)
+
+FNAME=''
+DBID=0
+THREADS=1
+SCALE=1.0
+MAXCALLS=0
+LIST=0
+REPLYTIMEOUT=0
+
+try:
+    opts, args = getopt.getopt(sys.argv[1:],
+      'hd:f:lm:r:s:t:',
+      ['help','dbid=','file=','list','maxcalls=','replytimeout=','scale=','threads='])
+except getopt.GetoptError:
+    usage()
+    sys.exit(2)
+for opt, arg in opts:
+    if opt in ('-h', '--help'):
+        usage()
+        sys.exit()
+    elif opt in ('-d', '--dbid'):
+        DBID=int(arg)
+    elif opt in ('-f', '--file'):
+        FNAME=arg
+    elif opt in ('-l', '--list'):
+        LIST=1
+    elif opt in ('-m', '--maxcalls'):
+        MAXCALLS=int(arg)
+    elif opt in ('-r', '--replytimeout'):
+        REPLYTIMEOUT=int(arg)
+    elif opt in ('-s', '--scale'):
+        SCALE=float(arg)
+    elif opt in ('-t', '--threads'):
+        THREADS=int(arg)
+
+if not FNAME or THREADS < 1:
+    usage()
+    sys.exit(2)
+
+if LIST:
+    for i, rec in enumerate(readrecords(FNAME)):
+        if MAXCALLS and i >= MAXCALLS:
+            break
+        print('%6d %s.%03d %8.3f ms thread=%X session=%d cmd=%s rsp=%d bufs=%s' % (
+            i+1, time.strftime('%H:%M:%S', time.localtime(rec.time)),
+            int(rec.time*1000)%1000, rec.elapsed*1000., rec.thread,
+            rec.session, rec.cmd, rec.rsp,
+            ','.join('%s%d' % (b[0], len(b[2])) for b in rec.bufs)))
+    sys.exit()
+
+if REPLYTIMEOUT:
+    adaSetTimeout(REPLYTIMEOUT)
+
+print('Replaying %s with %d threads, scale=%g' % (FNAME, THREADS, SCALE))
+
+s = replay(FNAME, threads=THREADS, scale=SCALE, dbid=DBID, maxcalls=MAXCALLS)
+
+print('\n%d calls in %.3f sec, %.1f calls/sec' % (
+    s['calls'], s['duration'], s['throughput']))
+print('\nLatency ms       replay   recorded')
+for p in ('p50', 'p90', 'p99', 'max'):
+    print('  %-10s %10.3f %10.3f' % (p, s[p]*1000., s['rec_'+p]*1000.))
+if s['rspdiff']:
+    print('\n%d calls with response code different from recording' % s['rspdiff'])
+print('\nCalls per command:')
+for cmd, n in sorted(s['cmds'].items()):
+    print('  %s %8d' % (cmd, n))
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
@@ -0,0 +1,1047 @@
+"""adapya.adabas.smf - Adabas SMF record reader
+=============================================
+
+SmfReader memory-maps a file of Adabas SMF records and yields the
+records as SmfRecord objects. The file has variable records each
+preceded by a record descriptor word (RDW), as transferred from z/OS
+with the FTP RDW option, or variable blocked records where each block
+is preceded by a block descriptor word (BDW).
+
+The record descriptors are read from the mapped file without further
+I/O calls. An SmfRecord holds only the position of the record in the
+mapped file. Header fields are unpacked when accessed and sections are
+mapped on request with the Datamap classes of the record version
+(asmfrec13 ... asmfrec31), the version is taken from the ID section
+(Aspid0.smfv).
+
+Example printing the thread activity of interval records::
+
+    >>> from adapya.adabas.smf import SmfReader, THRD
+    >>> from adapya.adabas.asmfrec import ASSTS
+    >>> with SmfReader('db8.smf') as smf:
+    ...     for rec in smf:
+    ...         if rec.sty != ASSTS:
+    ...             continue
+    ...         print(rec.recno, rec.jbn, rec.nucx)
+    ...         for i, thrd in enumerate(rec.sections(THRD)):
+    ...             print('  %3d %12d' % (i+1, thrd.thrdct))
+
+For analysis the elements of a section are decoded at once with a
+SectionDecoder: a struct.Struct generated from the section Datamap
+unpacks the whole section array with iter_unpack(). The decoders are
+built once per record version and element length::
+
+    >>> rec.decoder(CMD).names
+    ['cmdnm', 'cmdct', 'cmdtm']
+    >>> rec.decode(CMD)
+    [('L1', 25, 102400), ('S1', 3, 40960)]
+    >>> rec.columns(THRD)['thrdct']
+    array('Q', [1200, 533, 0])
+
+An SmfFilter passed to the reader selects records on header and ID
+section fields before any section is touched::
+
+    >>> from adapya.adabas.smf import SmfFilter
+    >>> sel = SmfFilter(sty=ASSTS, dbid=8, jbn='ADA8',
+    ...     start='2023-03-01', end='2023-03-02')
+    >>> with SmfReader('db8.smf', filter=sel) as smf:
+    ...     for rec in smf:
+    ...         print(rec.recno, rec.columns(THRD)['thrdct'])
+    >>> sel.report()
+    '61212 records scanned, 24 selected'
+
+Compressed archives (gzip, bz2, xz) are read sequentially with
+SmfStream, smfopen() returns an SmfStream or SmfReader for a file::
+
+    >>> with smfopen('db8.smf.gz') as smf:
+    ...     for rec in smf:
+    ...         print(rec.recno, rec.sty)
+
+An SmfIndex file with the offset and ID fields of each record lets a
+reader with a filter go directly to the selected records of a large
+file: SmfReader('db8.smf', filter=sel, index=1).
+
+"""
+from __future__ import print_function          # PY3
+
+import array
+import binascii
+import importlib
+import io
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+import queue
+
+from adapya.base.datamap import T_STRING, T_BYTE, T_PACK, T_UNPK, T_UTF8, \
+    T_UTF16, T_CHAR, T_NONE, T_EBCDIC
+from adapya.base.stck import cstckd, sec1970
+from adapya.adabas.asmfrec import Asbase0, Aspid0, ASBASELN0
+from adapya.adabas.convert import Layout, EBCDIC
+
+# Self-defining section index in the section triplet table
+ID = 0          # ID section
+USER = 1        # User-defined section
+PARM = 2        # ADARUN parameters
+STG = 3         # Storage pool
+IODD = 4        # I/O by DD name
+THRD = 5        # Thread activity
+FILE = 6        # File activity
+CMD = 7         # Command activity
+CHP = 8         # Parallel services cache
+CHG = 9         # Global cache
+CHB = 10        # Global cache by block type
+CHF = 11        # Global cache by file
+LOK = 12        # Global locks
+MSGB = 13       # Inter-nucleus messaging control blocks
+MSGC = 14       # Inter-nucleus messaging counts
+MSGH = 15       # Inter-nucleus messaging histogram
+REVIEW = 16     # Review messaging
+SESS = 17       # Nucleus session statistics
+ZIIP = 18       # zIIP statistics
+
+# Datamap class name per section index, None: section of unknown structure
+SECTIONS = ('Aspid', None, 'Asparm', 'Asstg', 'Asiodd', 'Asthrd', 'Asfile',
+    'Ascmd', 'Aschp', 'Aschg', 'Aschb', 'Aschf', 'Aslok', 'Asmsgb', 'Asmsgc',
+    'Asmsgh', None, 'Assess', 'Ziip')
+
+# SMF record version to module with the record structures
+VERSIONS = {
+    b'\x01\x03': 'adapya.adabas.asmfrec13',     # Adabas V8.3
+    b'\x01\x04': 'adapya.adabas.asmfrec14',     # Adabas V8.4
+    b'\x01\x05': 'adapya.adabas.asmfrec15',     # Adabas V8.3 with zIIP
+    b'\x01\x06': 'adapya.adabas.asmfrec16',     # Adabas V8.4 with zIIP
+    b'\x02\x01': 'adapya.adabas.asmfrec21',
+    b'\x03\x01': 'adapya.adabas.asmfrec31',     # Adabas V8.6 with zIIP
+    }
+
+HW = struct.Struct('>H')            # RDW/BDW length
+TRIPLET = struct.Struct('>LHH')     # section offset, length, number
+
+# header and ID section field positions taken from the Datamaps
+_base = Asbase0().keydict
+_id = Aspid0().keydict
+TIDO = _base['tido'][1]             # offset of triplet table
+RTY = struct.Struct('>B')
+STY = struct.Struct('>H')
+STYPOS = _base['sty'][1]
+RTYPOS = _base['rty'][1]
+SIDPOS = _base['sid'][1]
+SMFVPOS = _id['smfv'][1]
+SEGNOPOS = _id['segno'][1]
+SEGLPOS = _id['segl'][1]
+JBNPOS = _id['jbn'][1]
+STPOS = _id['st'][1]
+IST = struct.Struct('>QQQ')         # nucleus start, interval start, end
+DBID = struct.Struct('>LH')         # dbid, external nucleus id
+DBIDPOS = _id['dbid'][1]
+ADARTY = 0x6F                       # SMF record type of Adabas records
+IDLEN = max(STPOS+IST.size, DBIDPOS+DBID.size, JBNPOS+8)
+
+
+class SmfError(Exception): pass
+
+
+_versions = {}      # SMF record version: SmfVersion
+
+
+def smfversion(smfv):
+    """ Return SmfVersion for the SMF record version bytes, e.g. b'\\x03\\x01'
+    """
+    v = _versions.get(smfv)
+    if v is None:
+        modname = VERSIONS.get(bytes(smfv))
+        if not modname:
+            raise SmfError('Not yet supported ADASMF records version %r'
+                % (bytes(smfv),))
+        v = _versions[smfv] = SmfVersion(smfv, importlib.import_module(modname))
+    return v
+
+
+class SmfVersion(object):
+    """ Record structures of one SMF record version
+
+    :param smfv: version bytes from the ID section
+    :param module: asmfrecNN module of the version
+    """
+    def __init__(self, smfv, module):
+        self.smfv = smfv
+        self.module = module
+        # section Datamap class per index, None if not in version
+        self.classes = [getattr(module, name, None) if name else None
+                        for name in SECTIONS]
+        self.decoders = {}      # (index, length): SectionDecoder
+
+    def datamap(self, index):
+        """ Return new Datamap instance for section index
+            (Asunknown for sections of unknown structure)
+        """
+        cls = self.classes[index] if index < len(self.classes) else None
+        return (cls or self.module.Asunknown)()
+
+    def decoder(self, index, length):
+        """ Return SectionDecoder for section index with element length
+            (decoders are built once per version, section and length)
+        """
+        key = (index, length)
+        d = self.decoders.get(key)
+        if d is None:
+            d = self.decoders[key] = SectionDecoder(self.datamap(index), length)
+        return d
+
+
+def packed2int(b):
+    """ Return integer from packed decimal bytes """
+    h = binascii.hexlify(b)
+    return -int(h[:-1]) if h[-1:] in (b'b', b'd') else int(h[:-1])
+
+
+def unpacked2int(b):
+    """ Return integer from EBCDIC unpacked (zoned) decimal bytes """
+    n = int(''.join('%d' % (c & 0x0f) for c in bytearray(b)))
+    return -n if bytearray(b[-1:])[0] >> 4 in (0xb, 0xd) else n
+
+
+class SectionDecoder(object):
+    """ Decoder of arrays of section elements with one struct.Struct
+        generated from the section Datamap
+
+    :param dmap: Datamap of the section (network byte order, EBCDIC)
+    :param length: element length of the section in the record, the
+                   decoder skips any bytes beyond the Datamap fields
+
+    Integer fields are unpacked as integers (STCK values as raw
+    integers), String fields are decoded from EBCDIC without trailing
+    blanks, Packed and Unpacked fields are returned as integers, other
+    fields as bytes. Filler fields (T_NONE) and fields that redefine
+    bytes of preceding fields are left out.
+
+    The EBCDIC fields of all elements are translated to latin-1 at once
+    with a Layout (see adapya.adabas.convert) before unpacking.
+    """
+    def __init__(self, dmap, length=None):
+        self.dmname = dmap.dmname
+        self.names = []         # field names in decoded tuple
+        self.types = []         # Datamap field type per name
+        convs = []              # (tuple index, conversion function)
+        alpha = []              # (offset, length, 'A') of EBCDIC fields
+        fmt = ['>']
+        pos = 0
+        fields = sorted((dmap.keydict[k][1], i, k)
+            for i, k in enumerate(dmap.keylist))
+        for fpos, i, key in fields:
+            fty, fpos, size, opt, fdict = dmap.keydict[key]
+            if fpos < pos or opt & T_NONE or not size or fdict.get('occurs'):
+                continue
+            if fpos > pos:
+                fmt.append('%dx' % (fpos-pos))
+            j = len(self.names)
+            if fty in (T_STRING, T_BYTE, T_PACK, T_UNPK, T_UTF8, T_UTF16):
+                fmt.append('%ds' % size)
+                if fty == T_STRING:
+                    enc = dmap.encoding
+                    if dmap.ebcdic or opt & T_EBCDIC:
+                        alpha.append((fpos, size, 'A'))
+                        enc = 'latin1'
+                    convs.append((j, lambda b, enc=enc: b.decode(enc).rstrip(' ')))
+                elif fty == T_PACK:
+                    convs.append((j, packed2int))
+                elif fty == T_UNPK:
+                    convs.append((j, unpacked2int))
+                elif fty == T_UTF8:
+                    convs.append((j, lambda b: b.decode('utf_8', 'ignore').rstrip(' ')))
+                elif fty == T_UTF16:
+                    convs.append((j, lambda b: b.decode('utf_16_be').rstrip(' ')))
+            elif fty == T_CHAR:
+                fmt.append('c')
+                alpha.append((fpos, size, 'A'))
+                convs.append((j, lambda b: b.decode('latin1')))
+            else:
+                fmt.append(fty)
+            self.names.append(key)
+            self.types.append(fty)
+            pos = fpos + size
+        self.length = pos if length is None else length
+        if self.length < pos:
+            raise SmfError('Section length %d is shorter than defined %d for %s'
+                % (self.length, pos, self.dmname))
+        if self.length > pos:
+            fmt.append('%dx' % (self.length-pos))
+        self.struct = struct.Struct(''.join(fmt))
+        self.convs = convs
+        self.layout = Layout(alpha, self.length, EBCDIC) if alpha else None
+
+    def decode(self, buf):
+        """ Return list of tuples of the field values of the elements in
+            buf (bytes-like object of a multiple of the element length)
+        """
+        if self.layout:
+            buf = self.layout.convertbytes(buf)
+        rows = self.struct.iter_unpack(buf)
+        if not self.convs:
+            return list(rows)
+        convs = self.convs
+        out = []
+        for row in rows:
+            row = list(row)
+            for j, conv in convs:
+                row[j] = conv(row[j])
+            out.append(tuple(row))
+        return out
+
+    def columns(self, buf):
+        """ Return dictionary of field name to column of the values of the
+            elements in buf: integer fields as array.array, others as list
+        """
+        if self.layout:
+            buf = self.layout.convertbytes(buf)
+        rows = list(self.struct.iter_unpack(buf))
+        cols = list(zip(*rows)) if rows else [()]*len(self.names)
+        result = {}
+        convs = dict(self.convs)
+        for j, (name, fty) in enumerate(zip(self.names, self.types)):
+            if j in convs:
+                result[name] = [convs[j](v) for v in cols[j]]
+            elif fty in ARRAYTYPES:
+                result[name] = array.array(ARRAYTYPES[fty], cols[j])
+            else:
+                result[name] = list(cols[j])
+        return result
+
+
+# struct format of integer fields to array type code
+ARRAYTYPES = dict((c, c) for c in 'bBhHiIlLqQfd')
+ARRAYTYPES.update({'l': 'i' if array.array('i').itemsize == 4 else 'l',
+                   'L': 'I' if array.array('I').itemsize == 4 else 'L'})
+
+
+class SmfRecord(object):
+    """ Adabas SMF record in a buffer
+
+    :param buffer: buffer (mmap, bytes) holding the record
+    :param offset: offset of the record (RDW) in the buffer
+    :param length: record length including RDW
+    :param recno: record number (1 based)
+    """
+    __slots__ = ('buffer', 'offset', 'length', 'recno')
+
+    def __init__(self, buffer, offset, length, recno=0):
+        self.buffer = buffer
+        self.offset = offset
+        self.length = length
+        self.recno = recno
+
+    def __repr__(self):
+        return '<SmfRecord %d at %d length %d>' % (self.recno, self.offset,
+            self.length)
+
+    @property
+    def data(self):
+        """ memoryview of the record bytes """
+        return memoryview(self.buffer)[self.offset:self.offset+self.length]
+
+    @property
+    def rty(self):
+        """ SMF record type """
+        return RTY.unpack_from(self.buffer, self.offset+RTYPOS)[0]
+
+    @property
+    def sty(self):
+        """ Record subtype (ASSTI, ASSTT, ASSTS, ASSTP, ASSTA) """
+        return STY.unpack_from(self.buffer, self.offset+STYPOS)[0]
+
+    @property
+    def sid(self):
+        """ System identifier """
+        off = self.offset+SIDPOS
+        return self.buffer[off:off+4].decode('cp037').rstrip(' ')
+
+    def triplet(self, index):
+        """ Return (offset, length, number) of section index with offset
+            from the record start, offset 0 if the section is not present
+        """
+        tido = TRIPLET.unpack_from(self.buffer, self.offset+TIDO)[0]
+        if index and TIDO + TRIPLET.size*(index+1) > min(tido, self.length):
+            return 0, 0, 0      # beyond triplet table
+        return TRIPLET.unpack_from(self.buffer,
+            self.offset+TIDO+TRIPLET.size*index)
+
+    @property
+    def idoffset(self):
+        """ Offset of the ID section in the buffer """
+        return self.offset + TRIPLET.unpack_from(self.buffer, self.offset+TIDO)[0]
+
+    @property
+    def smfv(self):
+        """ ADASMF record version bytes """
+        off = self.idoffset + SMFVPOS
+        return bytes(self.buffer[off:off+2])
+
+    @property
+    def segno(self):
+        """ Record segment number """
+        return RTY.unpack_from(self.buffer, self.idoffset+SEGNOPOS)[0]
+
+    @property
+    def lastsegment(self):
+        """ True if record is the last segment of the interval """
+        return RTY.unpack_from(self.buffer, self.idoffset+SEGLPOS)[0] == 0
+
+    @property
+    def version(self):
+        """ SmfVersion of the record """
+        return smfversion(self.smfv)
+
+    @property
+    def jbn(self):
+        """ Job name """
+        off = self.idoffset + JBNPOS
+        return self.buffer[off:off+8].decode('cp037').rstrip(' ')
+
+    @property
+    def dbid(self):
+        return DBID.unpack_from(self.buffer, self.idoffset+DBIDPOS)[0]
+
+    @property
+    def nucx(self):
+        """ External nucleus id """
+        return DBID.unpack_from(self.buffer, self.idoffset+DBIDPOS)[1]
+
+    @property
+    def times(self):
+        """ (nucleus start, interval start, interval end) STCK values """
+        return IST.unpack_from(self.buffer, self.idoffset+STPOS)
+
+    @property
+    def interval(self):
+        """ (interval start, interval end) in seconds since 1970 """
+        st, ist, iet = self.times
+        return stcktime(ist), stcktime(iet)
+
+    def header(self):
+        """ Return Asbase Datamap of the record version on the record """
+        return self.version.module.Asbase(buffer=self.buffer, offset=self.offset)
+
+    def sectionbytes(self, index):
+        """ Return memoryview of all elements of section index """
+        off, slen, num = self.triplet(index)
+        start = self.offset + off
+        return memoryview(self.buffer)[start:start+slen*num] if off \
+            else memoryview(b'')
+
+    def sections(self, index, dmap=None):
+        """ Generator of the elements of section index mapped with
+            the Datamap of the record version
+
+        :param dmap: Datamap instance to use, default is a new instance
+                     of the section class
+
+        The same Datamap instance is positioned on each element in turn.
+        """
+        off, slen, num = self.triplet(index)
+        if not off:
+            return
+        if dmap is None:
+            dmap = self.version.datamap(index)
+        if slen < dmap.dmlen:
+            raise SmfError('Record %d section %d length %d is shorter than '
+                'defined %d for %s' % (self.recno, index, slen, dmap.dmlen,
+                dmap.dmname))
+        dmap.buffer = self.buffer
+        for i in range(num):
+            dmap.offset = self.offset + off + i*slen
+            yield dmap
+
+    def section(self, index):
+        """ Return Datamap of first element of section index or None """
+        for dmap in self.sections(index):
+            return dmap
+        return None
+
+    def decoder(self, index):
+        """ Return SectionDecoder for section index of the record version
+            or None if the section is not present
+        """
+        off, slen, num = self.triplet(index)
+        return self.version.decoder(index, slen) if off else None
+
+    def decode(self, index):
+        """ Return list of tuples of the elements of section index,
+            field names are in decoder(index).names
+        """
+        d = self.decoder(index)
+        return d.decode(self.sectionbytes(index)) if d else []
+
+    def columns(self, index):
+        """ Return dictionary of field name to column of values of the
+            elements of section index, see SectionDecoder.columns()
+        """
+        d = self.decoder(index)
+        return d.columns(self.sectionbytes(index)) if d else {}
+
+
+def timestck(t):
+    """ Return STCK value from seconds since 1970 or local time string
+        'YYYY-MM-DD[ HH:MM[:SS]]'
+    """
+    if isinstance(t, str):
+        for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+            try:
+                t = time.mktime(time.strptime(t, fmt))
+                break
+            except ValueError:
+                pass
+        else:
+            raise ValueError('Invalid time %r' % (t,))
+    return int((t + sec1970) * 1000000) << 12
+
+
+def stcktime(stck):
+    """ Return seconds since 1970 from STCK value """
+    s, us = cstckd(stck)
+    return s + us/1e6
+
+
+def _values(v, conv=None):
+    """ Return None, or set of the value or of the values in list v """
+    if v is None:
+        return None
+    if isinstance(v, (int, str, bytes)):
+        v = (v,)
+    return frozenset(conv(x) if conv else x for x in v)
+
+
+def _ebcdic(width):
+    return lambda s: s.encode('cp037').ljust(width, b'\x40')[:width] \
+        if not isinstance(s, bytes) else s
+
+
+class SmfFilter(object):
+    """ Selection of SMF records on header and ID section fields
+
+    The fields are unpacked at their fixed offsets from the record
+    buffer: records not selected are skipped without mapping or
+    decoding any section.
+
+    :param sty: record subtype or list of subtypes, e.g. ASSTS
+    :param rty: Adabas record type or list of types
+    :param sid: system identifier or list
+    :param dbid: database id or list
+    :param nucx: external nucleus id or list
+    :param jbn: job name or list
+    :param start, end: select records with an interval ending after
+                       start and starting before end, given as seconds
+                       since 1970 or local time string (see timestck())
+
+    :ivar scanned: number of records checked by match()
+    :ivar selected: number of records selected
+    """
+    def __init__(self, sty=None, rty=None, sid=None, dbid=None, nucx=None,
+                 jbn=None, start=None, end=None):
+        self.sty = _values(sty)
+        self.rty = _values(rty)
+        self.sid = _values(sid, _ebcdic(4))
+        self.dbid = _values(dbid)
+        self.nucx = _values(nucx)
+        self.jbn = _values(jbn, _ebcdic(8))
+        self.start = timestck(start) if start is not None else None
+        self.end = timestck(end) if end is not None else None
+        self.idfields = (self.dbid is not None or self.nucx is not None or
+            self.jbn is not None or self.start is not None or
+            self.end is not None)
+        # fields not in an SmfIndex entry
+        self.recfields = (self.rty is not None or self.sid is not None or
+            self.jbn is not None)
+        self.scanned = 0
+        self.selected = 0
+
+    def match(self, buf, offset, length):
+        """ Return true if the record at offset in buf is selected """
+        self.scanned += 1
+        if self.sty is not None and \
+                STY.unpack_from(buf, offset+STYPOS)[0] not in self.sty:
+            return 0
+        if self.rty is not None and \
+                RTY.unpack_from(buf, offset+RTYPOS)[0] not in self.rty:
+            return 0
+        if self.sid is not None and \
+                bytes(buf[offset+SIDPOS:offset+SIDPOS+4]) not in self.sid:
+            return 0
+        if self.idfields:
+            ido = TRIPLET.unpack_from(buf, offset+TIDO)[0]
+            if ido < ASBASELN0 or ido + IDLEN > length:
+                return 0            # no ID section
+            ido += offset
+            if self.dbid is not None or self.nucx is not None:
+                dbid, nucx = DBID.unpack_from(buf, ido+DBIDPOS)
+                if self.dbid is not None and dbid not in self.dbid or \
+                        self.nucx is not None and nucx not in self.nucx:
+                    return 0
+            if self.jbn is not None and \
+                    bytes(buf[ido+JBNPOS:ido+JBNPOS+8]) not in self.jbn:
+                return 0
+            if self.start is not None or self.end is not None:
+                st, ist, iet = IST.unpack_from(buf, ido+STPOS)
+                if self.start is not None and iet <= self.start or \
+                        self.end is not None and ist >= self.end:
+                    return 0
+        self.selected += 1
+        return 1
+
+    def matchentry(self, entry, buf):
+        """ Return true if the record of SmfIndex entry is selected, the
+            fields not in the entry are checked on the record in buf
+        """
+        offset, length, sty, nucx, dbid, ist, iet = entry
+        if (self.sty is not None and sty not in self.sty or
+                self.dbid is not None and dbid not in self.dbid or
+                self.nucx is not None and nucx not in self.nucx or
+                self.start is not None and iet <= self.start or
+                self.end is not None and ist >= self.end):
+            self.scanned += 1
+            return 0
+        if self.recfields:
+            return self.match(buf, offset, length)
+        self.scanned += 1
+        self.selected += 1
+        return 1
+
+    def report(self):
+        """ Return string with the numbers of records scanned and selected """
+        return '%d records scanned, %d selected' % (self.scanned, self.selected)
+
+
+class SmfReader(object):
+    """ Reader of Adabas SMF records from a memory-mapped file
+
+    :param fname: file name
+    :param bdw: 1 if blocks have a block descriptor word (BDW),
+                0 if not, None detects this from the first record
+                (see detectbdw(), remains None if the file is too short)
+    :param filter: SmfFilter selecting the records yielded
+    :param index: SmfIndex of the file or true to use the index file
+                  fname+'.idx', the index is built or updated and
+                  the records are located with it
+
+    Iterating over the reader yields SmfRecord objects. Records of the
+    reader refer to the mapped file and must not be used after close().
+    """
+    def __init__(self, fname, bdw=None, filter=None, index=None):
+        self.fname = fname
+        self.filter = filter
+        if index and not isinstance(index, SmfIndex):
+            index = SmfIndex(fname, bdw=bdw)
+        self.index = index
+        if index:
+            index.update()
+            bdw = index.bdw
+        self.file = open(fname, 'rb')
+        try:
+            self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:      # empty file cannot be mapped
+            self.buffer = b''
+        self.size = len(self.buffer)
+        self.bdw = detectbdw(self.buffer) if bdw is None else bdw
+        self.pos = 0            # position after last complete record
+        self.recno = 0          # records read
+
+    def __iter__(self):
+        return self.records()
+
+    def records(self):
+        """ Generator of SmfRecord objects selected by the filter,
+            recno of the record is its number in the file
+        """
+        buf = self.buffer
+        if self.index:
+            for recno, off, rlen in self.index.find(self.filter, buf):
+                if off + rlen > self.size:
+                    break       # file changed since index update
+                self.recno = recno
+                yield SmfRecord(buf, off, rlen, recno)
+            return
+        match = self.filter.match if self.filter else None
+        for off, rlen in self.scan():
+            self.recno += 1
+            if match is None or match(buf, off, rlen):
+                yield SmfRecord(buf, off, rlen, self.recno)
+
+    def scan(self, start=0, end=None):
+        """ Generator of (offset, length) of the records between start and
+            end (default end of file). Scanning stops before an incomplete
+            record at the end, self.pos is updated to the position after
+            the last complete record or block.
+        """
+        buf = self.buffer
+        end = self.size if end is None else end
+        pos = start
+        unpack = HW.unpack_from
+        if self.bdw is None:
+            return              # first block or record not complete
+        while pos + 4 <= end:
+            if self.bdw:
+                blen = unpack(buf, pos)[0]
+                if blen < 8:
+                    raise SmfError('Invalid block length %d at offset %d'
+                        % (blen, pos))
+                if pos + blen > end:
+                    break
+                bend = pos + blen
+                rpos = pos + 4
+                while rpos + 4 <= bend:
+                    rlen = checklen(unpack(buf, rpos)[0], rpos)
+                    if rpos + rlen > bend:
+                        raise SmfError('Record at offset %d length %d exceeds '
+                            'block at offset %d length %d' % (rpos, rlen,
+                            pos, blen))
+                    yield rpos, rlen
+                    rpos += rlen
+                if rpos != bend:
+                    raise SmfError('Block at offset %d length %d ends with '
+                        '%d bytes not in a record' % (pos, blen, bend-rpos))
+                pos = bend
+            else:
+                rlen = checklen(unpack(buf, pos)[0], pos)
+                if pos + rlen > end:
+                    break
+                yield pos, rlen
+                pos += rlen
+            self.pos = pos
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            try:
+                self.buffer.close()
+            except BufferError:     # memoryview of a record still in use
+                pass
+        self.buffer = b''
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# compressed file signatures
+COMPRESSIONS = ((b'\x1f\x8b', 'gzip'), (b'BZh', 'bz2'),
+                (b'\xfd7zXZ\x00', 'xz'))
+
+
+def compression(head):
+    """ Return 'gzip', 'bz2', 'xz' or None from the first bytes of a file """
+    for magic, name in COMPRESSIONS:
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def decompressor(name, f):
+    """ Return file object reading decompressed data from binary file f """
+    if name == 'gzip':
+        import gzip
+        return gzip.GzipFile(fileobj=f, mode='rb')
+    if name == 'bz2':
+        import bz2
+        return bz2.BZ2File(f)
+    if name == 'xz':
+        import lzma
+        return lzma.LZMAFile(f)
+    return f
+
+
+class SmfStream(SmfReader):
+    """ Reader of Adabas SMF records from a sequential stream, e.g. a
+        compressed SMF archive or a pipe
+
+    :param fname: file name or binary file object
+    :param bdw: 1 if blocks have a block descriptor word (BDW),
+                0 if not, None detects this from the first record
+    :param filter: SmfFilter selecting the records yielded
+    :param chunksize: bytes per read from the stream
+    :param readahead: maximum number of chunks read ahead
+
+    gzip, bz2 and xz compressed data is detected and decompressed.
+    A thread reads and decompresses the stream into a queue of at
+    most readahead chunks while the records are parsed. The records
+    refer to the chunk they were read from and remain valid.
+
+    :ivar nbytes: number of (decompressed) bytes of complete records
+    :ivar compression: 'gzip', 'bz2', 'xz' or None
+    """
+    def __init__(self, fname, bdw=None, filter=None, chunksize=1 << 20,
+                 readahead=8):
+        self.fname = fname if isinstance(fname, str) else \
+            getattr(fname, 'name', '<stream>')
+        self.filter = filter
+        self.bdw = bdw
+        self.chunksize = chunksize
+        if isinstance(fname, str):
+            raw = open(fname, 'rb')
+        else:
+            raw = fname
+        if not hasattr(raw, 'peek'):
+            raw = io.BufferedReader(raw)
+        self.raw = raw
+        self.compression = compression(raw.peek(8)[:8])
+        self.file = decompressor(self.compression, raw)
+        self.buffer = b''
+        self.size = 0
+        self.pos = 0
+        self.recno = 0
+        self.nbytes = 0
+        self.stopped = 0
+        self.queue = queue.Queue(max(1, readahead))
+        self.thread = threading.Thread(target=self.readchunks)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def readchunks(self):
+        """ Read chunks into the queue (decompression thread), b'' marks
+            the end, an exception is passed to the reader
+        """
+        try:
+            while not self.stopped:
+                data = self.file.read(self.chunksize)
+                if not data:
+                    break
+                self.put(data)
+            self.put(b'')
+        except Exception as e:
+            self.put(e)
+
+    def put(self, item):
+        while not self.stopped:
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def records(self):
+        """ Generator of SmfRecord objects selected by the filter """
+        rest = b''
+        while 1:
+            data = self.queue.get()
+            if isinstance(data, Exception):
+                raise data
+            if not data:
+                break
+            buf = self.buffer = rest + data if rest else data
+            self.size = len(buf)
+            if self.bdw is None:
+                self.bdw = detectbdw(buf)
+                if self.bdw is None:
+                    rest = buf          # first block not complete yet
+                    continue
+            self.pos = 0
+            match = self.filter.match if self.filter else None
+            for off, rlen in self.scan():
+                self.recno += 1
+                if match is None or match(buf, off, rlen):
+                    yield SmfRecord(buf, off, rlen, self.recno)
+            self.nbytes += self.pos
+            rest = buf[self.pos:]
+        self.buffer = b''
+
+    def close(self):
+        self.stopped = 1
+        self.thread.join()
+        if self.file is not self.raw:
+            self.file.close()
+        self.raw.close()
+
+
+def smfopen(fname, bdw=None, filter=None, index=None):
+    """ Return SmfStream for a compressed file or a pipe, SmfReader
+        otherwise (index is passed to the SmfReader)
+    """
+    if os.path.isfile(fname):
+        with open(fname, 'rb') as f:
+            head = f.read(8)
+        if not compression(head):
+            return SmfReader(fname, bdw=bdw, filter=filter, index=index)
+    return SmfStream(fname, bdw=bdw, filter=filter)
+
+
+def entryfields(buf, offset, length):
+    """ Return index entry (offset, length, sty, nucx, dbid, interval
+        start, interval end) of the record at offset in buf
+    """
+    sty = STY.unpack_from(buf, offset+STYPOS)[0]
+    ido = TRIPLET.unpack_from(buf, offset+TIDO)[0]
+    if ido < ASBASELN0 or ido + IDLEN > length:
+        return offset, length, sty, 0, 0, 0, 0      # no ID section
+    dbid, nucx = DBID.unpack_from(buf, offset+ido+DBIDPOS)
+    st, ist, iet = IST.unpack_from(buf, offset+ido+STPOS)
+    return offset, length, sty, nucx, dbid, ist, iet
+
+
+class SmfIndex(object):
+    """ Index file of the records of an SMF file
+
+    The index file has a header followed by one fixed length entry
+    per record (see ENTRY) with the offset, length, subtype, nucleus
+    id, dbid and interval start and end of the record. The index is
+    updated incrementally with the records appended to the SMF file,
+    it is built again if the start of the SMF file changed.
+
+    :param fname: SMF file name
+    :param idxname: index file name, default fname+'.idx'
+    :param bdw: see SmfReader
+
+    Example::
+
+        >>> idx = SmfIndex('db8.smf')
+        >>> idx.update()
+        1200341
+        >>> sel = SmfFilter(nucx=12, start='2023-03-01 14:00',
+        ...                 end='2023-03-01 15:00')
+        >>> with SmfReader('db8.smf', filter=sel, index=idx) as smf:
+        ...     for rec in smf:
+        ...         print(rec.recno, rec.jbn)
+    """
+    MAGIC = b'ASMFIDX1'
+    HEADER = struct.Struct('<8sQQLLB7x')    # magic, pos, count, crclen, crc, bdw
+    ENTRY = struct.Struct('<QLHHLQQ')
+    CRCLEN = 4096           # length of file start checked
+
+    NOBDW = 255             # header bdw not detected yet
+
+    def __init__(self, fname, idxname=None, bdw=None):
+        self.fname = fname
+        self.idxname = idxname or fname + '.idx'
+        self.bdwarg = bdw
+        self.bdw = bdw
+        self.pos = 0        # SMF file position after the last record indexed
+        self.count = 0      # number of entries
+        self.crclen = 0
+        self.crc = 0
+        if os.path.exists(self.idxname):
+            with open(self.idxname, 'rb') as f:
+                head = f.read(self.HEADER.size)
+            if len(head) == self.HEADER.size:
+                magic, pos, count, crclen, crc, ibdw = self.HEADER.unpack(head)
+                if ibdw == self.NOBDW:
+                    ibdw = None
+                if magic == self.MAGIC and (bdw is None or bdw == ibdw):
+                    self.pos, self.count = pos, count
+                    self.crclen, self.crc, self.bdw = crclen, crc, ibdw
+
+    def __len__(self):
+        return self.count
+
+    def update(self):
+        """ Add the entries of records appended to the SMF file since the
+            last update, return number of entries added
+        """
+        with SmfReader(self.fname, bdw=self.bdwarg) as smf:
+            buf = smf.buffer
+            if self.count and (smf.size < self.pos or zlib.crc32(
+                    buf[:self.crclen]) & 0xffffffff != self.crc or
+                    smf.bdw != self.bdw):
+                self.pos = self.count = self.crclen = 0   # file replaced
+            if not self.count:
+                self.crclen = min(smf.size, self.CRCLEN)
+                self.crc = zlib.crc32(buf[:self.crclen]) & 0xffffffff
+            self.bdw = smf.bdw
+            pack = self.ENTRY.pack
+            entries = []
+            smf.pos = self.pos
+            for off, rlen in smf.scan(self.pos):
+                entries.append(pack(*entryfields(buf, off, rlen)))
+            mode = 'r+b' if self.count and os.path.exists(self.idxname) \
+                else 'wb'
+            with open(self.idxname, mode) as f:
+                f.seek(self.HEADER.size + self.count*self.ENTRY.size)
+                f.write(b''.join(entries))
+                f.truncate()
+                f.flush()
+                self.pos = smf.pos
+                self.count += len(entries)
+                f.seek(0)
+                f.write(self.HEADER.pack(self.MAGIC, self.pos, self.count,
+                    self.crclen, self.crc,
+                    self.NOBDW if self.bdw is None else self.bdw))
+        return len(entries)
+
+    def entries(self):
+        """ Generator of (record number, entry) of all entries """
+        with open(self.idxname, 'rb') as f:
+            f.seek(self.HEADER.size)
+            data = f.read(self.count*self.ENTRY.size)
+        n = len(data) // self.ENTRY.size
+        return enumerate(self.ENTRY.iter_unpack(data[:n*self.ENTRY.size]), 1)
+
+    def find(self, filter=None, buf=None):
+        """ Return list of (record number, offset, length) of the records
+            selected by filter
+
+        :param buf: buffer with the SMF file for the filter fields not in
+                    the index entries
+        """
+        if filter is None:
+            return [(recno, e[0], e[1]) for recno, e in self.entries()]
+        match = filter.matchentry
+        return [(recno, e[0], e[1]) for recno, e in self.entries()
+                if match(e, buf)]
+
+
+def checklen(rlen, offset):
+    """ Return record length rlen or raise SmfError if too short """
+    if rlen < ASBASELN0:
+        raise SmfError('Record at offset %d has invalid record length %d '
+            '(shorter than %d)' % (offset, rlen, ASBASELN0))
+    return rlen
+
+
+def detectbdw(buf, rty=ADARTY):
+    """ Return 1 if the data in buf starts with a BDW, 0 if with an RDW,
+        None if buf is too short to tell
+
+    With a BDW the RDWs of the first block must add up exactly to the
+    block length and byte 9 (after BDW and RDW) is the record type,
+    without a BDW byte 5 (after the RDW) is the record type.
+
+    :param rty: SMF record type of the first record
+    """
+    size = len(buf)
+    if size < 10:
+        return None
+    rtyb = bytearray(buf[:10])
+    if rtyb[9] == rty:
+        blen = HW.unpack_from(buf, 0)[0]
+        if blen > size:
+            return None         # first block or record not complete
+        if blen >= 8:
+            rpos = 4
+            while rpos + 4 <= blen:
+                rlen = HW.unpack_from(buf, rpos)[0]
+                if rlen < ASBASELN0:
+                    break
+                rpos += rlen
+            if rpos == blen:
+                return 1
+    if rtyb[5] == rty:
+        return 0
+    raise SmfError('Data does not start with an SMF record of type %d '
+        'with or without BDW, specify bdw' % rty)
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
@@ -0,0 +1,247 @@
+"""adapya.adabas.smfcluster - Analysis of SMF cluster cache and lock sections
+=========================================================================
+
+analyze() evaluates the sections of Adabas cluster nuclei (Parallel
+Services) over many intervals. The counters are turned into deltas
+and rates per interval with adapya.adabas.smfdelta and per section
+the following columns are added:
+
+- CHP: 'dirused' directory elements in use / allocated,
+  'latchwait' latch waits / latch gets
+- CHB, CHF: 'hit' reads with data in cache / reads completed,
+  'miss' reads with data not in cache / reads, 'vfail' failed
+  validates / validates, 'wfail' data not written / writes
+- LOK (one element per lock type, see Aslok.ASCLOK_str()):
+  'wait' asynchronous (waiting) / all obtains, 'reject' rejected /
+  conditional obtains
+- MSGB: 'used' high water mark / allocated control blocks
+- MSGH (one element per transport service): 'avg' average message
+  duration, 'p50', 'p90', 'p99' percentiles in microseconds
+  estimated from the duration histogram
+
+Each Analysis object has in addition a summary of the interval
+(attribute summary) with the totals over the elements, see SUMMARY.
+Summary values lying more than threshold robust standard deviations
+(median absolute deviation) from the median of all intervals of the
+nucleus are listed in the attribute outliers.
+
+The Analysis objects are intervals with computed columns: they can be
+appended to an SmfStore with the cluster sections::
+
+    >>> from adapya.adabas.smf import CHB, CHF, LOK, MSGH, SmfFilter
+    >>> from adapya.adabas.smfingest import ingest
+    >>> from adapya.adabas.smfcluster import analyze, CLUSTER, report
+    >>> from adapya.adabas.smfstore import SmfStore
+    >>> result = analyze(ingest(['db8.smf'], sections=CLUSTER).intervals)
+    >>> report(result)
+    >>> SmfStore('cluster', sections=CLUSTER).append(result)
+
+"""
+from __future__ import print_function          # PY3
+
+import sys
+
+from adapya.adabas.smf import CHP, CHG, CHB, CHF, LOK, MSGB, MSGC, MSGH
+from adapya.adabas.smfdelta import deltas, columns, Delta
+
+CLUSTER = (CHP, CHG, CHB, CHF, LOK, MSGB, MSGC, MSGH)
+
+# histogram bucket fields with lower and upper duration in microseconds
+BUCKETS = (('msgh02', 0., 1e2), ('msgh03', 1e2, 1e3), ('msgh04', 1e3, 1e4),
+    ('msgh05', 1e4, 1e5), ('msgh06', 1e5, 1e6), ('msgh07', 1e6, 1e7),
+    ('msgh08', 1e7, 1e8), ('msgh09', 1e8, 1e9), ('msgh10', 1e9, 1e10))
+
+PERCENTILES = (('p50', 0.5), ('p90', 0.9), ('p99', 0.99))
+
+# summary values of an interval
+SUMMARY = ('hit', 'vfail', 'lockwait', 'lockrate', 'msgrate', 'msgp99')
+
+# latch get and wait fields of CHP
+LATCHGETS = ('cpspge', 'cpdige', 'cpdigs', 'cpdiue', 'cpdrge', 'cpdrgs',
+             'cpdrue', 'cpcoge', 'cpcogs')
+LATCHWAITS = ('cpspwf', 'cpdiwe', 'cpdiws', 'cpdiwu', 'cpdrwe', 'cpdrws',
+              'cpcowe', 'cpcows')
+
+
+class Analysis(Delta):
+    """ Deltas and ratios of the cluster sections of an interval
+
+    :ivar summary: dictionary of SUMMARY names to values
+    :ivar outliers: list of (name, value, score) of outlying summary
+                    values
+    """
+    def __init__(self, d):
+        Delta.__init__(self, d)
+        self.seconds = d.seconds
+        self.restart = d.restart
+        self.resets = d.resets
+        self.sections = d.sections
+        self.names = d.names
+        self.summary = {}
+        self.outliers = []
+
+
+def colsum(ops, cols, names):
+    """ Return elementwise sum of the columns names """
+    total = cols[names[0]]
+    for name in names[1:]:
+        total = ops.add(total, cols[name])
+    return total
+
+
+def percentile(counts, p, hi=None):
+    """ Return duration in microseconds at fraction p of the histogram
+        counts per bucket (see BUCKETS), interpolated logarithmically
+
+    :param hi: maximum duration, upper limit of the last bucket
+    """
+    total = sum(counts)
+    if not total:
+        return 0.
+    want = p*total
+    acc = 0
+    for (name, lo, up), n in zip(BUCKETS, counts):
+        if n and acc + n >= want:
+            if hi and hi > lo:
+                up = min(up, hi)
+            frac = (want-acc)/float(n)
+            if lo <= 0:
+                return up*frac
+            return lo * (up/lo)**frac
+        acc += n
+    return BUCKETS[-1][2]
+
+
+def addratios(a, ops):
+    """ Add ratio columns to the sections of Analysis a """
+    def add(index, name, col):
+        a.sections[index][name] = col
+        a.names[index].append(name)
+
+    persec = 1./a.seconds if a.seconds > 0 else 0.
+    s = a.summary
+    for index, pre in ((CHB, 'cb'), (CHF, 'cf')):
+        cols = a.sections.get(index)
+        if not cols:
+            continue
+        done = colsum(ops, cols, (pre+'ric', pre+'rni'))
+        add(index, 'hit', ops.ratio(cols[pre+'ric'], done))
+        add(index, 'miss', ops.ratio(cols[pre+'rni'], cols[pre+'rt']))
+        add(index, 'vfail', ops.ratio(cols[pre+'vf'], cols[pre+'vi']))
+        add(index, 'wfail', ops.ratio(cols[pre+'wnr'], cols[pre+'wt']))
+        if index == CHB:
+            ric, reads = sum(cols['cbric']), sum(done)
+            s['hit'] = ric/float(reads) if reads else 0.
+            vi = sum(cols['cbvi'])
+            s['vfail'] = sum(cols['cbvf'])/float(vi) if vi else 0.
+
+    cols = a.sections.get(CHP)
+    if cols:
+        add(CHP, 'dirused', ops.ratio(cols['cpdiri'], cols['cpndir']))
+        add(CHP, 'latchwait', ops.ratio(colsum(ops, cols, LATCHWAITS),
+                                        colsum(ops, cols, LATCHGETS)))
+
+    cols = a.sections.get(LOK)
+    if cols:
+        obtains = colsum(ops, cols, ('lokos', 'lokoa'))
+        add(LOK, 'wait', ops.ratio(cols['lokoa'], obtains))
+        add(LOK, 'reject', ops.ratio(cols['lokor'], cols['lokoc']))
+        waits, total = sum(cols['lokoa']), sum(obtains)
+        s['lockwait'] = waits/float(total) if total else 0.
+        s['lockrate'] = waits*persec
+
+    cols = a.sections.get(MSGB)
+    if cols:
+        add(MSGB, 'used', ops.ratio(cols['msgbbh'], cols['msgbba']))
+
+    cols = a.sections.get(MSGH)
+    if cols:
+        add(MSGH, 'avg', ops.ratio(cols['msghmd'], cols['msghmc']))
+        buckets = [cols[name] for name, lo, up in BUCKETS]
+        rows = list(zip(*buckets))
+        for name, p in PERCENTILES:
+            add(MSGH, name, ops.floats([percentile(row, p, hi)
+                for row, hi in zip(rows, cols['msghmx'])]))
+        s['msgrate'] = sum(cols['msghmc'])*persec
+        s['msgp99'] = percentile([sum(b) for b in buckets], 0.99,
+                                 max(cols['msghmx']) if len(rows) else 0)
+
+
+def median(values):
+    v = sorted(values)
+    n = len(v)
+    if not n:
+        return 0.
+    return v[n//2] if n % 2 else (v[n//2-1]+v[n//2])/2.
+
+
+def flagoutliers(results, threshold):
+    """ Set outliers of the Analysis objects of one nucleus """
+    for name in SUMMARY:
+        values = [a.summary[name] for a in results if name in a.summary]
+        if len(values) < 3:
+            continue
+        med = median(values)
+        mad = 1.4826*median([abs(v-med) for v in values])
+        if mad == 0.:
+            mad = abs(med)*0.01 or 1e-9
+        for a in results:
+            v = a.summary.get(name)
+            if v is None:
+                continue
+            score = (v-med)/mad
+            if abs(score) > threshold:
+                a.outliers.append((name, v, score))
+
+
+def analyze(intervals, cumulative=1, threshold=3.5, usenumpy=None):
+    """ Return list of Analysis objects of the cluster sections of the
+        intervals sorted by dbid, nucleus id and interval start
+
+    :param intervals: Interval objects with the cluster sections, e.g.
+                      ingest(fnames, sections=CLUSTER).intervals
+    :param cumulative: 1 if the counters are totals since nucleus start,
+                       0 if per interval (see smfdelta.deltas())
+    :param threshold: robust z-score above which a summary value is an
+                      outlier
+    :param usenumpy: see smfdelta.deltas()
+    """
+    ops = columns(usenumpy)
+    results = [Analysis(d) for d in deltas(intervals, CLUSTER, cumulative,
+                                           usenumpy)]
+    for a in results:
+        addratios(a, ops)
+    results.sort(key=lambda a: (a.dbid, a.nucx, a.ist))
+    nuclei = {}
+    for a in results:
+        nuclei.setdefault((a.dbid, a.nucx), []).append(a)
+    for group in nuclei.values():
+        flagoutliers(group, threshold)
+    return results
+
+
+def report(results, file=None):
+    """ Print table of the interval summaries with outliers marked '*' """
+    f = file or sys.stdout
+    print(' dbid nucx  interval start                seconds' +
+        ''.join(' %10s' % name for name in SUMMARY), file=f)
+    for a in results:
+        flagged = set(name for name, v, score in a.outliers)
+        print('%5d %4d  %-28s %7.0f' % (a.dbid, a.nucx, a.start, a.seconds) +
+            ''.join(' %9.4g%s' % (a.summary[name], '*' if name in flagged
+                    else ' ') if name in a.summary else ' %10s' % '-'
+                    for name in SUMMARY), file=f)
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
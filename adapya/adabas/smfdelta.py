@@ -0,0 +1,278 @@
+"""adapya.adabas.smfdelta - Deltas and rates of SMF interval counters
+=================================================================
+
+deltas() turns the counters of the thread, file, command and I/O by
+DD sections of consecutive SMF intervals into deltas, per second rates
+and utilization:
+
+- intervals of the same nucleus session are matched by dbid, external
+  nucleus id, record subtype and nucleus start (Aspid.st) and sorted
+  by interval start
+- the delta of a counter is its value minus the value of the previous
+  interval of the session, a counter lower than before was reset and
+  its value is taken as delta
+- the first interval of a nucleus session (after a nucleus restart or
+  the first of the data) counts from the nucleus start
+- thread and file elements are matched by position, command and DD
+  elements by name (see KEYS), key fields and the fields in GAUGES are
+  not differenced
+
+The computations run on whole columns: with NumPy installed the
+columns are NumPy arrays, otherwise array.array columns computed with
+list comprehensions.
+
+Per section the Delta objects have the delta of each counter, the
+rate per second as <name>_rate and:
+
+- THRD, FILE: 'share' of the commands of the thread or file
+- CMD: 'avgus' average duration in microseconds and 'util' command
+  time per second (busy fraction, above 1 with parallel commands)
+
+Example::
+
+    >>> from adapya.adabas.smf import CMD, THRD
+    >>> from adapya.adabas.smfingest import ingest
+    >>> from adapya.adabas.smfdelta import deltas
+    >>> for d in deltas(ingest(['db8.smf']).intervals):
+    ...     print(d.start, d.seconds, d.restart, d.resets)
+    ...     for name, rate, util in zip(d.column(CMD, 'cmdnm'),
+    ...             d.column(CMD, 'cmdct_rate'), d.column(CMD, 'util')):
+    ...         print('  %4s %10.1f/sec %5.2f' % (name, rate, util))
+
+Counters of interval records that are not cumulative (reset with each
+interval) are processed with cumulative=0: the values are the deltas
+and the rates are computed over the interval length.
+
+"""
+from __future__ import print_function          # PY3
+
+import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from adapya.adabas.smf import IODD, THRD, FILE, CMD, CHP, CHB, CHF, MSGB, \
+    MSGC, MSGH
+from adapya.adabas.smfingest import Interval
+
+STCKSEC = 4096e6        # STCK units per second
+STCKUS = 4096.          # STCK units per microsecond
+
+# name field of sections with elements matched by name
+KEYS = {CMD: 'cmdnm', IODD: 'ioddnm', CHB: 'cbbt', CHF: 'cfnum',
+        MSGC: 'msgcmt', MSGH: 'msghxp'}
+
+# fields that are not counters: their values are taken as they are
+GAUGES = {
+    CHP: ('cpcn', 'cpndir', 'cpndii', 'cpdhin', 'cpdiri'),
+    CHB: ('cbcn',),
+    CHF: ('cfcn',),
+    MSGB: ('msgbba', 'msgbbh'),
+    MSGH: ('msghmm', 'msghmn', 'msghmx'),
+    }
+
+
+class Delta(Interval):
+    """ Deltas and rates of one interval, sections hold the computed
+        columns (see Interval)
+
+    :ivar seconds: seconds the deltas were counted in
+    :ivar restart: 1 if first interval of the nucleus session
+    :ivar resets: number of counters found reset
+    """
+    def __init__(self, iv):
+        Interval.__init__(self, iv.key, iv.sty, iv.jbn, iv.sid, iv.smfv)
+        self.seconds = 0.
+        self.restart = 0
+        self.resets = 0
+
+
+class Columns(object):
+    """ Column operations on array.array columns """
+    def asarray(self, col):
+        return col
+
+    def take(self, col, idx):
+        """ Return col reordered by list of indexes, -1 gives 0 """
+        return array.array(col.typecode, [col[i] if i >= 0 else 0 for i in idx])
+
+    def delta(self, cur, prev):
+        """ Return (deltas, number of resets) """
+        d = array.array(cur.typecode, [c-p if c >= p else c
+                                       for c, p in zip(cur, prev)])
+        return d, sum(1 for c, p in zip(cur, prev) if c < p)
+
+    def add(self, col1, col2):
+        return array.array(col1.typecode, [a+b for a, b in zip(col1, col2)])
+
+    def floats(self, values):
+        return array.array('d', values)
+
+    def scale(self, col, factor):
+        return array.array('d', [x*factor for x in col])
+
+    def ratio(self, num, den, factor=1.):
+        """ Return num/den*factor, 0 where den is 0 """
+        return array.array('d', [n*factor/d if d else 0.
+                                 for n, d in zip(num, den)])
+
+    def share(self, col):
+        total = sum(col)
+        return self.scale(col, 1./total if total else 0.)
+
+
+class NumpyColumns(Columns):
+    """ Column operations on NumPy arrays """
+    def asarray(self, col):
+        if isinstance(col, array.array):
+            return numpy.frombuffer(col, dtype=col.typecode)
+        return numpy.asarray(col)
+
+    def take(self, col, idx):
+        return numpy.append(col, col.dtype.type(0))[numpy.asarray(idx, dtype=int)]
+
+    def delta(self, cur, prev):
+        reset = cur < prev
+        return numpy.where(reset, cur, cur-prev), int(numpy.count_nonzero(reset))
+
+    def add(self, col1, col2):
+        return col1 + col2
+
+    def floats(self, values):
+        return numpy.array(values, dtype=float)
+
+    def scale(self, col, factor):
+        return col * float(factor)
+
+    def ratio(self, num, den, factor=1.):
+        out = numpy.zeros(len(num))
+        return numpy.divide(num*float(factor), den, out=out, where=den != 0)
+
+    def share(self, col):
+        total = col.sum()
+        return self.scale(col, 1./total if total else 0.)
+
+
+def columns(usenumpy=None):
+    """ Return column operations, NumPy if usenumpy is true or None and
+        NumPy is installed
+    """
+    if usenumpy or usenumpy is None and numpy is not None:
+        if numpy is None:
+            raise ImportError('NumPy is not installed')
+        return NumpyColumns()
+    return Columns()
+
+
+def sessions(intervals):
+    """ Return list of lists of the intervals of each nucleus session
+        sorted by interval start
+    """
+    groups = {}
+    for iv in intervals:
+        groups.setdefault((iv.dbid, iv.nucx, iv.sty, iv.st), []).append(iv)
+    return [sorted(groups[k], key=lambda iv: iv.ist) for k in sorted(groups)]
+
+
+def positions(index, cols, prevcols):
+    """ Return list of indexes of the elements of cols in prevcols, -1
+        if not present, or None if the elements are at the same positions
+    """
+    names = KEYS.get(index)
+    if names:
+        cur, prev = cols[names], prevcols[names]
+        if list(cur) == list(prev):
+            return None
+        pos = dict((k, i) for i, k in enumerate(prev))
+        return [pos.get(k, -1) for k in cur]
+    n = len(cols[next(iter(cols))]) if cols else 0
+    m = len(prevcols[next(iter(prevcols))]) if prevcols else 0
+    if n == m:
+        return None
+    return [i if i < m else -1 for i in range(n)]
+
+
+def deltas(intervals, sections=(THRD, FILE, CMD, IODD), cumulative=1,
+           usenumpy=None):
+    """ Return list of Delta objects of the intervals
+
+    :param intervals: Interval objects, e.g. ingest().intervals
+    :param sections: section indexes to compute
+    :param cumulative: 1 if the counters are totals since nucleus start,
+                       0 if per interval
+    :param usenumpy: None uses NumPy if installed, 1 requires it,
+                     0 computes with array.array
+    """
+    ops = columns(usenumpy)
+    result = []
+    for session in sessions(intervals):
+        prev = None
+        for iv in session:
+            d = Delta(iv)
+            if not cumulative:
+                d.seconds = (iv.iet - iv.ist) / STCKSEC
+            elif prev is None:
+                d.restart = 1
+                d.seconds = (iv.iet - iv.st) / STCKSEC
+            else:
+                d.seconds = (iv.iet - prev.iet) / STCKSEC
+            persec = 1./d.seconds if d.seconds > 0 else 0.
+            for index in sections:
+                cols = iv.sections.get(index)
+                if not cols:
+                    continue
+                pcols = prev.sections.get(index) if cumulative and prev else None
+                idx = positions(index, cols, pcols) if pcols else None
+                out = {}
+                names = []
+                gauges = GAUGES.get(index, ()) + (KEYS.get(index),)
+                for name in iv.names[index]:
+                    col = cols[name]
+                    if not isinstance(col, array.array):
+                        out[name] = col             # text column
+                        names.append(name)
+                        continue
+                    cur = ops.asarray(col)
+                    if name in gauges:
+                        out[name] = cur
+                        names.append(name)
+                        continue
+                    if pcols and name in pcols:
+                        p = ops.asarray(pcols[name])
+                        if idx is not None:
+                            p = ops.take(p, idx)
+                        delta, resets = ops.delta(cur, p)
+                        d.resets += resets
+                    else:
+                        delta = cur
+                    out[name] = delta
+                    out[name+'_rate'] = ops.scale(delta, persec)
+                    names += [name, name+'_rate']
+                if index in (THRD, FILE):
+                    out['share'] = ops.share(out[iv.names[index][0]])
+                    names.append('share')
+                elif index == CMD:
+                    out['avgus'] = ops.ratio(out['cmdtm'], out['cmdct'], 1./STCKUS)
+                    out['util'] = ops.scale(out['cmdtm'], persec/STCKSEC)
+                    names += ['avgus', 'util']
+                d.sections[index] = out
+                d.names[index] = names
+            result.append(d)
+            prev = iv
+    return result
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
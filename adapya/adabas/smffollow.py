@@ -0,0 +1,296 @@
+"""adapya.adabas.smffollow - Follow a growing SMF file
+===================================================
+
+SmfFollower processes the SMF records appended to a local file, e.g.
+a dump file written by a monitor, like 'tail -f':
+
+- each poll maps the file and reads the records after the position
+  of the last complete record, a partial record at the end is read
+  when it is complete
+- the position is saved in a checkpoint file after each poll so that
+  a restarted follower continues after the last record processed,
+  with deltas=1 the last interval of each nucleus and the segments of
+  incomplete intervals are saved as well (checkpoint file + '.iv') so
+  that the first Delta after a restart is computed from the previous
+  interval
+- a truncated or replaced file is read again from the start
+- between polls the follower waits for a change of the file with
+  inotify (Linux) or by polling every interval seconds
+
+The records are passed to a callback function or put into a queue.
+With deltas=1 the records are combined to intervals (see
+adapya.adabas.smfingest.Interval) and the Delta objects of each
+interval (see adapya.adabas.smfdelta) are passed instead.
+
+Example::
+
+    >>> from adapya.adabas.asmfrec import ASSTS
+    >>> from adapya.adabas.smf import SmfFilter, CMD
+    >>> from adapya.adabas.smffollow import SmfFollower
+    >>> def show(d):
+    ...     print(d.start, dict(zip(d.column(CMD, 'cmdnm'),
+    ...                             d.column(CMD, 'cmdct_rate'))))
+    >>> f = SmfFollower('db8.smf', checkpoint='db8.smf.ckp',
+    ...                 filter=SmfFilter(sty=ASSTS))
+    >>> f.follow(callback=show, deltas=1)
+
+A record passed to the callback refers to the mapped file and is only
+valid during the call, records put into a queue hold a copy.
+
+"""
+from __future__ import print_function          # PY3
+
+import ctypes
+import ctypes.util
+import os
+import pickle
+import select
+import time
+
+from adapya.adabas.smf import SmfReader, SmfRecord, \
+    IODD, THRD, FILE, CMD
+from adapya.adabas.smfingest import Interval
+from adapya.adabas.smfdelta import deltas as _deltas
+
+# inotify events
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVE_SELF = 0x800
+IN_DELETE_SELF = 0x400
+IN_NONBLOCK = 0o4000
+
+
+class Inotify(object):
+    """ Wait for changes of a file with Linux inotify
+
+    Raises OSError if inotify is not available.
+    """
+    def __init__(self, fname):
+        libname = ctypes.util.find_library('c')
+        libc = ctypes.CDLL(libname, use_errno=True) if libname else None
+        if not libc or not hasattr(libc, 'inotify_init1'):
+            raise OSError('inotify not available')
+        self.fd = libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        wd = libc.inotify_add_watch(self.fd, fname.encode(), IN_MODIFY |
+            IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVE_SELF | IN_DELETE_SELF)
+        if wd < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch failed')
+
+    def wait(self, timeout):
+        """ Wait up to timeout seconds for a change, return true if
+            the file changed
+        """
+        r, w, x = select.select([self.fd], [], [], timeout)
+        if not r:
+            return 0
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except OSError:         # EAGAIN: all events read
+            pass
+        return 1
+
+    def close(self):
+        os.close(self.fd)
+
+
+class SmfFollower(object):
+    """ Follow SMF records appended to a file
+
+    :param fname: file name, the file need not exist yet
+    :param bdw: 1 file with block descriptor words, 0 without, None
+                detects it from the first record
+    :param checkpoint: name of the checkpoint file, None: no checkpoint
+    :param interval: seconds between polls without inotify and maximum
+                     wait time with inotify
+    :param filter: SmfFilter selecting the records
+    :param useinotify: 0 to poll even if inotify is available
+
+    :ivar pos: file position after the last complete record read
+    :ivar recno: number of records read from the file
+    """
+    def __init__(self, fname, bdw=None, checkpoint=None, interval=1.0,
+                 filter=None, useinotify=1):
+        self.fname = fname
+        self.bdwarg = bdw
+        self.bdw = bdw
+        self.checkpoint = checkpoint
+        self.interval = interval
+        self.filter = filter
+        self.useinotify = useinotify
+        self.pos = 0
+        self.recno = 0
+        self.inode = None
+        self.notify = None
+        self.stopped = 0
+        self.sections = (IODD, THRD, FILE, CMD)
+        self.pending = {}       # interval key: Interval of segments read
+        self.last = {}          # (dbid, nucx, sty): last complete Interval
+        if checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                fields = f.read().split()
+            self.pos, self.recno, self.inode = [int(x) for x in fields[:3]]
+            if os.path.exists(checkpoint+'.iv'):
+                with open(checkpoint+'.iv', 'rb') as f:
+                    self.pending, self.last = pickle.load(f)
+
+    def savecheckpoint(self):
+        """ Write position to checkpoint file """
+        if not self.checkpoint:
+            return
+        if self.pending or self.last:
+            # intervals for deltas, written before the position
+            tmp = self.checkpoint + '.iv.tmp'
+            with open(tmp, 'wb') as f:
+                pickle.dump((self.pending, self.last), f, 2)
+            os.replace(tmp, self.checkpoint + '.iv')
+        tmp = self.checkpoint + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write('%d %d %d\n' % (self.pos, self.recno, self.inode or 0))
+        os.replace(tmp, self.checkpoint)
+
+    def poll(self, callback):
+        """ Call callback with each SmfRecord appended since the last
+            poll, return number of records read
+        """
+        try:
+            st = os.stat(self.fname)
+        except OSError:
+            return 0                # file does not exist yet
+        if st.st_ino != self.inode or st.st_size < self.pos:
+            if self.inode is not None or st.st_size < self.pos:
+                self.pending = {}   # replaced or truncated file
+                self.bdw = self.bdwarg
+            self.inode = st.st_ino
+            self.pos = self.recno = 0
+        if st.st_size - self.pos < 8:
+            return 0
+        n = 0
+        with SmfReader(self.fname, bdw=self.bdw) as smf:
+            if smf.bdw is None:
+                return 0            # first block not complete yet
+            self.bdw = smf.bdw
+            buf = smf.buffer
+            match = self.filter.match if self.filter else None
+            smf.pos = self.pos
+            try:
+                for off, rlen in smf.scan(self.pos):
+                    self.recno += 1
+                    n += 1
+                    if match is None or match(buf, off, rlen):
+                        callback(SmfRecord(buf, off, rlen, self.recno))
+            finally:
+                self.pos = smf.pos
+                self.savecheckpoint()
+        return n
+
+    def wait(self, timeout=None):
+        """ Wait for a change of the file or timeout seconds
+            (default interval)
+        """
+        timeout = self.interval if timeout is None else timeout
+        if self.notify is None and self.useinotify and os.path.exists(self.fname):
+            try:
+                self.notify = Inotify(self.fname)
+            except OSError:
+                self.useinotify = 0
+        if self.notify:
+            if not self.notify.wait(timeout):
+                return
+            ino = os.stat(self.fname).st_ino if os.path.exists(self.fname) \
+                else None
+            if ino != self.inode:   # file replaced: watch new file
+                self.notify.close()
+                self.notify = None
+        else:
+            time.sleep(timeout)
+
+    def intervals(self, rec):
+        """ Return list of Delta objects of the interval completed by
+            record rec
+        """
+        iv = Interval.fromrecord(rec, self.sections)
+        piv = self.pending.pop(iv.key, None)
+        if piv is not None:         # append to previous segments
+            for index, cols in iv.sections.items():
+                if index in piv.sections:
+                    for name, col in cols.items():
+                        piv.sections[index][name] += col
+                else:
+                    piv.sections[index] = cols
+                    piv.names[index] = iv.names[index]
+            iv = piv
+        if not rec.lastsegment:
+            self.pending[iv.key] = iv
+            return []
+        session = (iv.dbid, iv.nucx, iv.sty)
+        prev = self.last.get(session)
+        self.last[session] = iv
+        if prev is not None and prev.st == iv.st and prev.ist < iv.ist:
+            return _deltas([prev, iv], self.sections)[-1:]
+        return _deltas([iv], self.sections)
+
+    def follow(self, callback=None, queue=None, deltas=0, maxidle=None):
+        """ Process appended records until stop() is called or no
+            records were appended for maxidle seconds
+
+        :param callback: function called with each SmfRecord or Delta
+        :param queue: queue.Queue receiving SmfRecord objects holding
+                      a copy of the record or Delta objects
+        :param deltas: 1 to pass Delta objects of the intervals
+        """
+        def emit(rec):
+            if deltas:
+                items = self.intervals(rec)
+            elif queue is not None:
+                items = [SmfRecord(bytes(rec.data), 0, rec.length, rec.recno)]
+            else:
+                items = [rec]
+            for item in items:
+                if callback:
+                    callback(item)
+                if queue is not None:
+                    queue.put(item)
+
+        self.stopped = 0
+        idle = time.time()
+        try:
+            while not self.stopped:
+                if self.poll(emit):
+                    idle = time.time()
+                elif maxidle is not None and time.time()-idle >= maxidle:
+                    break
+                else:
+                    wait = self.interval
+                    if maxidle is not None:
+                        wait = min(wait, max(0., maxidle-(time.time()-idle)))
+                    self.wait(wait)
+        finally:
+            self.close()
+
+    def stop(self):
+        """ End follow() after the current poll """
+        self.stopped = 1
+
+    def close(self):
+        if self.notify:
+            self.notify.close()
+            self.notify = None
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
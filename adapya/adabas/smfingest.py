@@ -0,0 +1,287 @@
+"""adapya.adabas.smfingest - Parallel ingestion of Adabas SMF files
+===============================================================
+
+ingest() decodes many SMF files in a pool of processes:
+
+- each file is split into chunks at record (or block) boundaries found
+  by scanning the record descriptor words
+- the chunks are decoded in worker processes with the section decoders
+  of adapya.adabas.smf
+- the results are merged into one Interval object per nucleus and
+  interval: records of the same interval from several chunks or files
+  (record segments) are combined, duplicate records are dropped
+
+The intervals are returned sorted by dbid, nucleus id and interval
+start (STCK values from the ID section).
+
+Example::
+
+    >>> import glob
+    >>> from adapya.adabas.smf import THRD, CMD, SmfFilter
+    >>> from adapya.adabas.smfingest import ingest, printprogress
+    >>> from adapya.adabas.asmfrec import ASSTS
+    >>> result = ingest(glob.glob('smf/*.smf'), sections=(THRD, CMD),
+    ...     processes=16, progress=printprogress,
+    ...     filter=SmfFilter(sty=ASSTS, dbid=8))
+    >>> for iv in result.intervals:
+    ...     print(iv.dbid, iv.nucx, iv.start, len(iv.rows(CMD)))
+    >>> print(result.throughput())
+
+"""
+from __future__ import print_function          # PY3
+
+import os
+import sys
+import time
+
+from adapya.base.stck import sstckd
+from adapya.adabas.smf import SmfReader, SmfRecord, SmfError, \
+    IODD, THRD, FILE, CMD
+
+CHUNKSIZE = 1 << 26     # maximum chunk size 64 MB
+
+
+def chunks(fname, chunksize=CHUNKSIZE, bdw=None):
+    """ Return list of (fname, start, end, bdw) with chunks of about
+        chunksize bytes split at record or block boundaries
+    """
+    result = []
+    with SmfReader(fname, bdw=bdw) as smf:
+        start = 0
+        for off, rlen in smf.scan():
+            if smf.pos - start >= chunksize:
+                result.append((fname, start, smf.pos, smf.bdw))
+                start = smf.pos
+        if smf.pos > start:
+            result.append((fname, start, smf.pos, smf.bdw))
+    return result
+
+
+def decodechunk(args):
+    """ Decode the records of a chunk (worker function)
+
+    :param args: tuple of (fname, start, end, bdw, sections, filter)
+                 with SmfFilter or None
+    :returns: tuple of (list of record results, number of records,
+              number of bytes, dictionary of (smfv, index) to field names)
+
+    A record result is a tuple of (key, segment number, sty, jbn, sid,
+    smfv, dictionary of section index to columns), key is the tuple
+    (dbid, nucx, st, ist, iet) of the ID section. The columns are
+    returned by SectionDecoder.columns(): integer columns are arrays
+    which are passed compactly between the processes.
+    """
+    fname, start, end, bdw, sections, filter = args
+    recs = []
+    names = {}
+    n = 0
+    match = filter.match if filter else None
+    with SmfReader(fname, bdw=bdw) as smf:
+        buf = smf.buffer
+        for off, rlen in smf.scan(start, end):
+            n += 1
+            if match and not match(buf, off, rlen):
+                continue
+            rec = SmfRecord(buf, off, rlen, n)
+            try:
+                version = rec.version
+            except SmfError:
+                continue                # record version not supported
+            st, ist, iet = rec.times
+            key = (rec.dbid, rec.nucx, st, ist, iet)
+            cols = {}
+            for index in sections:
+                d = rec.decoder(index)
+                if d:
+                    cols[index] = d.columns(rec.sectionbytes(index))
+                    names[(version.smfv, index)] = d.names
+            recs.append((key, rec.segno, rec.sty, rec.jbn, rec.sid,
+                         version.smfv, cols))
+    return recs, n, end-start, names
+
+
+class Interval(object):
+    """ Decoded sections of one nucleus interval
+
+    :ivar dbid, nucx: database id and external nucleus id
+    :ivar st, ist, iet: STCK of nucleus start, interval start and end
+    :ivar sty: record subtype
+    :ivar jbn, sid: job name and system id
+    :ivar smfv: SMF record version
+    :ivar sections: dictionary of section index to dictionary of field
+                    name to column of values (see SectionDecoder.columns())
+    :ivar names: dictionary of section index to field names
+    """
+    def __init__(self, key, sty, jbn, sid, smfv):
+        self.dbid, self.nucx, self.st, self.ist, self.iet = key
+        self.sty = sty
+        self.jbn = jbn
+        self.sid = sid
+        self.smfv = smfv
+        self.sections = {}
+        self.names = {}
+        self.segments = {}      # segment number: sections of segment
+
+    @classmethod
+    def fromrecord(cls, rec, sections=(IODD, THRD, FILE, CMD)):
+        """ Return Interval with the decoded sections of SmfRecord rec """
+        iv = cls((rec.dbid, rec.nucx) + rec.times, rec.sty, rec.jbn, rec.sid,
+                 rec.smfv)
+        for index in sections:
+            d = rec.decoder(index)
+            if d:
+                iv.sections[index] = d.columns(rec.sectionbytes(index))
+                iv.names[index] = d.names
+        return iv
+
+    @property
+    def key(self):
+        return (self.dbid, self.nucx, self.st, self.ist, self.iet)
+
+    @property
+    def start(self):
+        """ Interval start as string """
+        return sstckd(self.ist)
+
+    def rows(self, index):
+        """ Return list of element tuples of section index """
+        cols = self.sections.get(index)
+        if not cols:
+            return []
+        return list(zip(*[cols[name] for name in self.names[index]]))
+
+    def column(self, index, name):
+        """ Return column of the values of field name in section index """
+        cols = self.sections.get(index)
+        return cols[name] if cols else []
+
+    def __repr__(self):
+        return '<Interval dbid %d nucx %d %s>' % (self.dbid, self.nucx,
+            self.start)
+
+
+class IngestResult(object):
+    """ Result of ingest()
+
+    :ivar intervals: list of Interval sorted by dbid, nucx and
+                     interval start
+    :ivar records: number of records read
+    :ivar decoded: number of records selected and decoded
+    :ivar duplicates: number of duplicate records dropped
+    :ivar bytes: number of bytes read
+    :ivar seconds: elapsed time
+    """
+    def __init__(self):
+        self.intervals = []
+        self.records = 0
+        self.decoded = 0
+        self.duplicates = 0
+        self.bytes = 0
+        self.seconds = 0.
+
+    def throughput(self):
+        """ Return throughput summary string """
+        secs = self.seconds or 1e-9
+        return '%d records %d decoded %d intervals %.1f MB in %.2f sec: ' \
+            '%.0f records/sec %.1f MB/sec' % (self.records, self.decoded,
+            len(self.intervals), self.bytes/1e6, self.seconds,
+            self.records/secs, self.bytes/1e6/secs)
+
+
+def printprogress(done, total, records, seconds, file=None):
+    """ Progress function for ingest() printing one line per call """
+    f = file or sys.stderr
+    secs = seconds or 1e-9
+    print('%5.1f%% %10d records %8.1f MB/sec' % (100.*done/max(total, 1),
+        records, done/1e6/secs), file=f)
+
+
+def ingest(fnames, sections=(IODD, THRD, FILE, CMD), processes=None,
+           chunksize=None, bdw=None, progress=None, filter=None):
+    """ Decode SMF files in parallel, return IngestResult
+
+    :param fnames: list of SMF file names
+    :param sections: section indexes to decode (see adapya.adabas.smf)
+    :param processes: number of worker processes, default is the
+                      number of CPUs, 1 decodes without process pool
+    :param chunksize: maximum bytes per chunk, default splits the data
+                      into 4 chunks per process up to CHUNKSIZE
+    :param bdw: 1 files with BDW, 0 without, None detects per file
+    :param progress: function called with (bytes done, total bytes,
+                     records, seconds) after each chunk
+    :param filter: SmfFilter selecting the records to decode, it is
+                   applied in the workers: its counters are not updated
+    """
+    t0 = time.time()
+    if processes is None:
+        processes = os.cpu_count() if hasattr(os, 'cpu_count') else 1
+    processes = max(1, processes or 1)
+    if chunksize is None:
+        total = sum(os.path.getsize(fn) for fn in fnames)
+        chunksize = max(1 << 20, min(CHUNKSIZE, total // (4*processes) + 1))
+    work = []
+    for fn in fnames:
+        work += [c + (tuple(sections), filter)
+                 for c in chunks(fn, chunksize, bdw=bdw)]
+    total = sum(w[2]-w[1] for w in work)
+
+    result = IngestResult()
+    segments = {}       # (key, sty): Interval
+    names = {}
+    done = 0
+    if processes == 1 or len(work) < 2:
+        results = (decodechunk(w) for w in work)
+        pool = None
+    else:
+        import multiprocessing
+        pool = multiprocessing.Pool(min(processes, len(work)))
+        results = pool.imap_unordered(decodechunk, work)
+    try:
+        for recs, n, nbytes, chunknames in results:
+            names.update(chunknames)
+            for key, segno, sty, jbn, sid, smfv, cols in recs:
+                iv = segments.get((key, sty))
+                if iv is None:
+                    iv = segments[(key, sty)] = Interval(key, sty, jbn, sid, smfv)
+                if segno in iv.segments:
+                    result.duplicates += 1
+                    continue
+                iv.segments[segno] = cols
+            result.records += n
+            result.decoded += len(recs)
+            done += nbytes
+            if progress:
+                progress(done, total, result.records, time.time()-t0)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    for iv in segments.values():
+        for segno in sorted(iv.segments):
+            for index, cols in iv.segments[segno].items():
+                if index in iv.sections:        # append segment columns
+                    for name, col in cols.items():
+                        iv.sections[index][name] += col
+                else:
+                    iv.sections[index] = cols
+                    iv.names[index] = names[(iv.smfv, index)]
+        iv.segments = {}
+    result.intervals = sorted(segments.values(), key=lambda iv: iv.key+(iv.sty,))
+    result.bytes = done
+    result.seconds = time.time()-t0
+    return result
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
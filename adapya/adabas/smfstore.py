@@ -0,0 +1,388 @@
+"""adapya.adabas.smfstore - Columnar store of SMF interval statistics
+=================================================================
+
+SmfStore keeps the decoded sections of SMF interval records in a
+directory with one file per column so that time series of a metric
+can be queried without parsing the SMF data again:
+
+- the interval table (directory 'intervals') has one row per interval
+  with dbid, nucx, nucleus start, interval start and end (STCK) and
+  per section the first row and number of rows in the section table
+- a section table (directory per section, e.g. 'asfile') has one row
+  per section element, the elements of an interval are consecutive
+
+Integer columns are stored as native arrays, text columns with fixed
+width. Columns are read by mapping the file and casting a memoryview,
+so a query only touches the rows it needs. Appending adds rows to the
+end of the files, the interval table is written last: rows of a failed
+append are not referenced and are truncated when the store is opened
+again.
+
+Example::
+
+    >>> from adapya.adabas.smf import FILE, CMD
+    >>> from adapya.adabas.smfingest import ingest
+    >>> from adapya.adabas.smfstore import SmfStore
+    >>> store = SmfStore('smfstore')
+    >>> store.append(ingest(['db8.smf']).intervals)
+    >>> for ist, iet, n in store.series(FILE, 'filect', element=12,
+    ...         start='2023-01-01', end='2024-01-01', dbid=8):
+    ...     print(ist, n)
+    >>> store.series(CMD, 'cmdct', key=('cmdnm', 'L3'))
+
+Times given as strings 'YYYY-MM-DD HH:MM:SS' are local time, numbers
+are seconds since 1970 (time.time()). The returned interval times are
+seconds since 1970.
+"""
+from __future__ import print_function          # PY3
+
+import array
+import json
+import mmap
+import os
+
+from adapya.base.datamap import T_STRING, T_BYTE, T_PACK, T_UNPK, T_UTF8, \
+    T_UTF16, T_CHAR
+from adapya.adabas.smf import SECTIONS, ARRAYTYPES, smfversion, timestck, \
+    stcktime, IODD, THRD, FILE, CMD, SESS
+
+META = 'store.json'
+IVCOLS = (('dbid', 'I'), ('nucx', 'H'), ('sty', 'H'), ('st', 'Q'),
+          ('ist', 'Q'), ('iet', 'Q'))
+TEXTTYPES = (T_STRING, T_UTF8, T_UTF16, T_CHAR)
+
+
+def sectionname(index):
+    """ Return table name of section index, e.g. 'asfile' """
+    return SECTIONS[index].lower()
+
+
+class Column(object):
+    """ Column file of a table
+
+    :param path: file name
+    :param code: array type code or 's' for text
+    :param width: width of text column
+    """
+    def __init__(self, path, code, width=0):
+        self.path = path
+        self.code = code
+        self.width = width
+        self.itemsize = width if code == 's' else array.array(code).itemsize
+        self.view = None        # memoryview of mapped file
+        self.map = None
+
+    def __len__(self):
+        try:
+            return os.path.getsize(self.path) // self.itemsize
+        except OSError:
+            return 0
+
+    def append(self, values):
+        """ Append list or array of values """
+        self.release()
+        if self.code == 's':
+            w = self.width
+            data = b''.join((v if isinstance(v, bytes) else
+                v.encode('latin_1', 'replace'))[:w].ljust(w) for v in values)
+        else:
+            data = (values if isinstance(values, array.array) and
+                values.typecode == self.code else
+                array.array(self.code, values)).tobytes()
+        with open(self.path, 'ab') as f:
+            f.write(data)
+
+    def truncate(self, n):
+        """ Truncate column to n values """
+        self.release()
+        with open(self.path, 'ab') as f:
+            f.truncate(n * self.itemsize)
+
+    def values(self):
+        """ Return memoryview of the column values (bytes of the text
+            values for a text column) """
+        if self.view is None:
+            size = len(self) * self.itemsize
+            if not size:
+                return memoryview(array.array(self.code if self.code != 's'
+                    else 'B'))
+            with open(self.path, 'rb') as f:
+                self.map = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            self.view = memoryview(self.map)
+            if self.code != 's':
+                self.view = self.view.cast(self.code)
+        return self.view
+
+    def __getitem__(self, i):
+        """ Return value i or list of values of slice i """
+        v = self.values()
+        if self.code != 's':
+            return v[i]
+        w = self.width
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(v)//w)
+            return [v[j*w:(j+1)*w].tobytes().decode('latin_1').rstrip(' ')
+                    for j in range(start, stop, step)]
+        return v[i*w:(i+1)*w].tobytes().decode('latin_1').rstrip(' ')
+
+    def release(self):
+        """ Unmap the column file """
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+            self.map.close()
+            self.map = None
+
+
+class Table(object):
+    """ Table of columns in a directory
+
+    :param path: directory name
+    :param columns: list of (name, code, width)
+    """
+    def __init__(self, path, columns=()):
+        self.path = path
+        self.columns = {}
+        self.names = []
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for name, code, width in columns:
+            self.addcolumn(name, code, width)
+
+    def addcolumn(self, name, code, width=0, rows=None):
+        """ Add column, with rows the column is truncated or filled
+            with 0 or blanks to rows values
+        """
+        col = self.columns[name] = Column(os.path.join(self.path, name+'.col'),
+            code, width)
+        self.names.append(name)
+        if rows is not None and len(col) > rows:
+            col.truncate(rows)      # left by an interrupted append
+        if rows and len(col) < rows:
+            n = rows - len(col)
+            col.append([b''] * n if code == 's' else
+                array.array(code, bytes(array.array(code).itemsize*n)))
+        return col
+
+    def __len__(self):
+        return min(len(c) for c in self.columns.values()) if self.columns else 0
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def schema(self):
+        return [(name, self.columns[name].code, self.columns[name].width)
+                for name in self.names]
+
+    def release(self):
+        for c in self.columns.values():
+            c.release()
+
+
+class SmfStore(object):
+    """ Columnar store of SMF interval statistics in directory path
+
+    :param path: directory of the store, created if it does not exist
+    :param sections: section indexes stored for a new store
+    """
+    def __init__(self, path, sections=(IODD, THRD, FILE, CMD, SESS)):
+        self.path = path
+        metaname = os.path.join(path, META)
+        if os.path.exists(metaname):
+            with open(metaname) as f:
+                meta = json.load(f)
+            self.sections = meta['sections']
+            schemas = meta['schemas']
+        else:
+            self.sections = list(sections)
+            schemas = {}
+        self.tables = {}
+        ivcols = [(name, code, 0) for name, code in IVCOLS]
+        for index in self.sections:
+            sn = sectionname(index)
+            ivcols += [(sn+'_first', 'Q', 0), (sn+'_count', 'I', 0)]
+            self.tables[index] = Table(os.path.join(path, sn),
+                schemas.get(sn, ()))
+        self.iv = Table(os.path.join(path, 'intervals'), ivcols)
+        self.savemeta()
+        # truncate columns of an interrupted append
+        n = len(self.iv)
+        for col in self.iv.columns.values():
+            if len(col) > n:
+                col.truncate(n)
+        for index in self.sections:
+            sn = sectionname(index)
+            firsts, counts = self.iv[sn+'_first'], self.iv[sn+'_count']
+            end = max([firsts[i]+counts[i] for i in range(n)] or [0])
+            for col in self.tables[index].columns.values():
+                if len(col) > end:
+                    col.truncate(end)
+        self.keys = set(self.ivkey(i) for i in range(n))
+
+    def savemeta(self):
+        meta = {'sections': self.sections, 'schemas': dict(
+            (sectionname(index), t.schema()) for index, t in self.tables.items())}
+        tmp = os.path.join(self.path, META+'.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(meta, f, indent=1)
+        os.rename(tmp, os.path.join(self.path, META))
+
+    def ivkey(self, i):
+        iv = self.iv
+        return tuple(iv[name][i] for name in ('dbid', 'nucx', 'st', 'ist', 'iet'))
+
+    def __len__(self):
+        return len(self.iv)
+
+    def append(self, intervals):
+        """ Append Interval objects (see adapya.adabas.smfingest),
+            intervals already in the store are skipped
+
+        :returns: number of intervals appended
+        """
+        ivrows = dict((name, []) for name in self.iv.names)
+        n = 0
+        changed = 0
+        for iv in intervals:
+            if iv.key in self.keys:
+                continue
+            self.keys.add(iv.key)
+            n += 1
+            for name in ('dbid', 'nucx', 'sty', 'st', 'ist', 'iet'):
+                ivrows[name].append(getattr(iv, name))
+            for index in self.sections:
+                sn = sectionname(index)
+                table = self.tables[index]
+                cols = iv.sections.get(index)
+                count = len(cols[iv.names[index][0]]) if cols else 0
+                first = len(table)
+                if count:
+                    changed |= self.appendrows(table, iv, index, cols, count)
+                ivrows[sn+'_first'].append(first)
+                ivrows[sn+'_count'].append(count)
+        if changed:
+            self.savemeta()
+        for name in self.iv.names:
+            self.iv[name].append(ivrows[name])
+        return n
+
+    def appendrows(self, table, iv, index, cols, count):
+        """ Append the section columns of an interval to table,
+            return 1 if columns were added to the table
+        """
+        added = 0
+        rows = len(table)
+        dmap = None
+        for name in iv.names[index]:
+            if name not in table.columns:
+                if dmap is None:
+                    dmap = smfversion(iv.smfv).datamap(index)
+                if name not in dmap.keydict:    # computed column, e.g. rate
+                    col = cols[name]
+                    table.addcolumn(name, getattr(col, 'typecode', None) or
+                        col.dtype.char, 0, rows)
+                    added = 1
+                    continue
+                fty, pos, size, opt, fdict = dmap.keydict[name]
+                if fty in TEXTTYPES or fty == T_BYTE:
+                    table.addcolumn(name, 's', size, rows)
+                elif fty in (T_PACK, T_UNPK):
+                    table.addcolumn(name, 'q', 0, rows)
+                else:
+                    table.addcolumn(name, ARRAYTYPES[fty], 0, rows)
+                added = 1
+        for name in table.names:
+            col = table[name]
+            if name in cols:
+                col.append(cols[name])
+            else:                   # column not in record version
+                col.append([b''] * count if col.code == 's' else
+                    array.array(col.code, bytes(col.itemsize*count)))
+        return added
+
+    def find(self, start=None, end=None, dbid=None, nucx=None, sty=None):
+        """ Return list of interval table rows of the intervals ending
+            after start and starting before end (see adapya.adabas.smf.timestck())
+        """
+        iv = self.iv
+        n = len(iv)
+        ist, iet = iv['ist'].values(), iv['iet'].values()
+        lo = timestck(start) if start is not None else 0
+        hi = timestck(end) if end is not None else 1 << 64
+        dbids, nucxs, stys = iv['dbid'].values(), iv['nucx'].values(), \
+            iv['sty'].values()
+        rows = [i for i in range(n) if iet[i] > lo and ist[i] < hi and
+                (dbid is None or dbids[i] == dbid) and
+                (nucx is None or nucxs[i] == nucx) and
+                (sty is None or stys[i] == sty)]
+        rows.sort(key=lambda i: ist[i])
+        return rows
+
+    def series(self, index, name, start=None, end=None, dbid=None, nucx=None,
+               element=None, key=None, sty=None):
+        """ Return time series of a section field as list of
+            (interval start, interval end, value) with times in seconds
+            since 1970, sorted by interval start
+
+        :param index: section index, e.g. FILE
+        :param name: field name, e.g. 'filect'
+        :param start, end, dbid, nucx, sty: interval selection (see find())
+        :param element: number of the section element, e.g. file number
+                        for FILE, thread number - 1 for THRD
+        :param key: (field name, value) selecting the element,
+                    e.g. ('cmdnm', 'L3') for CMD
+
+        Without element and key the values of all elements of an
+        interval are summed up.
+        """
+        table = self.tables[index]
+        if name not in table.columns:
+            raise KeyError('Field %s not in store for %s' % (name,
+                SECTIONS[index]))
+        sn = sectionname(index)
+        firsts, counts = self.iv[sn+'_first'], self.iv[sn+'_count']
+        ist, iet = self.iv['ist'], self.iv['iet']
+        col = table[name]
+        if key:
+            kcol = table[key[0]]
+        out = []
+        for i in self.find(start, end, dbid, nucx, sty):
+            first, count = firsts[i], counts[i]
+            if element is not None:
+                if element >= count:
+                    continue
+                v = col[first+element]
+            elif key:
+                kvals = kcol[first:first+count]
+                if key[1] not in kvals:
+                    continue
+                v = col[first+kvals.index(key[1])]
+            else:
+                v = sum(col[first:first+count])
+            out.append((stcktime(ist[i]), stcktime(iet[i]), v))
+        return out
+
+    def close(self):
+        self.iv.release()
+        for t in self.tables.values():
+            t.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
@@ -0,0 +1,192 @@
+"""adapya.adabas.superde - Super descriptor key builder
+=====================================================
+
+A super descriptor value is the concatenation of byte ranges of its
+parent field values. The Superdescriptor class builds such values from
+the parent values so that compound criteria on the parent fields can
+be given as one range of the super descriptor, e.g. for a super
+descriptor S1=BR(1,4),AC(1,10) the criteria
+"branch = X and account between A and B" are read with one L3::
+
+    >>> from adapya.adabas.api import Adabasx
+    >>> from adapya.adabas.superde import Superdescriptor
+    >>> c1 = Adabasx(fbl=64, rbl=256, sbl=64, vbl=64)
+    >>> c1.cb.dbid = 8
+    >>> c1.cb.fnr = 12
+    >>> s1 = Superdescriptor.readfdt(8, 12, 'S1')
+    >>> s1.descrange(c1, ['X'], low='A', high='B')
+    >>> c1.fb.value = b'BR,4,AC,10.'
+    >>> for isn, _ in c1.read(seq=s1.name):
+    ...     print(isn, c1.rb.value)
+
+A Superdescriptor may also be passed as descriptor to the Paginator
+(see adapya.adabas.paging) which then reads the parent fields with each
+record to build the continuation token.
+
+Parent values are encoded per their FDT length and format before the
+byte range is taken.
+
+"""
+from __future__ import print_function          # PY3
+
+from adapya.adabas.api import fvalue
+
+
+class Superdescriptor(object):
+    """ Super descriptor definition with key builder
+
+    :param name: super descriptor name
+    :param parents: list of (parent name, from byte, to byte) as
+                    returned in the specials of readfdt()
+    :param fields: dictionary of parent name to (length, format)
+    :param byteorder, encoding: of the database for encoding values
+    """
+    def __init__(self, name, parents, fields, byteorder=None, encoding='latin1'):
+        self.name = name
+        self.parents = []   # (name, from, to, length, format)
+        for par, pfrom, pto in parents:
+            flen, ffrm = fields[par]
+            if not flen:        # variable length: value up to byte range
+                flen = pto
+            self.parents.append((par, pfrom, pto, flen, ffrm))
+        self.length = sum(pto-pfrom+1 for par, pfrom, pto, flen, ffrm in self.parents)
+        self.ffrm = 'A' if all(p[4] == 'A' for p in self.parents) else 'B'
+        self.byteorder = byteorder
+        self.encoding = encoding
+
+        # parent fields read with the record to build the value
+        self.pfields = []   # (name, offset, length, format)
+        off = 0
+        for par, pfrom, pto, flen, ffrm in self.parents:
+            if par not in [p[0] for p in self.pfields]:
+                self.pfields.append((par, off, flen, ffrm))
+                off += flen
+        self.parentlen = off
+
+    @classmethod
+    def fromfdt(cls, fields, specials, name, **kw):
+        """ Return Superdescriptor from the FDT fields and specials
+            as returned by readfdt(..., specials=True)
+        """
+        try:
+            stype, opts, parents = specials[name]
+        except KeyError:
+            raise ValueError('Super descriptor %s not in FDT' % name)
+        if stype != 'SUPER':
+            raise ValueError('Field %s is not a super descriptor but %s'
+                % (name, stype))
+        fdict = dict((fn, (flen, ffrm))
+            for level, fn, flen, ffrm, fopts in fields if flen is not None)
+        return cls(name, parents, fdict, **kw)
+
+    @classmethod
+    def readfdt(cls, dbid, fnr, name, pwd='', **kw):
+        """ Return Superdescriptor read from the FDT of a file """
+        from adapya.adabas.fields import readfdt
+        fields, specials = readfdt(dbid, fnr, pwd=pwd, specials=True)
+        return cls.fromfdt(fields, specials, name, **kw)
+
+    def part(self, value, parent, pad=None):
+        """ Return byte range of a parent value
+
+        :param pad: if set, an alphanumeric value is padded with
+                    this byte instead of blanks
+        """
+        par, pfrom, pto, flen, ffrm = parent
+        if pad and ffrm in ('A', 'W') and not isinstance(value, (bytes, bytearray)):
+            b = value.encode('utf-8' if ffrm == 'W' else self.encoding)[:flen]
+            b += pad*(flen-len(b))
+        else:
+            b = fvalue(value, flen, ffrm, byteorder=self.byteorder,
+                encoding=self.encoding)
+        return b[pfrom-1:pto]
+
+    def value(self, values, fill=b'\x00', pad=None):
+        """ Return super descriptor value
+
+        :param values: list of parent values in parent sequence,
+                       the value for missing last parents is filled
+        :param fill: byte to fill missing last parents
+        :param pad: byte to pad the last value if alphanumeric (see part())
+        """
+        n = len(values)
+        if n > len(self.parents):
+            raise ValueError('Super descriptor %s has %d parents, got %d values'
+                % (self.name, len(self.parents), n))
+        key = b''.join(self.part(v, p, pad if i == n-1 else None)
+            for i, (v, p) in enumerate(zip(values, self.parents)))
+        return key + fill*(self.length-len(key))
+
+    def range(self, values, low=None, high=None):
+        """ Return (start, stop) values of a range
+
+        :param values: list of leading parent values
+        :param low, high: optional range of the next parent value
+
+        The stop value is filled with x'FF' and an alphanumeric high value
+        is padded with x'FF' so that all values starting with the given
+        parent values are included.
+        """
+        values = list(values)
+        start = self.value(values + ([low] if low is not None else []))
+        if high is not None:
+            stop = self.value(values + [high], fill=b'\xff', pad=b'\xff')
+        else:
+            stop = self.value(values, fill=b'\xff')
+        return start, stop
+
+    def fromrecord(self, rec, offset=0):
+        """ Return super descriptor value from the parent fields in the
+            record as read with the format buffer returned by parentfb()
+        """
+        pvals = dict((par, rec[offset+off:offset+off+flen])
+            for par, off, flen, ffrm in self.pfields)
+        return b''.join(pvals[par][pfrom-1:pto]
+            for par, pfrom, pto, flen, ffrm in self.parents)
+
+    def parentfb(self):
+        """ Return format buffer elements of the parent fields """
+        return ','.join('%s,%d,%s' % (par, flen, ffrm)
+            for par, off, flen, ffrm in self.pfields)
+
+    def descrange(self, apa, values, low=None, high=None):
+        """ Set search and value buffer of Adabas session or cursor
+            for reading the range with read(seq=self.name)
+        """
+        start, stop = self.range(values, low=low, high=high)
+        apa.descrange(self.name, self.length, self.ffrm, start=start, stop=stop)
+
+    def searchfield(self, apa, values, low=None, high=None, first=0, last=0):
+        """ Insert the value or range into search and value buffer of
+            Adabas session, parameters first and last see searchfield()
+
+            With values for all parents an exact value is searched
+            otherwise the range of range().
+        """
+        if first:
+            apa.sb.pos = 0
+            apa.vb.pos = 0
+        if len(values) == len(self.parents):
+            apa.sb.write_text('%s,%d,%s' % (self.name, self.length, self.ffrm))
+            apa.vb.write(self.value(values))
+        else:
+            start, stop = self.range(values, low=low, high=high)
+            apa.sb.write_text('%s,%d,%s,S,%s,%d,%s' % ((self.name, self.length,
+                self.ffrm)*2))
+            apa.vb.write(start + stop)
+        if last:
+            apa.sb.write_text('.')
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
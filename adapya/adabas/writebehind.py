@@ -0,0 +1,227 @@
+"""adapya.adabas.writebehind - Write-behind buffer with group commit
+=================================================================
+
+Applications that update a few fields of the same records over and over
+(see scripts/ticker.py) spend most of their time waiting for the ET
+of each small transaction. A WriteBehind object collects the updates
+in memory and writes them in one transaction:
+
+- updates are kept per ISN, a later update of the same fields of a
+  record replaces the earlier one (coalescing)
+- a flush updates the records in ascending ISN order with A1 and
+  hold option and ends the transaction with one ET
+- a flush is done when maxupdates records are pending or the
+  interval has passed since the last flush, on flush() and on close()
+
+Updating the records in ascending ISN order also reduces the holding
+conflicts (response 145) and deadlocks between concurrent writers.
+
+Each update may pass a callback which is called after the flush as
+callback(isn, error) with error None when the update is committed or
+with the exception when the update failed.
+
+Example::
+
+    >>> from adapya.adabas.api import Adabasx, UPD
+    >>> from adapya.adabas.writebehind import WriteBehind
+    >>> c1 = Adabasx(fbl=64, rbl=256)
+    >>> c1.cb.dbid = 8
+    >>> c1.open(mode=UPD)
+    >>> def done(isn, error):
+    ...     if error:
+    ...         print('ISN %d not updated: %s' % (isn, error))
+    >>> with WriteBehind(c1, 12, maxupdates=500, interval=2.0) as wb:
+    ...     for tic in ticks():
+    ...         wb.update(tic.minute+1, 'TI,20,A.', tic.text, callback=done)
+
+The flushes run in the thread calling update(), poll(), flush() or
+close(): an application that may be idle for longer than the interval
+should call poll() regularly.
+
+"""
+from __future__ import print_function          # PY3
+
+import time
+
+from adapya.adabas.api import DatabaseError
+
+# responses of one record that leave the other updates of the
+# transaction intact: ISN not found, record held by another user
+RECORDRSP = (113, 145)
+
+
+class WriteBehind(object):
+    """ Write-behind buffer of record updates on an Adabas session
+
+    :param apa: Adabas or Adabasx session opened for update, the records
+                are updated with a cursor on this session and the
+                transactions are ended with apa.et()
+    :param fnr: file number
+    :param maxupdates: number of pending records that triggers a flush
+    :param interval: seconds after the last flush that trigger a flush
+                     with the next update() or poll(), 0 flushes only
+                     on maxupdates, flush() and close()
+    :param wait: if true wait for records held by other users
+                 otherwise the update fails with response 145
+
+    A record whose update fails with response 113 or 145 is left out
+    of the transaction. If the update of a record fails with another
+    response (e.g. 9, the nucleus backed out the transaction), or one
+    of several updates with different format buffers of a record fails
+    after the record was partly updated, or the ET fails, the whole
+    transaction is backed out (BT) and all records of the flush are
+    notified with the error. Leaving a with block by an exception
+    notifies the pending updates with the exception and discards them.
+    The session should not have other open transactions while the
+    WriteBehind object is used.
+    """
+    def __init__(self, apa, fnr, maxupdates=100, interval=1.0, wait=0):
+        self.apa = apa
+        self.fnr = fnr
+        self.maxupdates = max(1, maxupdates)
+        self.interval = interval
+        self.wait = wait
+        self.pending = {}       # ISN: list of [fb, data, callbacks]
+        self.last = time.time() # time of last flush
+        self.closed = 0
+
+        # statistics
+        self.updates = 0        # update() calls
+        self.coalesced = 0      # updates replaced by a later update
+        self.written = 0        # A1 calls
+        self.failed = 0         # records not updated
+        self.commits = 0        # ET calls
+
+    def update(self, isn, fb, data, callback=None):
+        """ Add update of record isn
+
+        :param fb: format buffer of the fields to update, e.g. 'TI,20,A.'
+        :param data: record buffer bytes for the format buffer
+        :param callback: function called with (isn, error) after flush
+        """
+        if self.closed:
+            raise ValueError('WriteBehind is closed')
+        if isinstance(fb, bytes):
+            fb = fb.decode('ascii')
+        data = bytes(data)
+        self.updates += 1
+        upds = self.pending.setdefault(isn, [])
+        for i, upd in enumerate(upds):
+            if upd[0] == fb:
+                # replace and move behind the other updates of the record
+                # so that overlapping fields are written in update order
+                del upds[i]
+                upd[1] = data
+                if callback:
+                    upd[2].append(callback)
+                upds.append(upd)
+                self.coalesced += 1
+                break
+        else:
+            upds.append([fb, data, [callback] if callback else []])
+        self.poll()
+
+    def poll(self):
+        """ Flush if maxupdates or interval is reached """
+        if self.pending and (len(self.pending) >= self.maxupdates or
+                (self.interval and time.time()-self.last >= self.interval)):
+            self.flush()
+
+    def flush(self):
+        """ Update pending records in ascending ISN order and commit
+
+        :returns: number of records committed
+        """
+        self.last = time.time()
+        if not self.pending:
+            return 0
+        pending, self.pending = self.pending, {}
+        isns = sorted(pending)
+        fbl = max(len(fb) for upds in pending.values() for fb, _, _ in upds)
+        rbl = max(len(data) for upds in pending.values() for _, data, _ in upds)
+
+        callbacks = dict((isn, [cb for _, _, cbs in pending[isn] for cb in cbs])
+                         for isn in isns)
+        done = []       # ISNs updated
+        failed = []     # ISNs notified of an error
+        try:
+            with self.apa.cursor(multifetch=0, fbl=max(fbl, 32),
+                                 rbl=max(rbl, 32)) as cur:
+                cur.cb.fnr = self.fnr
+                for isn in isns:
+                    written = 0     # A1 calls done on the record
+                    try:
+                        for fb, data, cbs in pending[isn]:
+                            cur.fb[0:len(fb)] = fb.encode('ascii')
+                            cur.rb[0:len(data)] = data
+                            cur.call(cmd='A1', op1=' ' if self.wait else 'R',
+                                     op2='H', isn=isn)
+                            written += 1
+                            self.written += 1
+                    except DatabaseError as e:
+                        if written or cur.cb.rsp not in RECORDRSP:
+                            raise   # back out all
+                        self.failed += 1
+                        failed.append(isn)
+                        notify(isn, callbacks[isn], e)
+                    else:
+                        done.append(isn)
+            self.apa.et()
+            self.commits += 1
+        except Exception as e:
+            # back out the updates and notify all records not yet notified
+            try:
+                self.apa.bt()
+            except DatabaseError:
+                pass                # keep the original error
+            for isn in isns:
+                if isn not in failed:
+                    self.failed += 1
+                    notify(isn, callbacks[isn], e)
+            raise
+        for isn in done:
+            notify(isn, callbacks[isn], None)
+        return len(done)
+
+    def close(self):
+        """ Flush pending updates """
+        if not self.closed:
+            try:
+                self.flush()
+            finally:
+                self.closed = 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # discard pending updates, callers are told why
+            pending, self.pending = self.pending, {}
+            self.closed = 1
+            for isn in sorted(pending):
+                self.failed += 1
+                notify(isn, [cb for _, _, cbs in pending[isn] for cb in cbs],
+                       exc)
+
+
+def notify(isn, callbacks, error):
+    """ Call callbacks with (isn, error) """
+    for callback in callbacks:
+        callback(isn, error)
+
+#  Copyright 2004-2023 Software AG
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
@@ -1,5 +1,5 @@
 #!/usr/bin/env python
-# requires Python V2.7 or higher
+# requires Python V3.5 or higher
 from __future__ import print_function          # PY3
 
 import os,sys
@@ -43,7 +43,6 @@ setup(  name='adapya-adabas',
          'Operating System :: POSIX :: Linux',
          'Operating System :: POSIX :: Other',
          'Programming Language :: Python',
-         'Programming Language :: Python :: 2.7',
          'Programming Language :: Python :: 3.5',
          'Programming Language :: Python :: 3.6',
          'Programming Language :: Python :: 3.7',
@@ -62,9 +61,12 @@ setup(  name='adapya-adabas',
     #    },
     scripts = ['adapya/adabas/scripts/dblist.py','adapya/adabas/scripts/mproc.py',
         'adapya/adabas/scripts/ticker.py',
-        'adapya/adabas/scripts/search.py','adapya/adabas/scripts/asmfreader.py',],
-    packages=['adapya', 'adapya.adabas', 'adapya.adabas.scripts'],
+        'adapya/adabas/scripts/search.py','adapya/adabas/scripts/asmfreader.py',
+        'adapya/adabas/scripts/replay.py',],
+    packages=['adapya', 'adapya.adabas', 'adapya.adabas.scripts',
+        'adapya.adabas.bench'],
     install_requires=install_requires,
+    python_requires='>=3.5',
     namespace_packages=['adapya'],
     #extras_require={ 'dev': [ 'coverage','nose','pytest','pytest-pep8','pytest-cov' ]},
 
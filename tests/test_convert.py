@@ -0,0 +1,106 @@
+""" Tests of the batch conversion of EBCDIC and network byte order records """
+from __future__ import print_function          # PY3
+
+import struct
+import unittest
+
+from adapya.base.datamap import Datamap, String, Bytes, Packed, Unpacked, \
+    Int2, Int4, Uint8, Double, NETWORKBO
+from adapya.adabas.convert import ConvertError, Layout, dmaplayout, fblayout, \
+    formatlayout, transtable
+
+# (length, Adabas format) and struct format of the test records
+FIELDS = [(8, 'A'), (4, 'F'), (3, 'P'), (2, 'F'), (8, 'G'), (20, 'A'), (8, 'F')]
+NETWORK = struct.Struct('>8si3sh d20sq')
+NATIVE = struct.Struct('=8si3sh d20sq')
+
+
+def record(i):
+    return NETWORK.pack(('K%d' % i).ljust(8).encode('cp037'), -i*1000,
+        b'\x12\x34\x5c', i, i/3., ('Name %d' % i).ljust(20).encode('cp037'),
+        2**40+i)
+
+
+def expected(i):
+    return (('K%d' % i).ljust(8).encode('latin1'), -i*1000, b'\x12\x34\x5c',
+        i, i/3., ('Name %d' % i).ljust(20).encode('latin1'), 2**40+i)
+
+
+class LayoutTest(unittest.TestCase):
+
+    def check(self, layout, count):
+        data = b''.join(record(i) for i in range(count))
+        out = layout.convertbytes(data)
+        for i in range(count):
+            self.assertEqual(NATIVE.unpack_from(out, i*NATIVE.size),
+                             expected(i))
+        buf = bytearray(data)
+        layout.convert(buf, 0, count)
+        self.assertEqual(buf, out)
+
+    def test_formatlayout(self):
+        layout = formatlayout(FIELDS)
+        self.assertEqual(layout.reclen, NETWORK.size)
+        for count in (1, 2, 500):   # per record runs and per byte column
+            self.check(layout, count)
+
+    def test_fblayout(self):
+        fdt = {'AA': (8, 'A', ''), 'AB': (4, 'F', ''), 'AC': (3, 'P', ''),
+               'AD': (2, 'F', ''), 'AE': (8, 'G', ''), 'AF': (0, 'A', ''),
+               'AG': (8, 'F', '')}
+        self.check(fblayout('AA,AB,AC,AD,AE,AF,20,A,AG.', fdt), 50)
+
+    def test_convert_at_offset(self):
+        layout = formatlayout(FIELDS)
+        buf = bytearray(b'\xff'*10 + record(1) + record(2) + b'\xff'*10)
+        layout.convert(buf, 10+NETWORK.size, 1)
+        self.assertEqual(bytes(buf[:10+NETWORK.size]),
+                         b'\xff'*10 + record(1))
+        self.assertEqual(NATIVE.unpack_from(buf, 10+NETWORK.size), expected(2))
+        self.assertEqual(bytes(buf[-10:]), b'\xff'*10)
+
+    def test_length_not_multiple(self):
+        layout = formatlayout(FIELDS)
+        self.assertRaises(ConvertError, layout.convertbytes, record(1)[:-1])
+
+    def test_overlapping_fields(self):
+        self.assertRaises(ConvertError, Layout, [(0, 4, 'A'), (2, 4, 'S')], 8)
+
+    def test_no_translation(self):
+        self.assertIsNone(transtable('latin1'))
+        self.assertIsNone(transtable('utf-8'))
+        layout = formatlayout([(8, 'A'), (4, 'F')], encoding='utf-8')
+        rec = u'\xe9\u20acab'.encode('utf-8').ljust(8) + struct.pack('>i', 5)
+        out = layout.convertbytes(rec)
+        self.assertEqual(bytes(out[:8]), rec[:8])
+        self.assertEqual(struct.unpack_from('=i', out, 8)[0], 5)
+
+
+class DmapLayoutTest(unittest.TestCase):
+
+    def test_datamap(self):
+        dm = Datamap('rec', String('name', 8), Bytes('flags', 2),
+            Packed('amount', 3), Unpacked('code', 2), Int2('count'),
+            Int4('total'), Uint8('stck'), Double('rate'),
+            byteOrder=NETWORKBO, ebcdic=1)
+        layout = dmaplayout(dm)
+        self.assertEqual(layout.reclen, 37)
+        self.assertEqual(layout.swaps, [(15, 2), (17, 4), (21, 8), (29, 8)])
+        rec = 'ABC'.ljust(8).encode('cp037') + b'\x01\x02' + b'\x12\x34\x5c' + \
+            b'\xf1\xf2' + struct.pack('>hiQd', -2, 70000, 2**60, 1.5)
+        out = layout.convertbytes(rec)
+        self.assertEqual(bytes(out[:15]), b'ABC     \x01\x02\x12\x34\x5c\xf1\xf2')
+        self.assertEqual(struct.unpack_from('=hiQd', out, 15),
+                         (-2, 70000, 2**60, 1.5))
+
+    def test_leave_numbers(self):
+        dm = Datamap('rec', String('name', 4), Int4('total'),
+            byteOrder=NETWORKBO, ebcdic=1)
+        layout = dmaplayout(dm, swap=0)
+        self.assertEqual(layout.swaps, [])
+        out = layout.convertbytes('ab'.ljust(4).encode('cp037') + b'\x00\x00\x00\x07')
+        self.assertEqual(bytes(out), b'ab  \x00\x00\x00\x07')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+""" Tests of the DB-API query compiler and cursor row fetching
+
+The api module needs the Adabas Client Library to be importable, the
+tests do not call a database.
+"""
+from __future__ import print_function          # PY3
+
+import unittest
+
+try:
+    from adapya.adabas.dbapi import Cursor, ProgrammingError, Query
+except OSError:     # api module: Adabas Client Library not found
+    raise unittest.SkipTest('Adabas Client Library not available')
+from adapya.base.datamap import NETWORKBO
+
+FDT = {'AA': (8, 'A', 'UQ,DE'), 'AB': (4, 'F', ''), 'AC': (3, 'P', ''),
+       'AD': (20, 'A', ''), 'AE': (8, 'G', ''), 'AF': (2, 'U', ''),
+       'AG': (0, 'A', 'NU')}
+
+
+def fdt(fnr):
+    return FDT
+
+
+class QueryTest(unittest.TestCase):
+
+    def test_parse(self):
+        q = Query("SELECT AA,AB FROM 11 WHERE AA = 'X' OR AB BETWEEN 1 AND 5",
+                  fdt)
+        self.assertEqual(q.fnr, 11)
+        self.assertEqual(q.fb, 'AA,8,A,AB,4,F.')
+        self.assertEqual(q.terms, [('', 'AA', 8, 'A', '', "'X'", None),
+                                   ('O', 'AB', 4, 'F', '', '1', '5')])
+
+    def test_invalid(self):
+        for operation in ('SELECT AA FROM 11 WHERE AA = 1 AND',
+                          'SELECT AA FROM 11 WHERE AA = 1 AND AB',
+                          'SELECT AA FROM 11 WHERE AA = 1 XOR AB = 2',
+                          'SELECT AA FROM 11 WHERE AB BETWEEN 1 5',
+                          'SELECT AG FROM 11',
+                          'SELECT ZZ FROM 11'):
+            self.assertRaises(ProgrammingError, Query, operation, fdt)
+
+    def check_converted(self, encoding, rows, pack):
+        q = Query('SELECT AA,AB,AC,AD,AE,AF FROM 11', fdt, encoding, NETWORKBO)
+        recs = b''.join(pack(q, r) for r in rows)
+        buf = bytearray(recs)
+        q.layout.convert(buf, 0, len(rows))
+        for i, row in enumerate(rows):
+            self.assertEqual(q.decode(recs, i*q.reclen), row)
+            self.assertEqual(q.decode(buf, i*q.reclen, converted=1), row)
+
+    def test_converted_ebcdic(self):
+        def pack(q, r):
+            return q.struct.pack(r[0].ljust(8).encode('cp037'), r[1],
+                b'\x00\x12\x3c', r[3].ljust(20).encode('cp037'), r[4],
+                ('%02d' % r[5]).encode('cp037'))
+        rows = [('K%d' % i, -i, 123, 'Name %d' % i, i/4., i) for i in range(20)]
+        self.check_converted('cp037', rows, pack)
+
+    def test_converted_utf8(self):
+        # not translated by the layout, only the numbers are swapped
+        def pack(q, r):
+            return q.struct.pack(r[0].encode('utf-8').ljust(8), r[1],
+                b'\x00\x12\x3c', r[3].encode('utf-8').ljust(20), r[4], b'07')
+        rows = [(u'\xe9\u20acabc', 5, 123, u'caf\xe9', 0.5, 7)]
+        self.check_converted('utf-8', rows, pack)
+
+
+class Connection(object):
+    arraysize = 3
+
+    def _check(self):
+        pass
+
+
+class FetchTest(unittest.TestCase):
+
+    def cursor(self, n):
+        cur = Cursor(Connection())
+        cur.rows = iter([(i,) for i in range(n)])
+        return cur
+
+    def test_fetchmany(self):
+        cur = self.cursor(5)
+        self.assertEqual(cur.fetchmany(0), [])
+        self.assertEqual(cur.fetchmany(-1), [])
+        self.assertEqual(cur.fetchmany(), [(0,), (1,), (2,)])
+        self.assertEqual(cur.fetchmany(1), [(3,)])
+        self.assertEqual(cur.fetchmany(5), [(4,)])
+        self.assertEqual(cur.fetchmany(), [])
+
+    def test_not_executed(self):
+        cur = Cursor(Connection())
+        self.assertRaises(ProgrammingError, cur.fetchmany)
+
+
+if __name__ == '__main__':
+    unittest.main()
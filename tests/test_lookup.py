@@ -0,0 +1,132 @@
+""" Tests of the batched descriptor lookup
+
+lookup_many() is run against a stub link module (adapya.adabas.bench.stub)
+that searches and reads an in-memory file. The api module needs the
+Adabas Client Library to be importable.
+"""
+from __future__ import print_function          # PY3
+
+import struct
+import unittest
+
+try:
+    from adapya.adabas import api
+except OSError:     # Adabas Client Library not found
+    raise unittest.SkipTest('Adabas Client Library not available')
+from adapya.adabas.bench import stub
+from adapya.adabas.lookup import keyruns, lookup_many
+from adapya.base.datamap import funpack
+
+
+class KeyrunsTest(unittest.TestCase):
+
+    def test_runs(self):
+        self.assertEqual(keyruns([1, 2, 3, 4, 7, 9, 10, 11], 3),
+                         ([(1, 4), (9, 11)], [7]))
+
+    def test_short_runs(self):
+        self.assertEqual(keyruns([1, 2, 4, 5], 3), ([], [1, 2, 4, 5]))
+        self.assertEqual(keyruns([1, 2, 3], 0), ([], [1, 2, 3]))
+
+
+class File(object):
+    """ In-memory file of ISN: descriptor value searched and read by the
+        stub handler with S1, L1 and L3
+    """
+    def __init__(self, values, fieldlen, ffrm):
+        self.values = values
+        self.fieldlen = fieldlen
+        self.ffrm = ffrm
+        self.lists = {}         # command id: ISNs left to read
+        self.calls = []
+
+    def value(self, isn):
+        return api.fvalue(self.values[isn], self.fieldlen, self.ffrm)
+
+    def handler(self, acb, bufs):
+        cb = api.Acbx()
+        cb.buffer = api.Abuf(bytes(acb))
+        self.calls.append(cb.cmd)
+        cidoff = cb.keydict['cid'][1]
+        fl = self.fieldlen
+        if cb.cmd == 'RC':
+            stub.setrsp(acb, 0)
+            return
+        vb = bytes(bufs['V'])
+        if cb.cmd == 'S1':
+            n = bytes(bufs['S']).split(b'.')[0].count(b',O,') + 1
+            vals = set(vb[fl*i:fl*(i+1)] for i in range(n))
+            isns = sorted(i for i in self.values if self.value(i) in vals)
+            acb[cidoff:cidoff+4] = b'S001'
+            self.lists[b'S001'] = isns
+            struct.pack_into('=Q', acb, cb.keydict['isq'][1], len(isns))
+            stub.setrsp(acb, 0)
+            return
+        if cb.cidn == -1:       # L3 in value range
+            lo, hi = funpack(vb[:fl], self.ffrm), funpack(vb[fl:2*fl], self.ffrm)
+            acb[cidoff:cidoff+4] = b'L001'
+            self.lists[b'L001'] = sorted((i for i in self.values
+                if lo <= self.values[i] <= hi), key=lambda i: (self.values[i], i))
+        isns = self.lists[bytes(acb[cidoff:cidoff+4])]
+        n = (len(bufs['M'])-4)//16 if cb.op1 == 'M' else 1
+        out, isns[:n] = isns[:n], []
+        if not out:
+            stub.setrsp(acb, 3)
+            return
+        pos = 0
+        for j, isn in enumerate(out):
+            r = self.value(isn) + b'R%07d' % isn
+            bufs['R'][pos:pos+len(r)] = r
+            if cb.op1 == 'M':
+                struct.pack_into('=4L', bufs['M'], 4+16*j, len(r), 0, isn, 0)
+            pos += len(r)
+        if cb.op1 == 'M':
+            struct.pack_into('=L', bufs['M'], 0, len(out))
+        else:
+            stub.setisn(acb, out[-1])
+        stub.setrsp(acb, 0)
+        return {'R': pos}
+
+
+class LookupTest(unittest.TestCase):
+
+    def lookup(self, values, keys, ffrm, **kw):
+        f = File(values, 4, ffrm)
+        with stub.stublink(stub.StubLink(f.handler)):
+            c = api.Adabasx(fbl=64, rbl=256, sbl=64, vbl=64, mbl=16)
+            c.cb.dbid = 8
+            res = lookup_many(c, 11, 'AA', 4, keys, 'AB,8,A.', 8, ffrm=ffrm,
+                              **kw)
+        return f, dict((k, sorted(v)) for k, v in res.items())
+
+    def records(self, values, value):
+        return [(i, b'R%07d' % i) for i in sorted(values) if values[i] == value]
+
+    def test_numeric(self):
+        values = dict((isn, isn % 50) for isn in range(1, 200))
+        keys = list(range(10, 30)) + [3, 41, 99]
+        f, res = self.lookup(values, keys, 'U', batch=10, multifetch=20,
+                             minrun=16)
+        self.assertEqual(res, dict((k, self.records(values, k)) for k in keys))
+        # 10..29 read with L3 in the value range, the others with one S1
+        self.assertIn('L3', f.calls)
+        self.assertEqual(f.calls.count('S1'), 1)
+
+    def test_mixed_keys(self):
+        values = dict((isn, isn % 20) for isn in range(1, 100))
+        keys = [5, '5', 17, '17', 6, 7, 8]
+        f, res = self.lookup(values, keys, 'U', minrun=3)
+        for k in keys:
+            self.assertEqual(res[k], self.records(values, int(k)), k)
+
+    def test_int_keys_alphanumeric(self):
+        values = dict((isn, str(isn % 20)) for isn in range(1, 100))
+        keys = list(range(3, 10)) + ['12', '12 ']
+        f, res = self.lookup(values, keys, 'A', minrun=3)
+        for k in keys:
+            self.assertEqual(res[k], self.records(values, str(k).strip()), k)
+        self.assertEqual(f.calls.count('L3'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
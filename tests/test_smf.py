@@ -0,0 +1,177 @@
+""" Tests of the SMF record reader: BDW detection and record scanning
+
+The records are built with adapya.adabas.bench.samples, no database
+or Adabas Client Library is needed.
+"""
+from __future__ import print_function          # PY3
+
+import gzip
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from adapya.adabas.bench.samples import smfrecord
+from adapya.adabas.smf import detectbdw, smfopen, SmfError, SmfReader, \
+    SmfStream, SmfIndex, THRD
+from adapya.adabas.smffollow import SmfFollower
+
+RECORD = smfrecord(ist=1.7e9)       # 9482 bytes, flag byte 0
+
+
+def withflag(rec, flag):
+    """ Return record with the SMF flag byte (after the RDW) set """
+    r = bytearray(rec)
+    r[4] = flag
+    return bytes(r)
+
+
+def block(*recs):
+    """ Return block of records with BDW """
+    data = b''.join(recs)
+    return struct.pack('>HH', len(data)+4, 0) + data
+
+
+class DetectBdwTest(unittest.TestCase):
+
+    def test_rdw(self):
+        # flag and record type read as a length fit into a large record
+        for flag in (0x00, 0x1e, 0x5e):
+            rec = withflag(RECORD, flag)
+            self.assertEqual(detectbdw(rec*3), 0, hex(flag))
+
+    def test_bdw(self):
+        for flag in (0x00, 0x1e, 0x5e):
+            rec = withflag(RECORD, flag)
+            self.assertEqual(detectbdw(block(rec)*2), 1, hex(flag))
+            self.assertEqual(detectbdw(block(rec, rec)), 1, hex(flag))
+
+    def test_incomplete(self):
+        self.assertIsNone(detectbdw(b''))
+        self.assertIsNone(detectbdw(RECORD[:9]))
+        self.assertIsNone(detectbdw(block(RECORD)[:1000]))
+
+    def test_no_smf_record(self):
+        self.assertRaises(SmfError, detectbdw, b'\x00\x40\x00\x00' + b'\x00'*60)
+
+    def test_rdws_must_fill_block(self):
+        # BDW length one record too short: not a valid first block
+        data = bytearray(block(RECORD, RECORD))
+        struct.pack_into('>H', data, 0, len(RECORD)+2)
+        self.assertRaises(SmfError, detectbdw, bytes(data))
+
+
+class ScanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, data):
+        fname = os.path.join(self.dir, name)
+        with open(fname, 'wb') as f:
+            f.write(data)
+        return fname
+
+    def scan(self, fname, bdw=None):
+        with SmfReader(fname, bdw=bdw) as smf:
+            return smf.bdw, list(smf.scan()), smf.pos
+
+    def test_rdw_file(self):
+        rl = len(RECORD)
+        for flag in (0x00, 0x1e):
+            fname = self.write('rdw.smf', withflag(RECORD, flag)*3)
+            self.assertEqual(self.scan(fname),
+                (0, [(0, rl), (rl, rl), (2*rl, rl)], 3*rl))
+
+    def test_bdw_file(self):
+        rl = len(RECORD)
+        fname = self.write('bdw.smf', block(RECORD, RECORD) + block(RECORD))
+        self.assertEqual(self.scan(fname),
+            (1, [(4, rl), (4+rl, rl), (8+2*rl, rl)], 8+3*rl))
+
+    def test_incomplete_record(self):
+        fname = self.write('part.smf', RECORD + RECORD[:100])
+        self.assertEqual(self.scan(fname), (0, [(0, len(RECORD))], len(RECORD)))
+
+    def test_record_exceeds_block(self):
+        data = struct.pack('>HH', 200, 0) + RECORD
+        fname = self.write('bad.smf', data)
+        self.assertRaises(SmfError, self.scan, fname, 1)
+
+    def test_block_not_filled(self):
+        data = bytearray(block(RECORD))
+        data[4:4] = b'\x00\x00'     # block 2 bytes longer than the record
+        struct.pack_into('>H', data, 0, len(data))
+        fname = self.write('bad.smf', bytes(data))
+        self.assertRaises(SmfError, self.scan, fname, 1)
+
+    def test_records(self):
+        fname = self.write('rdw.smf', RECORD*2)
+        with smfopen(fname) as smf:
+            recs = [(r.recno, r.length, r.rty, r.sid, r.dbid,
+                     len(r.decode(THRD))) for r in smf]
+        self.assertEqual(recs, [(1, len(RECORD), 0x6f, 'SYSA', 1, 16),
+                                (2, len(RECORD), 0x6f, 'SYSA', 1, 16)])
+
+    def test_stream(self):
+        data = block(RECORD) * 3
+        fname = self.write('bdw.smf.gz', gzip.compress(data))
+        with SmfStream(fname, chunksize=1000) as smf:
+            lens = [r.length for r in smf]
+            self.assertEqual(smf.bdw, 1)
+        self.assertEqual(lens, [len(RECORD)]*3)
+
+    def test_index_rebuilt_with_detected_bdw(self):
+        fname = self.write('rdw.smf', RECORD*2)
+        idx = SmfIndex(fname)
+        idx.update()
+        # index written with the wrong format is built again
+        with open(idx.idxname, 'r+b') as f:
+            head = bytearray(f.read(SmfIndex.HEADER.size))
+            head[-8] = 1
+            f.seek(0)
+            f.write(head)
+        idx = SmfIndex(fname)
+        self.assertEqual(idx.bdw, 1)
+        idx.update()
+        self.assertEqual((idx.bdw, len(idx)), (0, 2))
+
+
+class FollowerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fname = os.path.join(self.dir, 'f.smf')
+        self.ckp = self.fname + '.ckp'
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def poll(self):
+        f = SmfFollower(self.fname, checkpoint=self.ckp, useinotify=0)
+        recs = []
+        f.poll(lambda r: recs.append((r.offset, r.length)))
+        return f.bdw, recs
+
+    def test_detect_and_restart(self):
+        rec = withflag(RECORD, 0x1e)
+        with open(self.fname, 'wb') as f:
+            f.write(block(rec)[:5000])
+        self.assertEqual(self.poll(), (None, []))   # first block incomplete
+        with open(self.fname, 'wb') as f:
+            f.write(rec[:5000])
+        self.assertEqual(self.poll(), (0, []))
+        with open(self.fname, 'ab') as f:
+            f.write(rec[5000:] + rec)
+        self.assertEqual(self.poll(), (0, [(0, len(rec)), (len(rec), len(rec))]))
+        with open(self.fname, 'ab') as f:
+            f.write(rec)
+        self.assertEqual(self.poll(), (0, [(2*len(rec), len(rec))]))
+
+
+if __name__ == '__main__':
+    unittest.main()